@@ -0,0 +1,381 @@
+# app/ai/bench.py
+"""
+OCR hattı için süre + doğruluk ölçümü.
+
+    python -m app.ai.bench storage_uploads/
+    python -m app.ai.bench storage_uploads/ --save bench_baseline.json
+    python -m app.ai.bench storage_uploads/ --compare bench_baseline.json   # gerileme varsa çıkış kodu 1
+    python -m app.ai.bench --fields-micro 200   # alan çıkarıcı: tek geçiş vs eski regex taramaları
+
+Korpus: klasördeki her belge (jpg/png/heic/pdf ...). Yanında aynı adlı .json varsa
+doğruluk da ölçülür:
+
+    {"plate": "16ABC123", "km": 125000, "date": "2024-03-15",
+     "items": [{"name": "Yağ filtresi", "price": 350.0}, ...]}
+
+Aşamalar: decode, prep (_prep_for_ocr), roi, ocr (tam sayfa), items (_extract_items),
+rules (parse_document_ocr), llm (sahte Ollama'ya karşı, önbelleksiz).
+OCR strateji istatistikleri (ocr_strategy_stats) ölçüm sırasında yazılmaz: bench
+gerçek app.db'deki öğrenilmiş sırayı değiştirmez.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # yalnızca Unix
+except ImportError:  # pragma: no cover
+    resource = None
+
+from ..routers import ai_imports
+from . import fake_ollama, fields, llm, ocr_strategy
+
+DOC_EXTS = {".jpg", ".jpeg", ".png", ".heic", ".heif", ".webp", ".tif", ".tiff", ".bmp", ".pdf"}
+STAGES = ["decode_ms", "prep_ms", "roi_ms", "ocr_ms", "items_ms", "rules_ms", "llm_ms", "total_ms"]
+FIELDS = ["plate", "km", "date", "items"]
+
+
+# ---------- ölçüm ----------
+
+@contextmanager
+def _no_strategy_stats():
+    """Ölçüm sırasında strateji kazananlarını DB'ye yazma (okuma serbest)."""
+    record = ocr_strategy._record
+    ocr_strategy._record = lambda *a, **k: None
+    try:
+        yield
+    finally:
+        ocr_strategy._record = record
+
+
+def _corpus(root: str) -> list[tuple[str, dict | None]]:
+    out = []
+    for name in sorted(os.listdir(root)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in DOC_EXTS:
+            continue
+        truth_path = os.path.join(root, base + ".json")
+        truth = None
+        if os.path.exists(truth_path):
+            with open(truth_path, encoding="utf-8") as f:
+                truth = json.load(f)
+        out.append((os.path.join(root, name), truth))
+    return out
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux KB, macOS byte döner
+    return round(kb / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def run_document(path: str, client: llm.OllamaClient | None) -> tuple[dict, dict | None]:
+    """Tek belge: aşama süreleri (ms) + kural tabanlı taslak."""
+    t0 = time.perf_counter()
+    ctx = ai_imports.DocumentContext(path)
+    # Sıra pipeline ile aynı: decode -> prep -> roi -> ocr -> kurallar
+    ctx.prepped
+    ctx.roi
+    text = ctx.text
+
+    t = time.perf_counter()
+    ai_imports._extract_items(text)
+    items_ms = (time.perf_counter() - t) * 1000
+
+    try:
+        parsed = ai_imports.parse_document_ocr(ctx)
+    except Exception:
+        parsed = None
+
+    timings = {k: ctx.timings.get(k, 0.0) for k in ("decode_ms", "prep_ms", "roi_ms", "ocr_ms", "rules_ms")}
+    timings["items_ms"] = round(items_ms, 2)
+    if client is not None and text:
+        t = time.perf_counter()
+        client.generate_json(ai_imports._build_llm_prompt(text))
+        timings["llm_ms"] = round((time.perf_counter() - t) * 1000, 2)
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return timings, parsed
+
+
+def _percentile(values: list[float], p: float) -> float:
+    """En yakın sıra yöntemi (küçük örneklerde interpolasyondan daha kararlı)."""
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    k = max(0, min(len(vals) - 1, int(round(p / 100 * len(vals) + 0.5)) - 1))
+    return round(vals[k], 2)
+
+
+# ---------- doğruluk ----------
+
+def _norm_plate(p) -> str | None:
+    return "".join(str(p).split()).upper() if p else None
+
+
+def _items_score(pred: list[dict], truth: list[dict]) -> float:
+    """Doğru kalem oranı: ad eşleşen ve fiyatı %1 içinde olan gerçek kalemler."""
+    if not truth:
+        return 1.0 if not pred else 0.0
+    left = [(str(i.get("name") or "").lower().strip(), float(i.get("price") or 0)) for i in pred or []]
+    hit = 0
+    for it in truth:
+        name = str(it.get("name") or "").lower().strip()
+        price = float(it.get("price") or 0)
+        for j, (pn, pp) in enumerate(left):
+            if (name in pn or pn in name) and abs(pp - price) <= max(0.01, abs(price) * 0.01):
+                hit += 1
+                left.pop(j)
+                break
+    return hit / len(truth)
+
+
+def field_scores(parsed: dict | None, truth: dict) -> dict[str, float]:
+    """Gerçek değeri olan her alan için 0..1 puan."""
+    parsed = parsed or {}
+    vehicle = parsed.get("vehicle") or {}
+    out = {}
+    if "plate" in truth:
+        out["plate"] = float(_norm_plate(vehicle.get("plate")) == _norm_plate(truth["plate"]))
+    if "km" in truth:
+        try:
+            out["km"] = float(int(vehicle.get("km")) == int(truth["km"]))
+        except (TypeError, ValueError):
+            out["km"] = 0.0
+    if "date" in truth:
+        out["date"] = float((parsed.get("startedAt") or "")[:10] == str(truth["date"])[:10])
+    if "items" in truth:
+        out["items"] = round(_items_score(parsed.get("items") or [], truth["items"]), 3)
+    return out
+
+
+# ---------- rapor / karşılaştırma ----------
+
+def run(root: str, repeat: int = 1, use_llm: bool = True, llm_latency: float = 0.0) -> dict:
+    corpus = _corpus(root)
+    if not corpus:
+        raise SystemExit(f"Belge bulunamadı: {root}")
+
+    client = server = None
+    if use_llm:
+        server = fake_ollama.serve_in_thread(latency=llm_latency)
+        host, port = server.server_address
+        client = llm.OllamaClient(host=f"http://{host}:{port}", model="fake", max_in_flight=1)
+
+    samples: dict[str, list[float]] = {s: [] for s in STAGES}
+    scores: dict[str, list[float]] = {f: [] for f in FIELDS}
+    docs = []
+    try:
+        with _no_strategy_stats():
+            for _ in range(repeat):
+                for path, truth in corpus:
+                    timings, parsed = run_document(path, client)
+                    for s in STAGES:
+                        if s in timings:
+                            samples[s].append(timings[s])
+                    fs = field_scores(parsed, truth) if truth else {}
+                    for f, v in fs.items():
+                        scores[f].append(v)
+                    docs.append({"file": os.path.basename(path), "timings": timings, "fields": fs})
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    return {
+        "pipeline_version": ai_imports.PIPELINE_VERSION,
+        "documents": len(corpus),
+        "runs": len(docs),
+        "stages": {
+            s: {"p50": _percentile(v, 50), "p95": _percentile(v, 95), "n": len(v)}
+            for s, v in samples.items() if v
+        },
+        "accuracy": {f: round(sum(v) / len(v), 3) for f, v in scores.items() if v},
+        "peak_rss_mb": _peak_rss_mb(),
+        "docs": docs,
+    }
+
+
+def compare(report: dict, baseline: dict, time_tol: float = 0.20, min_ms: float = 5.0,
+            acc_tol: float = 0.0, rss_tol: float = 0.20) -> list[str]:
+    """Gerilemeleri listele; boş liste = geçti."""
+    problems = []
+    for stage, cur in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        for q in ("p50", "p95"):
+            limit = old[q] * (1 + time_tol)
+            if cur[q] > limit and cur[q] - old[q] > min_ms:
+                problems.append(f"{stage} {q}: {old[q]} -> {cur[q]} ms (sınır {limit:.1f})")
+    for field, cur in report["accuracy"].items():
+        old = baseline.get("accuracy", {}).get(field)
+        if old is not None and cur < old - acc_tol:
+            problems.append(f"doğruluk {field}: {old} -> {cur}")
+    old_rss, cur_rss = baseline.get("peak_rss_mb"), report.get("peak_rss_mb")
+    if old_rss and cur_rss and cur_rss > old_rss * (1 + rss_tol):
+        problems.append(f"peak RSS: {old_rss} -> {cur_rss} MB")
+    return problems
+
+
+def _print_report(report: dict):
+    print(f"pipeline v{report['pipeline_version']}  belge={report['documents']}  koşu={report['runs']}"
+          f"  peak RSS={report['peak_rss_mb']} MB")
+    print(f"{'aşama':<10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, v in report["stages"].items():
+        print(f"{stage[:-3]:<10}{v['p50']:>10}{v['p95']:>10}")
+    if report["accuracy"]:
+        print("doğruluk: " + "  ".join(f"{k}={v:.1%}" for k, v in report["accuracy"].items()))
+    else:
+        print("doğruluk: gerçek değer (.json) bulunamadı")
+
+
+# ---------- alan çıkarıcı mikro ölçümü ----------
+# Eski (fields.py öncesi) çıkarıcıların kopyaları; yalnızca karşılaştırma için.
+
+_L_PLATE_RE = re.compile(r"\b([0-9]{2}\s?[A-Z]{1,3}\s?[0-9]{2,4})\b")
+_L_PHONE_RE = re.compile(r"(\+?90\s?)?0?\s?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}")
+_L_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_L_KM_RE = re.compile(r"\b(\d{4,7})\s?km\b", re.IGNORECASE)
+_L_CURRENCY_RE = re.compile(r"(ara toplam|subtotal|toplam|total|kdv|vat)\s*[:\-]?\s*([\d\.,]+)", re.IGNORECASE)
+_L_ITEM_RE = re.compile(
+    r"(?P<name>[A-Za-zÇĞİÖŞÜçğışöü0-9\.\-\/\s]+?)\s+(?P<qty>\d+(?:[.,]\d+)?)\s*[xX×]\s*(?P<unit>[\d\.,]+)"
+)
+_L_MONEY_RE = re.compile(r"(?P<val>\d{1,3}(?:[\.\s]\d{3})*(?:[.,]\d{2})?)\s*(?:TL|₺)?", re.IGNORECASE)
+
+
+def _legacy_money(s):
+    s = s.strip().replace(" ", "")
+    if "," in s and "." in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif "," in s:
+        s = s.replace(",", ".")
+    try:
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+def _legacy_extract(text: str):
+    """parsers.extract_simple_fields + parsers.extract_items + ai_imports._extract_items/_extract_totals."""
+    for rx in (_L_PLATE_RE, _L_PHONE_RE, _L_EMAIL_RE, _L_KM_RE):
+        rx.search(text)
+    for m in _L_CURRENCY_RE.finditer(text):
+        m.group(1).lower()
+    list(_L_ITEM_RE.finditer(text))
+    items = []
+    for line in text.splitlines():
+        l = line.strip()
+        if not l:
+            continue
+        prices = list(_L_MONEY_RE.finditer(l))
+        if not prices:
+            continue
+        price = _legacy_money(prices[-1].group("val"))
+        mqty = re.search(r"(\d+)\s*[xX*]\s*\d", l) or re.search(r"(\d+)\s*(?:adet|psc|qty)", l, re.IGNORECASE)
+        name = re.sub(_L_MONEY_RE, "", l)
+        name = re.sub(r"\b(\d+\s*[xX*]\s*\d+)\b", "", name)
+        name = re.sub(r"\s{2,}", " ", name).strip(":-— ").strip()
+        items.append((name, int(mqty.group(1)) if mqty else 1, price))
+    for l in [l.strip() for l in text.splitlines() if l.strip()]:
+        low = l.lower()
+        if "toplam" in low or "kdv" in low:
+            re.search(r"%\s*(\d+(?:[.,]\d+)?)", low)
+            list(_L_MONEY_RE.finditer(l))
+    return items
+
+
+def _new_extract(text: str):
+    scanned = fields.scan(text)
+    fields.labelled_amounts(scanned)
+    fields.totals(scanned)
+    return fields.items(scanned, text, limit=10_000)
+
+
+_SAMPLE_PAGE = """SERVİS İŞ EMRİ                      Tarih: 12.03.2024
+Müşteri: Ahmet Yılmaz   Tel: 0532 123 45 67   ahmet@example.com
+Plaka: 34 ABC 123   Marka: RENAULT CLIO   KM: 125000 km
+Şikayet: motordan ses geliyor, fren pedalı sert
+Yağ filtresi                       1 x 350,00 TL
+Motor yağı 5W-30                   4 adet 1.250,00
+Hava filtresi                      2 x 180 360,00
+Fren balatası ön                   1.450,00 TL
+İşçilik (2 saat)                   1.200,00
+Polen filtresi                     275,50
+Not: bir sonraki bakım 140000 km
+Ara Toplam: 5.260,50
+KDV %20                            1.052,10
+Genel Toplam                       6.312,60 TL
+"""
+
+
+def fields_microbench(pages: int = 200, repeat: int = 5) -> dict:
+    """Çok sayfalı sentetik metinde eski regex taramaları ile tek geçişi karşılaştır."""
+    text = "\n".join(_SAMPLE_PAGE.replace("12.03", f"{(i % 28) + 1:02d}.03") for i in range(pages))
+    out = {"pages": pages, "chars": len(text)}
+    for name, fn in (("legacy", _legacy_extract), ("single_pass", _new_extract)):
+        best = None
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn(text)
+            ms = (time.perf_counter() - t) * 1000
+            best = ms if best is None else min(best, ms)
+        out[f"{name}_ms"] = round(best, 2)
+    out["speedup"] = round(out["legacy_ms"] / out["single_pass_ms"], 2) if out["single_pass_ms"] else None
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OCR hattı benchmark / doğruluk ölçümü")
+    ap.add_argument("corpus", nargs="?", help="belge klasörü (yanında .json gerçek değerler)")
+    ap.add_argument("--fields-micro", type=int, metavar="SAYFA",
+                    help="yalnızca alan çıkarıcı mikro ölçümü (sentetik N sayfa)")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--no-llm", action="store_true", help="LLM aşamasını atla")
+    ap.add_argument("--llm-latency", type=float, default=0.0, help="sahte Ollama gecikmesi (sn)")
+    ap.add_argument("--save", metavar="JSON", help="sonucu baseline olarak kaydet")
+    ap.add_argument("--compare", metavar="JSON", help="baseline ile karşılaştır")
+    ap.add_argument("--time-tol", type=float, default=0.20, help="izin verilen süre artışı (oran)")
+    ap.add_argument("--acc-tol", type=float, default=0.0, help="izin verilen doğruluk düşüşü")
+    ap.add_argument("--json", action="store_true", help="raporu JSON olarak yaz")
+    args = ap.parse_args(argv)
+
+    if args.fields_micro:
+        res = fields_microbench(args.fields_micro)
+        print(json.dumps(res) if args.json else
+              f"{res['pages']} sayfa / {res['chars']} karakter: eski {res['legacy_ms']} ms, "
+              f"tek geçiş {res['single_pass_ms']} ms (x{res['speedup']})")
+        return 0
+    if not args.corpus:
+        ap.error("corpus gerekli (veya --fields-micro)")
+
+    report = run(args.corpus, repeat=args.repeat, use_llm=not args.no_llm, llm_latency=args.llm_latency)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k != "docs"}, f, ensure_ascii=False, indent=2)
+        print(f"baseline kaydedildi: {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, time_tol=args.time_tol, acc_tol=args.acc_tol)
+        if problems:
+            print("GERİLEME:")
+            for p in problems:
+                print("  - " + p)
+            return 1
+        print("baseline ile karşılaştırma: OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
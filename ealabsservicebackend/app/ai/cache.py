@@ -0,0 +1,172 @@
+# app/ai/cache.py
+"""
+İki katmanlı sonuç önbelleği: süreç içi LRU + SQLite (ai_cache_entries).
+Anahtar içerik hash'inden türetilir; değerler JSON olarak saklanır.
+Boyut sınırı her iki katmanda, isteğe bağlı TTL ise kayıt yaşına göre uygulanır.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from ..database import SessionLocal
+from ..models import CacheEntry
+
+
+class ResultCache:
+    def __init__(self, namespace: str, max_mem_bytes: int, max_disk_bytes: int, ttl: float | None = None):
+        self.namespace = namespace
+        self.max_mem_bytes = max_mem_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl  # saniye; None = süresiz
+        self._mem: OrderedDict[str, tuple[dict, int, float]] = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "evictions": 0, "expired": 0}
+
+    # ---- bellek katmanı ----
+    def _mem_put(self, key: str, value: dict, size: int, stored_at: float):
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old:
+                self._mem_bytes -= old[1]
+            if size > self.max_mem_bytes:
+                return
+            self._mem[key] = (value, size, stored_at)
+            self._mem_bytes += size
+            while self._mem_bytes > self.max_mem_bytes and self._mem:
+                _, (_, sz, _) = self._mem.popitem(last=False)
+                self._mem_bytes -= sz
+                self.counters["evictions"] += 1
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and self._expired(hit[2]):
+                self._mem.pop(key)
+                self._mem_bytes -= hit[1]
+                self.counters["expired"] += 1
+                hit = None
+            if hit:
+                self._mem.move_to_end(key)
+                self.counters["mem_hits"] += 1
+                return hit[0]
+
+        with SessionLocal() as db:
+            row = db.get(CacheEntry, (self.namespace, key))
+            stored_at = (row.created_at - datetime(1970, 1, 1)).total_seconds() if row else 0.0
+            if row and self._expired(stored_at):
+                db.delete(row)
+                db.commit()
+                with self._lock:
+                    self.counters["expired"] += 1
+                row = None
+            if not row:
+                with self._lock:
+                    self.counters["misses"] += 1
+                return None
+            row.last_used_at = datetime.utcnow()
+            value, size = json.loads(row.value), row.size_bytes
+            db.commit()
+
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        self._mem_put(key, value, size, stored_at)
+        return value
+
+    def put(self, key: str, value: dict):
+        raw = json.dumps(value, ensure_ascii=False, default=str)
+        size = len(raw.encode("utf-8"))
+        now = datetime.utcnow()
+        self._mem_put(key, value, size, time.time())
+        with self._lock:
+            self.counters["puts"] += 1
+
+        with SessionLocal() as db:
+            db.merge(CacheEntry(
+                namespace=self.namespace, key=key, value=raw, size_bytes=size,
+                created_at=now, last_used_at=now,
+            ))
+            db.flush()
+            self._evict_disk(db)
+            db.commit()
+
+    def _evict_disk(self, db):
+        """Süresi dolanları, sonra boyut sınırı aşılırsa en uzun süredir kullanılmayanları sil."""
+        if self.ttl is not None:
+            expired = db.query(CacheEntry).filter(
+                CacheEntry.namespace == self.namespace,
+                CacheEntry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl),
+            ).delete(synchronize_session=False)
+            if expired:
+                with self._lock:
+                    self.counters["expired"] += expired
+        total = db.query(func.coalesce(func.sum(CacheEntry.size_bytes), 0)).filter(
+            CacheEntry.namespace == self.namespace
+        ).scalar()
+        while total > self.max_disk_bytes:
+            oldest = (
+                db.query(CacheEntry)
+                .filter(CacheEntry.namespace == self.namespace)
+                .order_by(CacheEntry.last_used_at.asc())
+                .limit(50).all()
+            )
+            if not oldest:
+                break
+            for row in oldest:
+                if total <= self.max_disk_bytes:
+                    break
+                total -= row.size_bytes
+                db.delete(row)
+                with self._lock:
+                    self.counters["evictions"] += 1
+            db.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.counters["mem_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                "namespace": self.namespace,
+                **self.counters,
+                "hit_ratio": round(hits / lookups, 3) if lookups else None,
+                "mem_entries": len(self._mem),
+                "mem_bytes": self._mem_bytes,
+                "max_mem_bytes": self.max_mem_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "ttl_seconds": self.ttl,
+            }
+
+
+def _mb(env: str, default: int) -> int:
+    return int(float(os.getenv(env, str(default))) * 1024 * 1024)
+
+
+# Belge -> OCR metni + parsed JSON (ai/imports)
+ocr_parse_cache = ResultCache(
+    "ocr_parse",
+    max_mem_bytes=_mb("AI_CACHE_MEM_MB", 32),
+    max_disk_bytes=_mb("AI_CACHE_DISK_MB", 512),
+)
+
+# Görsel içerik hash'i + OCR sürümü -> sayfa metni (ai/extract)
+page_text_cache = ResultCache(
+    "page_text",
+    max_mem_bytes=_mb("AI_PAGE_CACHE_MEM_MB", 16),
+    max_disk_bytes=_mb("AI_PAGE_CACHE_DISK_MB", 256),
+)
+
+# Normalize OCR metni + model + prompt sürümü -> model JSON cevabı
+llm_cache = ResultCache(
+    "llm",
+    max_mem_bytes=_mb("AI_LLM_CACHE_MEM_MB", 16),
+    max_disk_bytes=_mb("AI_LLM_CACHE_DISK_MB", 256),
+    ttl=float(os.getenv("AI_LLM_CACHE_TTL_HOURS", "168")) * 3600,
+)
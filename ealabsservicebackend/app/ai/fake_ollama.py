@@ -0,0 +1,108 @@
+# app/ai/fake_ollama.py
+"""
+Gecikme ve hata testleri için sahte Ollama sunucusu (yalnızca stdlib).
+
+    python -m app.ai.fake_ollama --port 11435 --latency 0.8 --fail-rate 0.2
+    OLLAMA_HOST=http://127.0.0.1:11435 uvicorn app.app:app
+
+Modlar:
+  ok      -> geçerli JSON taslak döner
+  garbage -> JSON olmayan metin döner (host sağlıklı, model bozuk)
+  error   -> HTTP 500
+  hang    -> --hang-seconds boyunca cevap vermez (timeout testi)
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PLATE_RE = re.compile(r"\b(\d{2}\s*[A-Z]{1,3}\s*\d{2,5})\b")
+
+
+def _draft_for(prompt: str) -> dict:
+    m = _PLATE_RE.search(prompt)
+    return {
+        "customer": {"type": "person", "name": "Test Müşteri", "phone": None, "email": None},
+        "vehicle": {"plate": re.sub(r"\s+", "", m.group(1)) if m else None,
+                    "brand": None, "model": None, "year": None, "km": None},
+        "startedAt": None,
+        "notes": "fake-ollama",
+        "items": [{"type": "labor", "name": "İşçilik", "qty": 1, "price": 0.0}],
+        "status": "open",
+    }
+
+
+def make_handler(latency: float, jitter: float, fail_rate: float, mode: str, hang_seconds: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, body: dict | str):
+            raw = (body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                return self._send(200, {"models": [{"name": "fake"}]})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/api/generate":
+                return self._send(404, {"error": "not found"})
+
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            if mode == "hang":
+                time.sleep(hang_seconds)
+            if mode == "error" or random.random() < fail_rate:
+                return self._send(500, {"error": "fake failure"})
+            if mode == "garbage":
+                text = "Üzgünüm, bu belgeyi anlayamadım."
+            else:
+                text = "```json\n" + json.dumps(_draft_for(payload.get("prompt") or ""), ensure_ascii=False) + "\n```"
+            self._send(200, {"model": payload.get("model"), "response": text, "done": True})
+
+    return Handler
+
+
+def serve_in_thread(port: int = 0, latency: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+                    mode: str = "ok", hang_seconds: float = 300.0) -> ThreadingHTTPServer:
+    """Arka planda başlat; `server.server_address` ile portu al, `server.shutdown()` ile kapat."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, jitter, fail_rate, mode, hang_seconds))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sahte Ollama sunucusu")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=float, default=0.5, help="saniye")
+    ap.add_argument("--jitter", type=float, default=0.1, help="saniye (+/-)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="0..1 arası HTTP 500 olasılığı")
+    ap.add_argument("--mode", choices=["ok", "garbage", "error", "hang"], default="ok")
+    ap.add_argument("--hang-seconds", type=float, default=300.0)
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port),
+        make_handler(args.latency, args.jitter, args.fail_rate, args.mode, args.hang_seconds),
+    )
+    print(f"fake ollama: http://127.0.0.1:{args.port} (mode={args.mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
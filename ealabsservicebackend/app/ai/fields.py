@@ -0,0 +1,214 @@
+# app/ai/fields.py
+"""
+OCR metni için tek geçişli alan çıkarıcı.
+
+Tüm desenler tek bir derlenmiş regex'te (adlandırılmış gruplar) birleşir; metin
+bir kez `finditer` ile taranır, satırlar NL jetonlarıyla takip edilir. Plaka,
+telefon, e-posta, km, tarihler, para içeren satırlar (toplam/KDV etiketleriyle)
+ve kalem adayları ofsetleriyle döner. ai/service.py ve ai_imports aynı taramayı
+kullanır; metin başına ayrı ayrı regex taraması yapılmaz.
+
+Desen sırası önemlidir: aynı konumda ilk eşleşen kazanır (tarih/plaka/telefon
+rakamları para sayılmaz).
+"""
+import re
+import unicodedata
+from typing import NamedTuple
+
+_SPEC = [
+    ("NL",      r"\n"),
+    ("EMAIL",   r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"),
+    ("DATE",    r"(?<!\d)\d{1,2}[./-]\d{1,2}[./-](?:\d{4}|\d{2})(?!\d)"),
+    ("PHONE",   r"(?<![\d.,])(?:\+?90[ \t]?)?0?[ \t]?\(?\d{3}\)?[ \t-]?\d{3}[ \t-]?\d{2}[ \t-]?\d{2}(?![\d.,])"),
+    ("KM",      r"(?i:\d{4,7}[ \t]?km)\b"),
+    ("PLATE",   r"\b\d{2}[ \t]?(?!(?:KDV|VAT|TL|KM|X)\b)[A-ZÇĞİÖŞÜ]{1,3}[ \t]?\d{2,5}\b"),
+    ("PERCENT", r"%[ \t]*\d+(?:[.,]\d+)?|\d+(?:[.,]\d+)?[ \t]*%"),
+    ("QTY",     r"\d+[ \t]*[xX*][ \t]*(?=\d)"),
+    ("ADET",    r"(?i:\d+[ \t]*(?:adet|psc|qty))"),
+    ("LABEL",   r"(?i:ara[ \t]*toplam|genel[ \t]*toplam|subtotal|toplam|total|kdv|vat)"),
+    # 1.234,56 | 1,234.56 | 1500 | 12,50 (+ TL/₺). Boşluk binlik ayracı sayılmaz:
+    # OCR'da sütunlar boşlukla ayrılır ("2 x 150 300,00" iki tutardır).
+    # Harfe/tireye bitişik rakamlar (5W-30, A123) tutar sayılmaz.
+    ("MONEY",   r"(?<![\w.,-])(?:\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?"
+                r"|\d+(?:[.,]\d{1,2})?)(?![^\W\d_])(?:[ \t]*(?i:TL|₺))?"),
+]
+_TOKEN_RE = re.compile("|".join(f"(?P<{name}>{pat})" for name, pat in _SPEC))
+_WS_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+_LABOR_WORDS = ("işçilik", "iscilik", "emek", "labour", "labor")
+_LABEL_KEYS = {"aratoplam": "ara toplam", "geneltoplam": "genel toplam"}
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+    line: int
+
+
+class Line(NamedTuple):
+    no: int
+    start: int
+    end: int
+    tokens: list
+
+
+def money_value(s: str) -> float:
+    """'1.234,56' / '1,234.56' / '1.500' / '150,5' / '150 TL' -> float."""
+    s = s.upper().replace("TL", "").replace("₺", "").strip().replace(" ", "")
+    if "," in s and "." in s:
+        dec = "," if s.rfind(",") > s.rfind(".") else "."
+        s = s.replace("." if dec == "," else ",", "").replace(dec, ".")
+    elif "," in s or "." in s:
+        sep = "," if "," in s else "."
+        head, _, tail = s.rpartition(sep)
+        # tek ayraç + tam 3 hane -> binlik (1.500), değilse ondalık (12,50)
+        s = s.replace(sep, "") if len(tail) == 3 else head.replace(sep, "") + "." + tail
+    try:
+        return float(s)
+    except ValueError:
+        return 0.0
+
+
+def scan(text: str) -> dict:
+    """
+    Metni tek geçişte tara. Dönüş:
+      plate/phone/email/km: ilk Token (yoksa None)
+      dates:  [Token]
+      lines:  [Line]  yalnızca para/etiket/miktar jetonu olan satırlar
+    """
+    out = {"plate": None, "phone": None, "email": None, "km": None, "dates": [], "lines": []}
+    line_no, line_start, tokens = 0, 0, []
+
+    def close(end: int):
+        if any(t.kind in ("MONEY", "LABEL", "QTY", "ADET") for t in tokens):
+            out["lines"].append(Line(line_no, line_start, end, tokens))
+
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "NL":
+            close(m.start())
+            line_no, line_start, tokens = line_no + 1, m.end(), []
+            continue
+        tok = Token(kind, m.group(), m.start(), m.end(), line_no)
+        if kind == "DATE":
+            out["dates"].append(tok)
+        elif kind in ("PLATE", "PHONE", "EMAIL", "KM"):
+            key = kind.lower()
+            if out[key] is None:
+                out[key] = tok
+        tokens.append(tok)
+    close(len(text))
+    return out
+
+
+_TR_MAP = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u"})
+
+
+def fold(s: str) -> str:
+    """
+    Anahtar kelime eşleme için katlama (search_index.fold ile aynı): Türkçe küçük
+    harf, sonra ASCII. 'IŞÇİLİK', 'ISCILIK', 'Iscilik' -> 'iscilik'.
+    """
+    s = s.replace("İ", "i").replace("I", "ı").lower().translate(_TR_MAP)
+    return "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+
+
+_LABOR_KEYS = tuple(dict.fromkeys(fold(w) for w in _LABOR_WORDS))
+
+
+def is_labor(s: str) -> bool:
+    return any(k in fold(s) for k in _LABOR_KEYS)
+
+
+def _line_text(text: str, line: Line) -> str:
+    return text[line.start:line.end]
+
+
+def _label_key(tok: Token) -> str:
+    key = _WS_RE.sub("", tok.text.lower())
+    return _LABEL_KEYS.get(key, key)
+
+
+def labelled_amounts(result: dict) -> dict[str, float]:
+    """Etiket -> etiketten sonra aynı satırdaki ilk tutar (ör. {'kdv': 300.0, 'toplam': 1800.0})."""
+    amounts = {}
+    for line in result["lines"]:
+        label = None
+        for tok in line.tokens:
+            if tok.kind == "LABEL":
+                label = _label_key(tok)
+            elif tok.kind == "MONEY" and label:
+                amounts[label] = money_value(tok.text)
+                label = None
+    return amounts
+
+
+def totals(result: dict) -> dict:
+    """Satır etiketlerine göre ara toplam / KDV oranı-tutarı / genel toplam (satırdaki son tutar)."""
+    out = {"subtotal": None, "vat_rate": 0.20, "vat_amount": None, "grand_total": None}
+    for line in result["lines"]:
+        labels = {_label_key(t) for t in line.tokens if t.kind == "LABEL"}
+        money = [t for t in line.tokens if t.kind == "MONEY"]
+        if not labels:
+            continue
+        last = money_value(money[-1].text) if money else None
+        if "genel toplam" in labels:
+            if last is not None:
+                out["grand_total"] = last
+        elif labels & {"kdv", "vat"}:
+            perc = next((t for t in line.tokens if t.kind == "PERCENT"), None)
+            if perc:
+                out["vat_rate"] = money_value(perc.text.replace("%", "")) / 100.0
+            if last is not None:
+                out["vat_amount"] = last
+        elif last is not None:
+            out["subtotal"] = last
+    return out
+
+
+def items(result: dict, text: str, limit: int = 20) -> list[dict]:
+    """
+    Tutar geçen (toplam/KDV olmayan) satırlar kalem adayıdır. '3x150', '2 x 120',
+    '4 adet' miktar sayılır. Adaylar satır ofsetleriyle döner.
+    """
+    out = []
+    for line in result["lines"]:
+        money = [t for t in line.tokens if t.kind == "MONEY"]
+        if not money or any(t.kind == "LABEL" for t in line.tokens):
+            continue
+        qty, unit = 1, None
+        for i, t in enumerate(line.tokens):
+            if t.kind in ("QTY", "ADET"):
+                qty = int(_DIGITS_RE.match(t.text).group())
+                nxt = line.tokens[i + 1] if i + 1 < len(line.tokens) else None
+                if t.kind == "QTY" and nxt is not None and nxt.kind == "MONEY":
+                    unit = money_value(nxt.text)
+                break
+        price = money_value(money[-1].text)
+
+        # ad: satırdan tutar/miktar jetonları çıkarılır
+        raw = _line_text(text, line)
+        parts, pos = [], line.start
+        for t in line.tokens:
+            if t.kind in ("MONEY", "QTY", "ADET", "PERCENT"):
+                parts.append(text[pos:t.start])
+                pos = t.end
+        parts.append(text[pos:line.end])
+        name = _WS_RE.sub(" ", "".join(parts)).strip(":-— \t").strip()
+        if len(name) < 3:
+            name = "Kalem"
+        out.append({
+            "type": "labor" if is_labor(raw) else "part",
+            "name": name[:120],
+            "qty": qty,
+            "unit_price": unit,
+            "price": price,
+            "start": line.start,
+            "end": line.end,
+        })
+        if len(out) >= limit:
+            break
+    return out
@@ -0,0 +1,183 @@
+# app/ai/llm.py
+"""
+Paylaşılan Ollama istemcisi:
+- keep-alive bağlantı havuzu (requests.Session)
+- aynı anda en fazla N istek (semafor)
+- keep_alive ile modelin bellekte tutulması
+- devre kesici: host sağlıksızken istek atmadan None döner,
+  çağıran kural tabanlı ayrıştırmaya düşer.
+"""
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def extract_json(raw: str) -> dict | None:
+    """Model cevabından ilk JSON nesnesini çıkar (kod bloğu / ek metin temizlenir)."""
+    raw = (raw or "").strip()
+    if "{" in raw and "}" in raw:
+        raw = raw[raw.find("{"): raw.rfind("}") + 1]
+    try:
+        data = json.loads(raw)
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class CircuitBreaker:
+    """
+    closed: istekler serbest. Art arda `failure_threshold` hata -> open.
+    open: `reset_after` saniye boyunca istek yok. Sonra half-open: tek deneme
+    isteği geçer; başarılıysa closed, değilse tekrar open.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_after: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """İzin alındı ama istek gönderilmedi; deneme hakkını geri ver."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        host: str,
+        model: str,
+        max_in_flight: int = 2,
+        keep_alive: str = "30m",
+        timeout: float = 120.0,
+        connect_timeout: float = 3.0,
+        queue_timeout: float = 30.0,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.host = host.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, timeout)
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "short_circuited": 0, "queue_timeouts": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def generate_json(self, prompt: str, model: str | None = None) -> dict | None:
+        """Bloklayan çağrı; event loop'tan asyncio.to_thread ile çağır."""
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return None
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("queue_timeouts")
+            self.breaker.release_probe()
+            return None
+        try:
+            self._count("requests")
+            resp = self.session.post(
+                f"{self.host}/api/generate",
+                json={
+                    "model": model or self.model,
+                    "prompt": prompt,
+                    "stream": False,
+                    "keep_alive": self.keep_alive,
+                },
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            raw = resp.json().get("response") or ""
+        except (requests.RequestException, ValueError):
+            self._count("errors")
+            self.breaker.record_failure()
+            return None
+        finally:
+            self._slots.release()
+
+        # Host cevap verdi: bozuk JSON model hatasıdır, devre kesiciyi açmaz
+        self.breaker.record_success()
+        self._count("ok")
+        return extract_json(raw)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "host": self.host,
+            "model": self.model,
+            "max_in_flight": self.max_in_flight,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            **counters,
+        }
+
+
+_client: OllamaClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient(
+                host=os.getenv("OLLAMA_HOST", "http://localhost:11434"),
+                model=os.getenv("OLLAMA_MODEL", "llama3"),
+                max_in_flight=int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2")),
+                keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+                timeout=float(os.getenv("OLLAMA_TIMEOUT", "120")),
+                connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3")),
+                queue_timeout=float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30")),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("OLLAMA_BREAKER_FAILURES", "3")),
+                    reset_after=float(os.getenv("OLLAMA_BREAKER_RESET", "30")),
+                ),
+            )
+        return _client
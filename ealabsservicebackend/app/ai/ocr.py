@@ -1,7 +1,11 @@
 # app/ai/ocr.py
 from PIL import Image, ImageOps, ImageFilter
-import pytesseract
 from io import BytesIO
+import time
+from . import ocr_backend
+
+# preprocess / OCR ayarı değişince artır: sayfa metni önbelleği geçersiz olur
+OCR_VERSION = "1"
 
 def preprocess(img: Image.Image) -> Image.Image:
     # Basit netleştirme/kontrast
@@ -14,5 +18,18 @@ def preprocess(img: Image.Image) -> Image.Image:
 def image_bytes_to_text(content: bytes) -> str:
     img = Image.open(BytesIO(content))
     img = preprocess(img)
-    text = pytesseract.image_to_string(img, lang="eng+tur")
+    text = ocr_backend.image_to_string(img, lang="eng+tur")
     return text
+
+def page_text(content: bytes) -> dict:
+    """Süreç havuzunda çalışır: tek görsel -> metin + aşama süreleri (ms)."""
+    t0 = time.perf_counter()
+    img = preprocess(Image.open(BytesIO(content)))
+    t1 = time.perf_counter()
+    text = ocr_backend.image_to_string(img, lang="eng+tur")
+    t2 = time.perf_counter()
+    return {
+        "text": text,
+        "decode_ms": round((t1 - t0) * 1000, 1),
+        "ocr_ms": round((t2 - t1) * 1000, 1),
+    }
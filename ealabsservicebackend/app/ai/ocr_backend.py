@@ -0,0 +1,176 @@
+# app/ai/ocr_backend.py
+"""
+OCR arka ucu: tüm tesseract çağrıları buradan geçer.
+
+- tesserocr kuruluysa: süreç başına kalıcı motor havuzu. Her dil için en fazla
+  OCR_ENGINES_PER_LANG motor açılır, traineddata bellekte kalır. Küçük ROI
+  kırpıntılarında her çağrıda yeni tesseract süreci başlatma maliyeti yok.
+- değilse (veya motor hata verirse): pytesseract (her çağrı ayrı süreç).
+
+Süreç havuzundaki (app.ai.workers) her işçi kendi motorlarını tutar; `warmup`
+işçi açılırken varsayılan dilleri yükler.
+
+    OCR_BACKEND=auto|tesserocr|pytesseract   (varsayılan auto)
+    OCR_ENGINES_PER_LANG=2
+    OCR_WARMUP_LANGS=tur+eng,eng
+"""
+import os
+import queue
+import re
+import threading
+from contextlib import contextmanager
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # opsiyonel bağımlılık
+    tesserocr = None
+
+BACKEND = os.getenv("OCR_BACKEND", "auto")
+ENGINES_PER_LANG = max(1, int(os.getenv("OCR_ENGINES_PER_LANG", "2")))
+WARMUP_LANGS = [l for l in os.getenv("OCR_WARMUP_LANGS", "tur+eng,eng").split(",") if l]
+
+_USE_TESSEROCR = tesserocr is not None and BACKEND in ("auto", "tesserocr")
+
+_pools: dict[str, queue.Queue] = {}
+_created: dict[str, int] = {}
+_broken: set[str] = set()  # motoru açılamayan diller -> doğrudan pytesseract
+_lock = threading.Lock()
+
+
+def backend_name() -> str:
+    return "tesserocr" if _USE_TESSEROCR else "pytesseract"
+
+
+def _new_engine(lang: str):
+    if lang == "osd":
+        # OSD eski (legacy) motoru gerektirir
+        return tesserocr.PyTessBaseAPI(lang="osd", psm=tesserocr.PSM.OSD_ONLY, oem=tesserocr.OEM.DEFAULT)
+    return tesserocr.PyTessBaseAPI(lang=lang, oem=tesserocr.OEM.LSTM_ONLY)
+
+
+@contextmanager
+def _engine(lang: str):
+    """Dil için boş motor al; yoksa sınır dolana kadar yenisini aç, dolduysa bekle."""
+    with _lock:
+        pool = _pools.setdefault(lang, queue.Queue())
+        create = pool.empty() and _created.get(lang, 0) < ENGINES_PER_LANG
+        if create:
+            _created[lang] = _created.get(lang, 0) + 1
+    if create:
+        try:
+            api = _new_engine(lang)
+        except Exception:
+            with _lock:
+                _created[lang] -= 1
+                _broken.add(lang)
+            raise
+    else:
+        while True:
+            try:
+                api = pool.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if lang in _broken:
+                    raise RuntimeError(f"OCR motoru açılamadı: {lang}")
+    try:
+        yield api
+    finally:
+        api.Clear()
+        pool.put(api)
+
+
+def _use_engine(lang: str) -> bool:
+    return _USE_TESSEROCR and lang not in _broken
+
+
+def warmup(langs: list[str] | None = None):
+    """Motorları önceden aç (işçi süreç başlangıcında)."""
+    if not _USE_TESSEROCR:
+        return
+    for lang in langs or WARMUP_LANGS:
+        try:
+            with _engine(lang):
+                pass
+        except Exception:
+            pass
+
+
+# ---------- Ortak API (pytesseract ile aynı biçimde sonuç) ----------
+
+def _tesserocr_data(img: Image.Image, lang: str, psm: int) -> dict:
+    RIL = tesserocr.RIL
+    keys = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+            "left", "top", "width", "height", "conf", "text")
+    data = {k: [] for k in keys}
+    with _engine(lang) as api:
+        api.SetPageSegMode(psm)
+        api.SetImage(img)
+        api.Recognize()
+        it = api.GetIterator()
+        if it is None:
+            return data
+        block = par = line = word = 0
+        while True:
+            if it.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+            if it.IsAtBeginningOf(RIL.PARA):
+                par, line, word = par + 1, 0, 0
+            if it.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            box = it.BoundingBox(RIL.WORD)
+            txt = it.GetUTF8Text(RIL.WORD)
+            if box and txt is not None:
+                x1, y1, x2, y2 = box
+                for k, v in (("level", 5), ("page_num", 1), ("block_num", block), ("par_num", par),
+                             ("line_num", line), ("word_num", word), ("left", x1), ("top", y1),
+                             ("width", x2 - x1), ("height", y2 - y1),
+                             ("conf", round(it.Confidence(RIL.WORD), 2)), ("text", txt)):
+                    data[k].append(v)
+            if not it.Next(RIL.WORD):
+                break
+    return data
+
+
+def image_to_data(img: Image.Image, lang: str = "tur+eng", psm: int = 6) -> dict:
+    """Kelime kutuları + güven (pytesseract.Output.DICT ile aynı anahtarlar)."""
+    if _use_engine(lang):
+        try:
+            return _tesserocr_data(img, lang, psm)
+        except Exception:
+            pass
+    return pytesseract.image_to_data(
+        img, lang=lang, config=f"--oem 1 --psm {psm}", output_type=pytesseract.Output.DICT
+    )
+
+
+def image_to_string(img: Image.Image, lang: str = "eng", psm: int = 3) -> str:
+    if _use_engine(lang):
+        try:
+            with _engine(lang) as api:
+                api.SetPageSegMode(psm)
+                api.SetImage(img)
+                return api.GetUTF8Text()
+        except Exception:
+            pass
+    return pytesseract.image_to_string(img, lang=lang, config=f"--psm {psm}")
+
+
+def osd_rotation(img: Image.Image) -> int:
+    """Sayfayı düzeltmek için gereken dönüş açısı (0/90/180/270; tesseract 'Rotate')."""
+    if _use_engine("osd"):
+        try:
+            with _engine("osd") as api:
+                api.SetImage(img)
+                res = api.DetectOrientationScript()
+            if res:
+                return (360 - int(res["orient_deg"])) % 360
+            return 0
+        except Exception:
+            pass
+    osd = pytesseract.image_to_osd(img)
+    m = re.search(r"Rotate:\s*(\d+)", osd)
+    return int(m.group(1)) % 360 if m else 0
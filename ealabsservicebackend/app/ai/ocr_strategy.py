@@ -0,0 +1,189 @@
+# app/ai/ocr_strategy.py
+"""
+Tam sayfa OCR için uyarlanabilir strateji motoru.
+Adaylar tesseract kelime güveniyle puanlanır, eşik aşılınca durulur.
+Form tipine göre kazanan strateji kaydedilir; sonraki belgede önce o denenir.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+from . import ocr_backend
+from ..database import SessionLocal
+from ..models import OcrStrategyStat
+
+# (lang, psm) — varsayılan sıra ucuzdan pahalıya
+STRATEGIES = [
+    ("tur+eng", 6),  # tek sütun/karışık blok
+    ("tur+eng", 4),  # sütunlu
+    ("eng", 6),
+    ("eng", 4),
+]
+CONF_THRESHOLD = float(os.getenv("AI_OCR_CONF_THRESHOLD", "75"))
+MIN_CHARS = 10
+_STATS_TTL = 60.0
+# kazanma oranı önseli: az denenmiş strateji 1/len(STRATEGIES) oranına çekilir
+_PRIOR_RUNS = float(os.getenv("AI_OCR_PRIOR_RUNS", "4"))
+
+_order_cache: dict[str, tuple[float, list[tuple[str, int]]]] = {}
+_lock = threading.Lock()
+
+
+def strategy_name(lang: str, psm: int) -> str:
+    return f"{lang}/psm{psm}"
+
+
+def data_to_text(data: dict) -> str:
+    """image_to_data çıktısından satır satır düz metin üret."""
+    lines: dict[tuple, list[str]] = {}
+    for i, txt in enumerate(data["text"]):
+        txt = (txt or "").strip()
+        if not txt:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(txt)
+    return "\n".join(" ".join(ws) for _, ws in sorted(lines.items()))
+
+
+def score(data: dict, text: str) -> float:
+    """Karakter ağırlıklı ortalama kelime güveni (0..100). Çok kısa çıktı 0 alır."""
+    if len(text.strip()) <= MIN_CHARS:
+        return 0.0
+    total = weight = 0.0
+    for i, txt in enumerate(data["text"]):
+        txt = (txt or "").strip()
+        conf = float(data["conf"][i])
+        if not txt or conf < 0:
+            continue
+        total += conf * len(txt)
+        weight += len(txt)
+    return round(total / weight, 1) if weight else 0.0
+
+
+def run_strategy(img: Image.Image, lang: str, psm: int) -> dict:
+    t = time.perf_counter()
+    data = ocr_backend.image_to_data(img, lang=lang, psm=psm)
+    text = data_to_text(data)
+    return {
+        "strategy": strategy_name(lang, psm),
+        "text": text,
+        "score": score(data, text),
+        "data": data,
+        "ms": round((time.perf_counter() - t) * 1000, 1),
+    }
+
+
+def _ordered_strategies(form_type: str) -> list[tuple[str, int]]:
+    now = time.monotonic()
+    with _lock:
+        hit = _order_cache.get(form_type)
+        if hit and now - hit[0] < _STATS_TTL:
+            return hit[1]
+    stats = {}
+    try:
+        with SessionLocal() as db:
+            for row in db.query(OcrStrategyStat).filter(OcrStrategyStat.form_type == form_type):
+                stats[row.strategy] = (row.wins or 0, row.runs or 0)
+    except Exception:
+        pass
+    # kazanma oranı (wins / runs) önselle yumuşatılır: çok denenmiş ama az kazanan
+    # strateji, az denenmiş iyi stratejinin önüne salt sayıyla geçemez;
+    # eşitlikte varsayılan (ucuz) sıra
+    prior = 1.0 / len(STRATEGIES)
+
+    def rate(s):
+        wins, runs = stats.get(strategy_name(*s), (0, 0))
+        return (wins + _PRIOR_RUNS * prior) / (runs + _PRIOR_RUNS)
+
+    order = sorted(STRATEGIES, key=lambda s: -rate(s))
+    with _lock:
+        _order_cache[form_type] = (now, order)
+    return order
+
+
+def _record(form_type: str, winner: str, tried: list[str]):
+    try:
+        with SessionLocal() as db:
+            for name in tried:
+                row = db.get(OcrStrategyStat, (form_type, name))
+                if not row:
+                    row = OcrStrategyStat(form_type=form_type, strategy=name, wins=0, runs=0)
+                    db.add(row)
+                row.runs += 1
+                if name == winner:
+                    row.wins += 1
+            db.commit()
+    except Exception:
+        pass
+
+
+def _idle_cores() -> int:
+    try:
+        return max(0, int((os.cpu_count() or 1) - 1 - os.getloadavg()[0]))
+    except OSError:
+        return 0
+
+
+def ocr_best(img: Image.Image, form_type: str = "photo") -> dict:
+    """
+    Stratejileri öğrenilmiş sırayla dene. İlk aday eşiği geçerse dur.
+    Geçemezse kalan adaylar boş çekirdek sayısı kadar paralel, yoksa sırayla
+    çalışır; en yüksek puanlı sonuç döner. Eşik aşılınca başlamamış adaylar
+    iptal edilir, çalışanlar (tesseract çağrısı kesilemez) dönmeden beklenir:
+    istek bittikten sonra arka planda OCR kalmaz.
+    """
+    order = _ordered_strategies(form_type)
+    candidates = []
+
+    def attempt(lang, psm):
+        try:
+            return run_strategy(img, lang, psm)
+        except Exception:
+            return None
+
+    first = attempt(*order[0])
+    if first:
+        candidates.append(first)
+    rest = order[1:]
+
+    if not (first and first["score"] >= CONF_THRESHOLD) and rest:
+        workers = min(len(rest), _idle_cores())
+        if workers > 1:
+            ex = ThreadPoolExecutor(max_workers=workers)
+            futures = [ex.submit(attempt, *s) for s in rest]
+            try:
+                for fut in as_completed(futures):
+                    res = fut.result()
+                    if res:
+                        candidates.append(res)
+                        if res["score"] >= CONF_THRESHOLD:
+                            break
+            finally:
+                # başlamamışları iptal et, çalışanları bekle (sızıntı yok)
+                ex.shutdown(wait=True, cancel_futures=True)
+        else:
+            for s in rest:
+                res = attempt(*s)
+                if res:
+                    candidates.append(res)
+                    if res["score"] >= CONF_THRESHOLD:
+                        break
+
+    if not candidates:
+        return {"strategy": None, "text": ocr_backend.image_to_string(img), "score": 0.0, "data": None}
+
+    best = max(candidates, key=lambda c: c["score"])
+    if best["score"] > 0:
+        _record(form_type, best["strategy"], [c["strategy"] for c in candidates])
+        with _lock:
+            _order_cache.pop(form_type, None)
+    return best
+
+
+def strategy_stats() -> list[dict]:
+    with SessionLocal() as db:
+        rows = db.query(OcrStrategyStat).order_by(OcrStrategyStat.form_type, OcrStrategyStat.wins.desc()).all()
+        return [{"form_type": r.form_type, "strategy": r.strategy, "wins": r.wins, "runs": r.runs} for r in rows]
@@ -1,16 +1,19 @@
 # app/ai/router.py
 from fastapi import APIRouter, UploadFile, File
 from typing import List
+import time
 from .schemas import ExtractResponse, ApproveRequest
-from .service import extract_from_images
+from .service import extract_from_uploads
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 @router.post("/extract", response_model=ExtractResponse)
 async def extract(files: List[UploadFile] = File(...)):
     # accept: image/*, application/pdf (pdf ileride)
-    result, raw_text = extract_from_images(files)
-    return {"result": result, "raw_text": raw_text}
+    t0 = time.perf_counter()
+    result, raw_text, pages = await extract_from_uploads(files)
+    return {"result": result, "raw_text": raw_text, "pages": pages,
+            "total_ms": round((time.perf_counter() - t0) * 1000, 1)}
 
 @router.post("/approve")
 async def approve(payload: ApproveRequest):
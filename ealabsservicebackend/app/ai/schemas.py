@@ -35,9 +35,20 @@ class ExtractResult(BaseModel):
     total: Optional[float] = None
     low_confidence_fields: List[str] = []
 
+class PageTiming(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    cached: bool = False
+    decode_ms: float = 0.0
+    ocr_ms: float = 0.0
+    total_ms: float = 0.0
+    error: Optional[str] = None
+
 class ExtractResponse(BaseModel):
     result: ExtractResult
     raw_text: str
+    pages: List[PageTiming] = []
+    total_ms: Optional[float] = None
 
 class ApproveRequest(BaseModel):
     # Onaylanmış payload; şimdilik DB’ye yazmıyoruz, sadece normalleştirilmiş veri döner.
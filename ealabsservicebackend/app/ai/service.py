@@ -1,7 +1,12 @@
 # app/ai/service.py
-from .schemas import ExtractResult, CustomerGuess, VehicleGuess, OrderItemGuess
-from .ocr import image_bytes_to_text
-from . import parsers
+import asyncio
+import hashlib
+import time
+
+from .schemas import ExtractResult, CustomerGuess, VehicleGuess, OrderItemGuess, PageTiming
+from .ocr import image_bytes_to_text, page_text, OCR_VERSION
+from .cache import page_text_cache
+from . import fields, parsers, workers
 
 def merge_texts(texts):
     # çoklu görselde birleştir, sırayla
@@ -15,10 +20,44 @@ def extract_from_images(files) -> (ExtractResult, str):
     for f in files:
         content = f.file.read()
         raw_texts.append(image_bytes_to_text(content))
+    return result_from_texts(raw_texts)
+
+async def _page(index: int, f) -> tuple[str, PageTiming]:
+    t0 = time.perf_counter()
+    content = await f.read()
+    key = f"{hashlib.sha256(content).hexdigest()}:{OCR_VERSION}"
+    hit = await asyncio.to_thread(page_text_cache.get, key)
+    if hit is not None:
+        timing = PageTiming(index=index, filename=f.filename, cached=True,
+                            total_ms=round((time.perf_counter() - t0) * 1000, 1))
+        return hit["text"], timing
+    try:
+        res = await workers.run_in_pool(page_text, content)
+    except RuntimeError as e:
+        # bozuk/desteklenmeyen görsel: diğer sayfalar yine işlenir
+        timing = PageTiming(index=index, filename=f.filename, error=str(e)[:200],
+                            total_ms=round((time.perf_counter() - t0) * 1000, 1))
+        return "", timing
+    await asyncio.to_thread(page_text_cache.put, key, {"text": res["text"]})
+    timing = PageTiming(index=index, filename=f.filename, decode_ms=res["decode_ms"], ocr_ms=res["ocr_ms"],
+                        total_ms=round((time.perf_counter() - t0) * 1000, 1))
+    return res["text"], timing
+
+async def extract_from_uploads(files) -> (ExtractResult, str, list):
+    """
+    Görseller süreç havuzunda eşzamanlı OCR edilir (event loop bloklanmaz),
+    sayfa sırası korunur. Aynı görselin metni içerik hash'iyle önbellekten gelir.
+    Dönüş: (sonuç, birleşik metin, sayfa süreleri)
+    """
+    pages = await asyncio.gather(*(_page(i, f) for i, f in enumerate(files)))
+    result, raw_text = result_from_texts([text for text, _ in pages])
+    return result, raw_text, [timing for _, timing in pages]
 
+def result_from_texts(raw_texts) -> (ExtractResult, str):
     raw_text = merge_texts(raw_texts)
-    basic = parsers.extract_simple_fields(raw_text)
-    items_raw = parsers.extract_items(raw_text)
+    scanned = fields.scan(raw_text)
+    basic = parsers.extract_simple_fields(raw_text, scanned)
+    items_raw = parsers.extract_items(raw_text, scanned)
 
     low = []
 
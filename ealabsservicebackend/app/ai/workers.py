@@ -0,0 +1,65 @@
+# app/ai/workers.py
+"""
+CPU-ağır işler (OCR, görüntü işleme) için paylaşılan süreç havuzu.
+Route'lar işi buraya gönderir; event loop bloklanmaz.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Havuz boyutu: varsayılan CPU sayısı
+MAX_WORKERS = max(1, int(os.getenv("AI_WORKERS", str(os.cpu_count() or 2))))
+
+_pool: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def _init_worker():
+    # OCR motorlarını (traineddata) işçi açılırken yükle; işçi yaşadıkça bellekte kalır
+    from . import ocr_backend
+    ocr_backend.warmup()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: uvicorn süreci thread'li, fork yerine temiz süreç başlat
+        _pool = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _pool
+
+
+def slots() -> asyncio.Semaphore:
+    """
+    Havuzdaki boş işçi sayısı kadar izin. İzni alan iş "running" sayılır,
+    bekleyenler "queued" kalır.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_WORKERS)
+    return _slots
+
+
+def _guarded(fn, *args):
+    # Bazı kütüphane hataları (ör. TesseractNotFoundError) pickle ile geri
+    # yüklenemiyor ve havuzu "broken" hale getiriyor; düz RuntimeError'a çevir.
+    try:
+        return fn(*args)
+    except Exception as e:
+        raise RuntimeError(f"{e.__class__.__name__}: {e}") from None
+
+
+async def run_in_pool(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), _guarded, fn, *args)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,319 @@
+# app/analytics.py
+"""
+Gelir / iş yükü analitiği için günlük özet tablosu (daily_rollups).
+
+Her veritabanında (app.db service_orders, service.db orders) gün x marka başına
+tek satır: sipariş adedi, KDV hariç / KDV / genel toplam, parça ve işçilik
+(KDV hariç). Gün, siparişin açılış zamanıdır (orders.started_at,
+service_orders.opened_at); iptal edilen iş emirleri sayılmaz. Panel sorguları
+yalnızca bu tabloyu okur: maliyet gün sayısıyla orantılı, kalem sayısından
+bağımsız.
+
+Artımlı güncelleme (kayıtlı her SessionLocal için):
+- after_flush: yazılan sipariş / kalem / araç (marka) kayıtlarından etkilenen
+  sipariş, araç ve günler toplanır (değişen tarih ve taşınan kalemin eski
+  değerleri dahil),
+- before_commit: etkilenen her gün kaynaktan yeniden hesaplanır (aynı
+  transaction'da; o günün siparişleri kadar maliyet, kayma birikmez).
+
+Toplamlar siparişte saklanan değerlerdir (app.totals). Açık iş emri yaşlandırma
+özet tablosundan değil, yalnızca açık siparişlerden hesaplanır (status index'i).
+
+    python -m app.analytics rebuild [--db app|service|all]
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import (
+    Column, Date, DateTime, Integer, MetaData, Numeric, String, Table, and_, delete, event, func, inspect,
+    select, true,
+)
+from sqlalchemy.orm import Session
+
+from .totals import money
+
+# yaşlandırma aralıkları (gün): 0-7, 8-30, 31-90, 90+
+AGING_BUCKETS = [(0, 7), (8, 30), (31, 90), (91, None)]
+_ITEM_TOTALS = {"part": "parts_total", "labor": "labor_total"}
+
+
+class Source(NamedTuple):
+    table: Table
+    order: type
+    item: type
+    vehicle: type
+    day_attr: str      # sipariş tarihi kolonu
+    item_fk: str       # kalem -> sipariş kolonu
+    price_attr: str    # kalem birim fiyat kolonu
+
+
+_SOURCES: dict[str, Source] = {}
+
+
+def _rollup_table(metadata: MetaData) -> Table:
+    if "daily_rollups" in metadata.tables:
+        return metadata.tables["daily_rollups"]
+    return Table(
+        "daily_rollups", metadata,
+        Column("day", Date, primary_key=True),
+        Column("brand", String(64), primary_key=True),  # büyük harf; bilinmiyorsa ''
+        Column("order_count", Integer, nullable=False, default=0),
+        Column("subtotal", Numeric(14, 2), nullable=False, default=0),
+        Column("vat_total", Numeric(14, 2), nullable=False, default=0),
+        Column("grand_total", Numeric(14, 2), nullable=False, default=0),
+        Column("parts_total", Numeric(14, 2), nullable=False, default=0),
+        Column("labor_total", Numeric(14, 2), nullable=False, default=0),
+        Column("updated_at", DateTime, nullable=False, default=datetime.utcnow),
+    )
+
+
+def source(target: str) -> Source:
+    return _SOURCES[target]
+
+
+# ---------- hesaplama ----------
+
+def _as_day(value) -> date | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)[:10]).date()
+
+
+def recompute_day(db: Session, src: Source, day: date) -> int:
+    """Günün satırlarını kaynaktan yeniden yaz (commit etmez). Dönüş: marka sayısı."""
+    o, i, v = src.order, src.item, src.vehicle
+    day_col = getattr(o, src.day_attr)
+    start = datetime.combine(day, time.min)
+    in_day = and_(day_col >= start, day_col < start + timedelta(days=1), o.status != "cancelled")
+    brand = func.upper(func.coalesce(v.brand, ""))
+
+    rows: dict[str, dict] = {}
+    for b, n, sub, vat, grand in db.execute(
+        select(brand, func.count(o.id), func.sum(o.subtotal), func.sum(o.vat_total), func.sum(o.grand_total))
+        .join(v, v.id == o.vehicle_id)
+        .where(in_day)
+        .group_by(brand)
+    ):
+        rows[b] = {"day": day, "brand": b, "order_count": n, "subtotal": money(sub),
+                   "vat_total": money(vat), "grand_total": money(grand),
+                   "parts_total": money(0), "labor_total": money(0), "updated_at": datetime.utcnow()}
+    line = func.round(i.qty * func.coalesce(getattr(i, src.price_attr), 0), 2)
+    for b, kind, amount in db.execute(
+        select(brand, i.type, func.sum(line))
+        .select_from(i)
+        .join(o, o.id == getattr(i, src.item_fk))
+        .join(v, v.id == o.vehicle_id)
+        .where(in_day)
+        .group_by(brand, i.type)
+    ):
+        if b in rows and kind in _ITEM_TOTALS:
+            rows[b][_ITEM_TOTALS[kind]] += money(amount)
+
+    t = src.table
+    db.execute(delete(t).where(t.c.day == day))
+    if rows:
+        db.execute(t.insert(), list(rows.values()))
+    return len(rows)
+
+
+def rebuild(db: Session, target: str) -> int:
+    """Özet tablosunu sıfırdan doldur. Dönüş: gün sayısı."""
+    src = _SOURCES[target]
+    day_col = getattr(src.order, src.day_attr)
+    days = sorted({_as_day(d) for (d,) in db.execute(select(func.date(day_col)).distinct()) if d})
+    db.execute(delete(src.table))
+    for day in days:
+        recompute_day(db, src, day)
+    return len(days)
+
+
+# ---------- oturum olayları ----------
+
+def _history_old(obj, attr: str) -> list:
+    return [x for x in (inspect(obj).attrs[attr].history.deleted or ()) if x is not None]
+
+
+def register(target: str, session_factory, metadata: MetaData, order: type, item: type, vehicle: type,
+             day_attr: str, item_fk: str, price_attr: str) -> Source:
+    """Kaynağı tanımla (özet tablosu `metadata`'ya eklenir) ve oturum olaylarını bağla."""
+    src = Source(_rollup_table(metadata), order, item, vehicle, day_attr, item_fk, price_attr)
+    _SOURCES[target] = src
+    key = f"rollup_{target}"
+
+    def after_flush(session, _ctx):
+        pending = session.info.setdefault(key, {"days": set(), "orders": set(), "vehicles": set()})
+        for obj in (*session.new, *session.dirty):
+            if isinstance(obj, order):
+                pending["orders"].add(obj.id)
+                pending["days"].update(_as_day(d) for d in _history_old(obj, day_attr))
+            elif isinstance(obj, item):
+                pending["orders"].add(getattr(obj, item_fk))
+                pending["orders"].update(_history_old(obj, item_fk))
+            elif isinstance(obj, vehicle) and inspect(obj).attrs.brand.history.has_changes():
+                pending["vehicles"].add(obj.id)
+        for obj in session.deleted:
+            if isinstance(obj, order):
+                # satır silindi: tarih yüklü nesneden
+                pending["days"].add(_as_day(inspect(obj).dict.get(day_attr)))
+            elif isinstance(obj, item):
+                pending["orders"].add(inspect(obj).dict.get(item_fk))
+
+    def before_commit(session):
+        if session.new or session.dirty or session.deleted:
+            session.flush()  # bekleyen yazılar toplansın
+        pending = session.info.pop(key, None)
+        if not pending:
+            return
+        day_col = getattr(order, day_attr)
+        days = {d for d in pending["days"] if d}
+        orders = {x for x in pending["orders"] if x is not None}
+        if orders:
+            days.update(_as_day(d) for (d,) in session.execute(select(day_col).where(order.id.in_(orders))))
+        if pending["vehicles"]:
+            days.update(_as_day(d) for (d,) in session.execute(
+                select(day_col).where(order.vehicle_id.in_(pending["vehicles"]))
+            ))
+        for day in sorted(d for d in days if d):
+            recompute_day(session, src, day)
+
+    def after_rollback(session):
+        session.info.pop(key, None)
+
+    event.listen(session_factory, "after_flush", after_flush)
+    event.listen(session_factory, "before_commit", before_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
+    return src
+
+
+# ---------- panel sorguları ----------
+
+def session_for(target: str) -> Session:
+    if target == "app":
+        from .database import SessionLocal
+    else:
+        from .main import SessionLocal
+    return SessionLocal()
+
+
+def _range_filter(t: Table, date_from: date | None, date_to: date | None):
+    conds = []
+    if date_from:
+        conds.append(t.c.day >= date_from)
+    if date_to:
+        conds.append(t.c.day <= date_to)
+    return and_(*conds) if conds else true()
+
+
+def daily_revenue(db: Session, target: str, date_from: date | None, date_to: date | None) -> list[dict]:
+    t = _SOURCES[target].table
+    rows = db.execute(
+        select(t.c.day, func.sum(t.c.order_count), func.sum(t.c.subtotal), func.sum(t.c.vat_total),
+               func.sum(t.c.grand_total))
+        .where(_range_filter(t, date_from, date_to))
+        .group_by(t.c.day)
+        .order_by(t.c.day)
+    )
+    return [{"day": d, "order_count": n, "subtotal": float(money(s)), "vat_total": float(money(v)),
+             "grand_total": float(money(g))} for d, n, s, v, g in rows]
+
+
+def monthly_revenue(db: Session, target: str, date_from: date | None, date_to: date | None) -> list[dict]:
+    months: dict[str, dict] = {}
+    for row in daily_revenue(db, target, date_from, date_to):
+        m = months.setdefault(row["day"].strftime("%Y-%m"), {"order_count": 0, "subtotal": money(0),
+                                                             "vat_total": money(0), "grand_total": money(0)})
+        m["order_count"] += row["order_count"]
+        for k in ("subtotal", "vat_total", "grand_total"):
+            m[k] += money(row[k])
+    return [{"month": k, "order_count": m["order_count"],
+             **{f: float(m[f]) for f in ("subtotal", "vat_total", "grand_total")}}
+            for k, m in sorted(months.items())]
+
+
+def parts_vs_labor(db: Session, target: str, date_from: date | None, date_to: date | None) -> dict:
+    t = _SOURCES[target].table
+    parts, labor = db.execute(
+        select(func.sum(t.c.parts_total), func.sum(t.c.labor_total)).where(_range_filter(t, date_from, date_to))
+    ).one()
+    parts, labor = money(parts), money(labor)
+    total = parts + labor
+    return {
+        "parts": float(parts),
+        "labor": float(labor),
+        "parts_share": float(round(parts / total, 4)) if total else 0.0,
+        "labor_share": float(round(labor / total, 4)) if total else 0.0,
+    }
+
+
+def avg_ticket_by_brand(db: Session, target: str, date_from: date | None, date_to: date | None) -> list[dict]:
+    t = _SOURCES[target].table
+    rows = db.execute(
+        select(t.c.brand, func.sum(t.c.order_count), func.sum(t.c.grand_total))
+        .where(_range_filter(t, date_from, date_to))
+        .group_by(t.c.brand)
+    )
+    out = [{"brand": b or None, "order_count": n, "revenue": float(money(g)),
+            "avg_ticket": float(money(money(g) / n)) if n else 0.0} for b, n, g in rows]
+    return sorted(out, key=lambda r: -r["revenue"])
+
+
+def open_order_aging(db: Session, target: str, now: datetime | None = None) -> list[dict]:
+    src = _SOURCES[target]
+    o = src.order
+    now = now or datetime.utcnow()
+    buckets = [{"range": f"{lo}-{hi}" if hi is not None else f"{lo}+", "order_count": 0,
+                "grand_total": money(0), "oldest": None} for lo, hi in AGING_BUCKETS]
+    for opened, grand in db.execute(
+        select(getattr(o, src.day_attr), o.grand_total).where(o.status == "open")
+    ):
+        age = (now.date() - _as_day(opened)).days if opened else 0
+        for b, (lo, hi) in zip(buckets, AGING_BUCKETS):
+            if age >= lo and (hi is None or age <= hi):
+                b["order_count"] += 1
+                b["grand_total"] += money(grand)
+                b["oldest"] = max(b["oldest"] or 0, age)
+                break
+    for b in buckets:
+        b["grand_total"] = float(b["grand_total"])
+    return buckets
+
+
+# ---------- app.db modelleri ----------
+
+def _register_app_models():
+    from . import models
+    from .database import Base, SessionLocal
+    register("app", SessionLocal, Base.metadata, models.ServiceOrder, models.ServiceItem, models.Vehicle,
+             day_attr="opened_at", item_fk="service_order_id", price_attr="unit_price")
+
+
+if __name__ != "__main__":
+    _register_app_models()
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Günlük analitik özet tablosu")
+    ap.add_argument("cmd", choices=["rebuild"])
+    ap.add_argument("--db", choices=["app", "service", "all"], default="all")
+    args = ap.parse_args(argv)
+
+    from . import migrations
+    for target in (["app", "service"] if args.db == "all" else [args.db]):
+        migrations.ensure_current(target)
+        with session_for(target) as db:
+            n = rebuild(db, target)
+            db.commit()
+        print(f"{target}: {n} gün yeniden hesaplandı")
+
+
+if __name__ == "__main__":
+    # `python -m` bu dosyayı ayrı bir modül olarak yükler; kayıtlar paket modülünde
+    from app import analytics
+    analytics.main()
@@ -1,9 +1,51 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+_is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if _is_sqlite else {}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+if _is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # Birden fazla uvicorn worker aynı dosyaya yazabilsin
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
+
+def ensure_columns(bind, metadata):
+    """
+    create_all mevcut tablolara kolon/index eklemez; eksikleri tamamla.
+    (SQLite: ALTER TABLE ... ADD COLUMN, nullable/default'suz eklenir.)
+    `bind` Engine ya da açık transaction'lı Connection olabilir (app.migrations).
+    """
+    if isinstance(bind, Connection):
+        _add_missing(bind, metadata)
+    else:
+        with bind.begin() as conn:
+            _add_missing(conn, metadata)
+
+
+def _add_missing(conn, metadata):
+    insp = inspect(conn)
+    existing_tables = set(insp.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have:
+                continue
+            coltype = col.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {coltype}'))
+        for idx in table.indexes:
+            idx.create(bind=conn, checkfirst=True)
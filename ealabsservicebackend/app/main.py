@@ -2,9 +2,10 @@
 from __future__ import annotations
 
 from datetime import datetime
+from decimal import Decimal
 from typing import List, Optional, Literal, Annotated
 
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, ConfigDict
 from sqlalchemy import (
@@ -12,9 +13,12 @@ from sqlalchemy import (
     String,
     Integer,
     Float,
+    Numeric,
+    Text,
     DateTime,
     ForeignKey,
     func,
+    or_,
     select,
     Index,
 )
@@ -23,16 +27,21 @@ from sqlalchemy.orm import (
     Mapped,
     mapped_column,
     relationship,
+    selectinload,
     sessionmaker,
     Session,
 )
-from .database import Base as AuthBase, engine as AuthEngine, SessionLocal as AuthSession
+from .database import SessionLocal as AuthSession
+from . import analytics, migrations, pagination, plate_index, search_index, totals
 from .routers import customers, files, plates, search, service_orders, smart, vehicles
 from .routers import auth_routes, admin_users, ai_imports, export
+from .routers import analytics as analytics_routes
 from .models import Role, User, UserRole 
 from .auth import hash_password
 import os
+import threading
 from app.ai.router import router as ai_router
+from app.ai import workers as ai_workers
 
 # ========= DB SETUP =========
 DB_URL = "sqlite:///./service.db"  # proje kökünde service.db dosyası oluşur.
@@ -91,10 +100,22 @@ class Order(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # saklanan toplamlar (app.totals): kalemler her yazıldığında güncellenir
+    subtotal: Mapped[Decimal] = mapped_column(Numeric(12, 2), default=0)
+    vat_total: Mapped[Decimal] = mapped_column(Numeric(12, 2), default=0)
+    grand_total: Mapped[Decimal] = mapped_column(Numeric(12, 2), default=0)
+    vat_breakdown: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # {"0.20": "matrah"}
+
     customer: Mapped[Customer] = relationship(back_populates="orders")
     vehicle: Mapped[Vehicle] = relationship(back_populates="orders")
     items: Mapped[List[OrderItem]] = relationship(back_populates="order", cascade="all,delete-orphan")
 
+    __table_args__ = (
+        Index("ix_orders_vehicle_created", "vehicle_id", "created_at"),
+        Index("ix_orders_created_id", "created_at", "id"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -105,12 +126,32 @@ class OrderItem(Base):
     name: Mapped[str] = mapped_column(String(255))
     qty: Mapped[int] = mapped_column(Integer, default=1)
     price: Mapped[float] = mapped_column(Float, default=0.0)
+    vat_rate: Mapped[float] = mapped_column(Float, default=totals.DEFAULT_VAT_RATE)
 
     order: Mapped[Order] = relationship(back_populates="items")
 
+    __table_args__ = (
+        Index("ix_order_items_order", "order_id"),
+    )
+
+
+# arama index'i (service.db): ad / telefon / e-posta, araç plaka / marka / model
+search_index.register(Customer, "customer", lambda c: (c.name, f"{search_index.digits(c.phone)} {c.email or ''}", ""))
+search_index.register(Vehicle, "vehicle", lambda v: (f"{v.brand or ''} {v.model or ''}", "", v.plate))
+
+
+def _service_plates():
+    with SessionLocal() as db:
+        return db.execute(select(Vehicle.plate, Vehicle.id)).all()
+
+
+# analitik günlük özetleri (service.db): sipariş / kalem / marka yazımlarında artımlı
+analytics.register("service", SessionLocal, Base.metadata, Order, OrderItem, Vehicle,
+                   day_attr="started_at", item_fk="order_id", price_attr="price")
 
-def create_db():
-    Base.metadata.create_all(engine)
+
+# bulanık plaka index'i (service.db): içe aktarmada OCR hatalı plakayı mevcut araca eşlemek için
+plate_index.register("service", Vehicle, "plate", _service_plates)
 
 
 # ========= Pydantic Schemas =========
@@ -119,6 +160,7 @@ class OrderItemIn(BaseModel):
     name: str
     qty: int = Field(ge=1)
     price: float = Field(ge=0)
+    vat_rate: float = Field(totals.DEFAULT_VAT_RATE, ge=0, le=1)
 
 
 class CustomerIn(BaseModel):
@@ -154,6 +196,7 @@ class OrderItemOut(BaseModel):
     name: str
     qty: int
     price: float
+    vat_rate: Optional[float] = None
 
 
 class CustomerOut(BaseModel):
@@ -177,6 +220,12 @@ class VehicleOut(BaseModel):
     km: Optional[int]
 
 
+class VatLineOut(BaseModel):
+    rate: float
+    base: float
+    vat: float
+
+
 class ServiceOrderOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -186,7 +235,11 @@ class ServiceOrderOut(BaseModel):
     status: Literal["open", "closed"]
     created_at: datetime
     updated_at: datetime
-    total: float
+    total: float  # KDV hariç (subtotal ile aynı; eski istemciler)
+    subtotal: float
+    vat_total: float
+    grand_total: float
+    vat_breakdown: List[VatLineOut]
 
     customer: CustomerOut
     vehicle: VehicleOut
@@ -202,8 +255,8 @@ def get_db() -> Session:
         db.close()
 
 
-def compute_total(items: List[OrderItem]) -> float:
-    return round(sum(i.qty * (i.price or 0) for i in items), 2)
+def _item_lines(items: List[OrderItemIn]):
+    return [(it.qty, it.price, it.vat_rate) for it in items]
 
 
 def upsert_customer(db: Session, payload: CustomerIn) -> Customer:
@@ -268,17 +321,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER],
 )
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db()
+    # şema sürümü güncelse tek sorgu; değilse kilit altında bir kez yükseltilir
+    migrations.ensure_current("service")
     # örnek lookup için bir araç seed (sadece yoksa)
     with SessionLocal() as db:
         if not db.scalar(select(Vehicle).where(Vehicle.plate == "PB7219KE")):
             db.add(Vehicle(plate="PB7219KE", brand="FORD", model="FOCUS", year=2009))
             db.commit()
+    # bulanık plaka index'leri arka planda yüklensin
+    threading.Thread(target=plate_index.warm, daemon=True).start()
 
 
 # ========= Health / Root =========
@@ -299,6 +356,27 @@ def vehicle_by_plate(plate: str, db: Session = Depends(get_db)):
     return v  # None dönerse 200 + null
 
 
+@app.get("/vehicles/search", response_model=List[VehicleOut], tags=["vehicles"])
+def vehicle_search(q: Annotated[str, Query(min_length=1)], limit: int = 10, db: Session = Depends(get_db)):
+    """Marka / model / plaka ile araç arama (bm25 sıralı; geniş sorgu sınırı müşteri aramasındaki gibi)."""
+    # FTS5 (app.search_index): marka / model / plaka, bm25 sıralı
+    refs = search_index.search(db, q, "vehicle", limit)
+    if refs == [] and " " in q.strip():
+        # plaka boşluklu yazılmış olabilir ("34 ABC 123"); index'te bitişik
+        refs = search_index.search(db, q.replace(" ", ""), "vehicle", limit)
+    if refs is None:
+        ql = f"%{q.strip().lower()}%"
+        return db.scalars(
+            select(Vehicle).where(or_(
+                func.lower(Vehicle.brand).like(ql),
+                func.lower(Vehicle.model).like(ql),
+                func.lower(Vehicle.plate).like(ql.replace(" ", "")),
+            )).limit(limit)
+        ).all()
+    rows = {v.id: v for v in db.scalars(select(Vehicle).where(Vehicle.id.in_([int(r) for r in refs])))}
+    return [rows[int(r)] for r in refs if int(r) in rows]
+
+
 @app.get("/vehicles/{vehicle_id}", response_model=VehicleOut, tags=["vehicles"])
 def vehicle_get(vehicle_id: int, db: Session = Depends(get_db)):
     v = db.get(Vehicle, vehicle_id)
@@ -310,14 +388,24 @@ def vehicle_get(vehicle_id: int, db: Session = Depends(get_db)):
 # ========= Customers =========
 @app.get("/customers/search", response_model=List[CustomerOut], tags=["customers"])
 def customer_search(q: Annotated[str, Query(min_length=1)], limit: int = 10, db: Session = Depends(get_db)):
-    ql = f"%{q.lower()}%"
-    rows = db.scalars(select(Customer).where(func.lower(Customer.name).like(ql)).limit(limit)).all()
-    return rows
+    """
+    Ad / telefon / e-posta ile müşteri arama (bm25 sıralı). Çok geniş sorgularda
+    ("yilmaz") yalnızca en yeni SEARCH_RANK_CANDIDATES (500) eşleşme sıralanır;
+    daha eski kayıt için sorguyu daraltın (ad + soyad, telefon parçası).
+    """
+    # FTS5 (app.search_index): Türkçe katlama + trigram/önek, bm25 sıralı
+    refs = search_index.search(db, q, "customer", limit)
+    if refs is None:
+        ql = f"%{q.lower()}%"
+        return db.scalars(select(Customer).where(func.lower(Customer.name).like(ql)).limit(limit)).all()
+    rows = {c.id: c for c in db.scalars(select(Customer).where(Customer.id.in_([int(r) for r in refs])))}
+    return [rows[int(r)] for r in refs if int(r) in rows]
 
 
 # ========= Orders =========
 def order_to_out(o: Order) -> ServiceOrderOut:
     # manual map: Pydantic alias (startedAt) için started_at alan adı korunur
+    # toplamlar sipariş satırından okunur (kalemler toplanmaz)
     return ServiceOrderOut(
         id=o.id,
         started_at=o.started_at,
@@ -325,30 +413,59 @@ def order_to_out(o: Order) -> ServiceOrderOut:
         status=o.status,  # type: ignore
         created_at=o.created_at,
         updated_at=o.updated_at,
-        total=compute_total(o.items),
+        total=float(o.subtotal or 0),
+        subtotal=float(o.subtotal or 0),
+        vat_total=float(o.vat_total or 0),
+        grand_total=float(o.grand_total or 0),
+        vat_breakdown=totals.vat_rows(o),
         customer=o.customer,
         vehicle=o.vehicle,
         items=o.items,
     )
 
 
+def _with_relations(stmt):
+    """
+    Liste uçları için: sayfa 1 sorgu + customer/vehicle/items için birer toplu
+    (IN) sorgu. Sayfa büyüklüğünden bağımsız 4 sorgu; toplamlar sipariş satırında.
+    """
+    return stmt.options(
+        selectinload(Order.customer),
+        selectinload(Order.vehicle),
+        selectinload(Order.items),
+    )
+
+
+def _list_orders(db: Session, stmt) -> List[ServiceOrderOut]:
+    return [order_to_out(o) for o in db.scalars(_with_relations(stmt)).all()]
+
+
 @app.get("/orders", response_model=List[ServiceOrderOut], tags=["orders"])
 def orders_list(
+    response: Response,
     db: Session = Depends(get_db),
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Önceki cevabın X-Next-Cursor başlığı"),
+    page: int = Query(1, ge=1, deprecated=True, description="OFFSET sayfalama (eski istemciler); cursor kullanın"),
     size: int = Query(50, ge=1, le=200),
     plate: Optional[str] = None,
     status: Optional[Literal["open", "closed"]] = None,
 ):
-    stmt = select(Order).order_by(Order.created_at.desc())
+    stmt = select(Order)
     if plate:
         stmt = stmt.join(Order.vehicle).where(Vehicle.plate == plate.strip().upper())
     if status:
         stmt = stmt.where(Order.status == status)
 
-    stmt = stmt.limit(size).offset((page - 1) * size)
-    rows = db.scalars(stmt).unique().all()
-    return [order_to_out(o) for o in rows]
+    if cursor is None and page > 1:
+        # eski istemciler: OFFSET (derin sayfalarda yavaşlar)
+        stmt = stmt.order_by(Order.created_at.desc(), Order.id.desc()).limit(size).offset((page - 1) * size)
+        return _list_orders(db, stmt)
+
+    # keyset: (created_at, id) index'inden devam; her sayfa aynı maliyette
+    stmt = pagination.keyset(_with_relations(stmt), Order.created_at, Order.id, cursor, size)
+    rows, next_cursor = pagination.split(db.execute(stmt).all(), size)
+    pagination.set_next_cursor(response, next_cursor)
+    return [order_to_out(o) for (o,) in rows]
 
 
 @app.get("/orders/{order_id}", response_model=ServiceOrderOut, tags=["orders"])
@@ -361,10 +478,8 @@ def orders_get(order_id: int, db: Session = Depends(get_db)):
 
 @app.get("/orders/by-plate/{plate}", response_model=List[ServiceOrderOut], tags=["orders"])
 def orders_by_plate(plate: str, db: Session = Depends(get_db)):
-    rows = db.scalars(
-        select(Order).join(Order.vehicle).where(Vehicle.plate == plate.strip().upper()).order_by(Order.created_at.desc())
-    ).unique().all()
-    return [order_to_out(o) for o in rows]
+    stmt = select(Order).join(Order.vehicle).where(Vehicle.plate == plate.strip().upper()).order_by(Order.created_at.desc())
+    return _list_orders(db, stmt)
 
 
 @app.post("/orders", response_model=ServiceOrderOut, tags=["orders"])
@@ -383,7 +498,8 @@ def orders_create(payload: ServiceOrderIn, db: Session = Depends(get_db)):
     db.flush()  # o.id
 
     for it in payload.items:
-        db.add(OrderItem(order=o, type=it.type, name=it.name, qty=it.qty, price=it.price))
+        db.add(OrderItem(order=o, type=it.type, name=it.name, qty=it.qty, price=it.price, vat_rate=it.vat_rate))
+    totals.apply(o, _item_lines(payload.items))
 
     db.commit()
     db.refresh(o)
@@ -412,7 +528,8 @@ def orders_update(order_id: int, payload: OrderUpdateIn, db: Session = Depends(g
         for ex in list(o.items):
             db.delete(ex)
         for it in payload.items:
-            db.add(OrderItem(order=o, type=it.type, name=it.name, qty=it.qty, price=it.price))
+            db.add(OrderItem(order=o, type=it.type, name=it.name, qty=it.qty, price=it.price, vat_rate=it.vat_rate))
+        totals.apply(o, _item_lines(payload.items))
 
     db.commit()
     db.refresh(o)
@@ -430,8 +547,10 @@ def orders_delete(order_id: int, db: Session = Depends(get_db)):
 
 @app.on_event("startup")
 def on_startup_auth_seed():
-    # 1) Auth tablolarını oluştur
-    AuthBase.metadata.create_all(bind=AuthEngine)
+    # 1) app.db şemasını güncelle (app.migrations)
+    migrations.ensure_current("app")
+    # önceki süreçten queued/running/committing'de kalmış importları kurtar
+    ai_imports.start_sweeper()
 
     # 2) OWNER + AI_DIRECTOR seed
     owner_email = os.getenv("OWNER_EMAIL")
@@ -472,16 +591,24 @@ def on_startup_auth_seed():
         finally:
             db.close()
 
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # OCR süreç havuzunu kapat
+    ai_workers.shutdown()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:8080","http://127.0.0.1:8080"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER],
 )
 
 app.include_router(auth_routes.router)
 app.include_router(admin_users.router)
 app.include_router(ai_imports.router)
 app.include_router(ai_router)
-app.include_router(export.router)
\ No newline at end of file
+app.include_router(export.router)
+app.include_router(analytics_routes.router)
\ No newline at end of file
@@ -0,0 +1,352 @@
+# app/migrations.py
+"""
+Sürümlü şema göçleri (app.db ve service.db).
+
+Her veritabanında `schema_migrations` tablosu uygulanan sürümleri tutar. Uvicorn
+worker'ları açılışta `ensure_current` çağırır: şema güncelse tek bir sorgu
+yapılır; değilse dosya kilidi alınır, sürüm yeniden okunur ve eksik adımlar
+bir kez uygulanır (aynı anda açılan diğer worker'lar kilitte bekler, sonra
+güncel şemayı görür).
+
+Dağıtım adımı olarak da çalıştırılabilir:
+
+    python -m app.migrations upgrade            # iki veritabanı
+    python -m app.migrations status --db app
+    python -m app.migrations check              # EXPLAIN QUERY PLAN: sıcak sorgular index kullanıyor mu
+
+MIGRATE_ON_STARTUP=0 ise worker'lar yükseltme yapmaz; şema geride kaldıysa
+açılış hata verir (göç dağıtımda çalıştırılmalı).
+
+Yeni adım eklerken: listenin sonuna bir sonraki sürümle ekleyin. İlk adım
+(baseline) tabloları güncel modellerden oluşturduğu için adımlar tekrar
+çalıştırılabilir yazılır (IF NOT EXISTS / eksik kolon kontrolü).
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: tek worker varsayılır, kilit yok
+    fcntl = None
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") != "0"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _sql(*statements: str) -> Callable[[Connection], None]:
+    def run(conn: Connection):
+        for stmt in statements:
+            conn.execute(text(stmt))
+    return run
+
+
+# ---------- Hedefler ----------
+
+def _app_target():
+    from . import models  # noqa: F401  (tabloları metadata'ya kaydet)
+    from .database import Base, engine
+    return engine, Base.metadata
+
+
+def _service_target():
+    from . import main
+    return main.engine, main.Base.metadata
+
+
+TARGETS: dict[str, Callable] = {"app": _app_target, "service": _service_target}
+
+
+# ---------- Adımlar ----------
+
+def _app_baseline(conn: Connection):
+    # eski açılıştaki create_all + ensure_columns
+    from .database import ensure_columns
+    _, metadata = _app_target()
+    metadata.create_all(bind=conn)
+    ensure_columns(conn, metadata)
+
+
+def _service_baseline(conn: Connection):
+    _, metadata = _service_target()
+    metadata.create_all(bind=conn)
+
+
+def _search_index(target: str) -> Callable[[Connection], None]:
+    def run(conn: Connection):
+        from . import search_index
+        _, metadata = TARGETS[target]()
+        search_index.install(conn, metadata)
+    return run
+
+
+def _order_totals(target: str) -> Callable[[Connection], None]:
+    def run(conn: Connection):
+        from . import totals
+        from .database import ensure_columns
+        _, metadata = TARGETS[target]()
+        ensure_columns(conn, metadata)  # toplam kolonları (+ service: order_items.vat_rate)
+        if target == "service":
+            conn.execute(text("UPDATE order_items SET vat_rate = :r WHERE vat_rate IS NULL"),
+                         {"r": totals.DEFAULT_VAT_RATE})
+        totals.backfill(conn, target)
+    return run
+
+
+def _daily_rollups(target: str, *statements: str) -> Callable[[Connection], None]:
+    def run(conn: Connection):
+        from sqlalchemy.orm import Session
+        from . import analytics
+        _, metadata = TARGETS[target]()
+        metadata.tables["daily_rollups"].create(bind=conn, checkfirst=True)
+        _sql(*statements)(conn)
+        analytics.rebuild(Session(bind=conn), target)
+    return run
+
+
+MIGRATIONS: dict[str, list[Migration]] = {
+    "app": [
+        Migration(1, "baseline", _app_baseline),
+        Migration(2, "hot_query_indexes", _sql(
+            "CREATE INDEX IF NOT EXISTS ix_plates_norm_valid ON plates (plate_normalized, valid_to, valid_from)",
+            # tek kolonlu index bileşiğin öneki; planlayıcı onu seçip ORDER BY için ayrıca sıralıyordu
+            "DROP INDEX IF EXISTS ix_plates_plate_normalized",
+            "CREATE INDEX IF NOT EXISTS ix_ownerships_vehicle_dates ON ownerships (vehicle_id, to_date, from_date)",
+            "CREATE INDEX IF NOT EXISTS ix_ownerships_customer ON ownerships (customer_id)",
+            "CREATE INDEX IF NOT EXISTS ix_service_orders_vehicle_opened ON service_orders (vehicle_id, opened_at)",
+            "CREATE INDEX IF NOT EXISTS ix_service_items_order ON service_items (service_order_id)",
+        )),
+        Migration(3, "keyset_indexes", _sql(
+            "CREATE INDEX IF NOT EXISTS ix_customers_created_id ON customers (created_at, id)",
+        )),
+        Migration(4, "search_fts", _search_index("app")),
+        Migration(5, "order_totals", _order_totals("app")),
+        Migration(6, "daily_rollups", _daily_rollups(
+            "app",
+            "CREATE INDEX IF NOT EXISTS ix_service_orders_opened ON service_orders (opened_at)",
+            "CREATE INDEX IF NOT EXISTS ix_service_orders_status_opened ON service_orders (status, opened_at)",
+        )),
+    ],
+    "service": [
+        Migration(1, "baseline", _service_baseline),
+        Migration(2, "hot_query_indexes", _sql(
+            "CREATE INDEX IF NOT EXISTS ix_orders_vehicle_created ON orders (vehicle_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_order_items_order ON order_items (order_id)",
+        )),
+        Migration(3, "keyset_indexes", _sql(
+            "CREATE INDEX IF NOT EXISTS ix_orders_created_id ON orders (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_status_created_id ON orders (status, created_at, id)",
+        )),
+        Migration(4, "search_fts", _search_index("service")),
+        Migration(5, "order_totals", _order_totals("service")),
+        Migration(6, "daily_rollups", _daily_rollups("service")),
+    ],
+}
+
+
+# ---------- Sıcak sorgular (EXPLAIN QUERY PLAN) ----------
+
+# (ad, SQL, beklenen index) — router'lardaki sorguların SQL karşılıkları
+HOT_QUERIES: dict[str, list[tuple[str, str, str]]] = {
+    "app": [
+        ("vehicles.by_plate: plaka",
+         "SELECT * FROM plates WHERE plate_normalized = :p"
+         " ORDER BY valid_to IS NULL DESC, valid_from DESC LIMIT 1",
+         "ix_plates_norm_valid"),
+        ("search.plate / snapshots.lookup: aktif plaka (güncel sahip)",
+         "SELECT * FROM plates WHERE plate_normalized = :p AND valid_to IS NULL"
+         " ORDER BY valid_from DESC LIMIT 1",
+         "ix_plates_norm_valid"),
+        ("vehicles.by_plate: sahiplik",
+         "SELECT * FROM ownerships WHERE vehicle_id = :p"
+         " ORDER BY to_date IS NULL DESC, from_date DESC LIMIT 1",
+         "ix_ownerships_vehicle_dates"),
+        ("vehicles.by_plate: son iş emri",
+         "SELECT * FROM service_orders WHERE vehicle_id = :p"
+         " ORDER BY closed_at IS NULL DESC, closed_at DESC, opened_at DESC LIMIT 1",
+         "ix_service_orders_vehicle_opened"),
+        ("service_orders: kalemler",
+         "SELECT * FROM service_items WHERE service_order_id = :p",
+         "ix_service_items_order"),
+        ("customers.list: keyset",
+         "SELECT * FROM customers WHERE (created_at, id) < (:p, :p)"
+         " ORDER BY created_at DESC, id DESC LIMIT 101",
+         "ix_customers_created_id"),
+        ("snapshots.lookup: satır",
+         "SELECT * FROM vehicle_snapshots WHERE vehicle_id = :p",
+         "sqlite_autoindex_vehicle_snapshots_1"),
+        ("analytics: gün özeti",
+         "SELECT * FROM service_orders WHERE opened_at >= :p AND opened_at < :p",
+         "ix_service_orders_opened"),
+        ("analytics: açık iş emri yaşlandırma",
+         "SELECT opened_at, grand_total FROM service_orders WHERE status = :p",
+         "ix_service_orders_status_opened"),
+    ],
+    "service": [
+        ("orders.by_plate",
+         "SELECT orders.* FROM orders JOIN vehicles ON vehicles.id = orders.vehicle_id"
+         " WHERE vehicles.plate = :p ORDER BY orders.created_at DESC",
+         "ix_orders_vehicle_created"),
+        ("orders.list: keyset",
+         "SELECT * FROM orders WHERE (created_at, id) < (:p, :p)"
+         " ORDER BY created_at DESC, id DESC LIMIT 51",
+         "ix_orders_created_id"),
+        ("orders.list: durum + keyset",
+         "SELECT * FROM orders WHERE status = :p AND (created_at, id) < (:p, :p)"
+         " ORDER BY created_at DESC, id DESC LIMIT 51",
+         "ix_orders_status_created_id"),
+        ("orders: kalemler",
+         "SELECT * FROM order_items WHERE order_id = :p",
+         "ix_order_items_order"),
+    ],
+}
+
+
+# ---------- Çalıştırıcı ----------
+
+_current: set[str] = set()  # bu süreçte güncel olduğu doğrulanan hedefler
+
+
+def head(target: str) -> int:
+    return MIGRATIONS[target][-1].version
+
+
+def _ensure_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.connect() as conn:
+        try:
+            return {v for (v,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+        except Exception:
+            return set()  # tablo yok: hiç göç uygulanmamış
+
+
+def _lock_path(engine: Engine, target: str) -> str:
+    db = engine.url.database
+    if engine.dialect.name == "sqlite" and db and db != ":memory:":
+        return f"{os.path.abspath(db)}.migrate.lock"
+    return os.path.join(tempfile.gettempdir(), f"ealabs-{target}.migrate.lock")
+
+
+@contextmanager
+def _file_lock(path: str):
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def upgrade(target: str) -> list[str]:
+    """Eksik adımları kilit altında sırayla uygula. Dönüş: uygulanan adımlar."""
+    engine, _ = TARGETS[target]()
+    done = []
+    with _file_lock(_lock_path(engine, target)):
+        have = applied_versions(engine)  # kilit alındıktan sonra yeniden oku
+        for m in MIGRATIONS[target]:
+            if m.version in have:
+                continue
+            with engine.begin() as conn:
+                _ensure_table(conn)
+                m.apply(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": m.version, "n": m.name, "t": datetime.utcnow()},
+                )
+            done.append(f"{target}:{m.version:03d}_{m.name}")
+    _current.add(target)
+    return done
+
+
+def ensure_current(target: str) -> list[str]:
+    """Açılışta çağrılır: güncelse tek sorgu, değilse (izin varsa) yükselt."""
+    if target in _current:
+        return []
+    engine, _ = TARGETS[target]()
+    missing = {m.version for m in MIGRATIONS[target]} - applied_versions(engine)
+    if not missing:
+        _current.add(target)
+        return []
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"{target} şeması güncel değil (eksik sürümler: {sorted(missing)}); "
+            "'python -m app.migrations upgrade' çalıştırın"
+        )
+    return upgrade(target)
+
+
+def status(target: str) -> list[tuple[int, str, bool]]:
+    engine, _ = TARGETS[target]()
+    have = applied_versions(engine)
+    return [(m.version, m.name, m.version in have) for m in MIGRATIONS[target]]
+
+
+def check(target: str) -> list[dict]:
+    """Sıcak sorguların planını al; beklenen index kullanılmıyorsa ok=False."""
+    engine, _ = TARGETS[target]()
+    if engine.dialect.name != "sqlite":
+        return []
+    out = []
+    with engine.connect() as conn:
+        for name, sql, index in HOT_QUERIES[target]:
+            try:
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {"p": "X"})]
+            except Exception as e:  # tablo yok vb.
+                plan = [f"hata: {e.__class__.__name__}: {e}"]
+            out.append({
+                "query": name,
+                "index": index,
+                "ok": any(f"INDEX {index} " in f"{step} " for step in plan),
+                "plan": plan,
+            })
+    return out
+
+
+# ---------- CLI ----------
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Şema göçleri (app.db / service.db)")
+    ap.add_argument("cmd", choices=["upgrade", "status", "check"])
+    ap.add_argument("--db", choices=["app", "service", "all"], default="all")
+    args = ap.parse_args(argv)
+    targets = list(TARGETS) if args.db == "all" else [args.db]
+
+    failed = 0
+    for target in targets:
+        if args.cmd == "upgrade":
+            done = upgrade(target)
+            print(f"{target}: " + (", ".join(done) if done else f"güncel (sürüm {head(target)})"))
+        elif args.cmd == "status":
+            for version, name, ok in status(target):
+                print(f"{target} {version:03d}_{name}: {'uygulandı' if ok else 'bekliyor'}")
+        else:
+            for r in check(target):
+                failed += not r["ok"]
+                print(f"[{'OK' if r['ok'] else 'YOK'}] {target} {r['query']} -> {r['index']}")
+                for step in r["plan"]:
+                    print(f"      {step}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
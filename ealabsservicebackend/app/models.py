@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Integer, Text, Float, Numeric, Date, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, Text, Float, Numeric, Date, ForeignKey, UniqueConstraint, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -17,6 +17,10 @@ class Customer(Base):
     type = Column(String, default="individual")
     created_at = Column(DateTime, server_default=func.now())
     ownerships = relationship("Ownership", back_populates="customer")
+    __table_args__ = (
+        # keyset sayfalama (app.pagination)
+        Index("ix_customers_created_id", "created_at", "id"),
+    )
 
 class Vehicle(Base):
     __tablename__ = "vehicles"
@@ -35,10 +39,14 @@ class Plate(Base):
     __tablename__ = "plates"
     id = uuid_col(True)
     vehicle_id = Column(String, ForeignKey("vehicles.id"), nullable=False)
-    plate_normalized = Column(String, nullable=False, index=True)
+    plate_normalized = Column(String, nullable=False)
     valid_from = Column(Date, nullable=False, server_default=func.current_date())
     valid_to = Column(Date)
     vehicle = relationship("Vehicle", back_populates="plates")
+    __table_args__ = (
+        # plakadan arama: eşitlik + güncel kayıt (valid_to NULL) + en yeni valid_from
+        Index("ix_plates_norm_valid", "plate_normalized", "valid_to", "valid_from"),
+    )
 
 class Ownership(Base):
     __tablename__ = "ownerships"
@@ -49,6 +57,10 @@ class Ownership(Base):
     to_date = Column(Date)
     vehicle = relationship("Vehicle", back_populates="ownerships")
     customer = relationship("Customer", back_populates="ownerships")
+    __table_args__ = (
+        Index("ix_ownerships_vehicle_dates", "vehicle_id", "to_date", "from_date"),
+        Index("ix_ownerships_customer", "customer_id"),
+    )
 
 class ServiceOrder(Base):
     __tablename__ = "service_orders"
@@ -61,8 +73,19 @@ class ServiceOrder(Base):
     status = Column(String, default="open")  # open|completed|cancelled
     notes = Column(Text)
     source = Column(String, default="manual")  # manual|ocr
+    # saklanan toplamlar (app.totals): kalemler her yazıldığında güncellenir
+    subtotal = Column(Numeric(12, 2), default=0)
+    vat_total = Column(Numeric(12, 2), default=0)
+    grand_total = Column(Numeric(12, 2), default=0)
+    vat_breakdown = Column(Text)  # {"0.20": "matrah"} (JSON)
     vehicle = relationship("Vehicle", back_populates="service_orders")
     items = relationship("ServiceItem", back_populates="order", cascade="all, delete-orphan")
+    __table_args__ = (
+        Index("ix_service_orders_vehicle_opened", "vehicle_id", "opened_at"),
+        # analitik: gün özeti yeniden hesaplama (tarih aralığı) ve açık iş emri yaşlandırma
+        Index("ix_service_orders_opened", "opened_at"),
+        Index("ix_service_orders_status_opened", "status", "opened_at"),
+    )
 
 class ServiceItem(Base):
     __tablename__ = "service_items"
@@ -74,15 +97,19 @@ class ServiceItem(Base):
     unit_price = Column(Numeric(12, 2), default=0)
     vat_rate = Column(Float, default=0.20)
     order = relationship("ServiceOrder", back_populates="items")
+    __table_args__ = (
+        Index("ix_service_items_order", "service_order_id"),
+    )
 
 class File(Base):
     __tablename__ = "files"
     id = uuid_col(True)
     path = Column(String, nullable=False)
-    kind = Column(String, default="scan")  # scan|photo|pdf
+    kind = Column(String, default="scan")  # scan|photo|pdf|legacy (storage migrate)
     status = Column(String, default="raw")  # raw|linked
     service_order_id = Column(String, ForeignKey("service_orders.id"))
     vehicle_id = Column(String, ForeignKey("vehicles.id"))
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
     created_at = Column(DateTime, server_default=func.now())
 
 class User(Base):
@@ -123,8 +150,64 @@ class ImportedDocument(Base):
     __tablename__ = "imported_documents"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
-    status = Column(String(20), default="queued")  # queued/parsed/failed
-    original_url = Column(String(512))
+    status = Column(String(20), default="queued", index=True)  # queued/running/parsed/failed/committing/committed
+    original_url = Column(String(512))  # yüklenen dosyanın saklandığı yol
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
     parsed_json = Column(Text, nullable=True)
-    confidence = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    confidence = Column(Float, nullable=True)  # kural/ROI taslağının güveni (kapı alanlarının en düşüğü)
+    field_sources_json = Column(Text, nullable=True)  # alan -> {source: roi|rules|llm|default, confidence}
+    raw_text = Column(Text, nullable=True)  # sadece debug amaçlı
+    llm_used = Column(Boolean, default=False)
+    llm_model = Column(String(100), nullable=True)
+    llm_cached = Column(Boolean, default=False)  # LLM cevabı önbellekten mi geldi
+    timings_json = Column(Text, nullable=True)  # aşama süreleri (ms)
+    error = Column(Text, nullable=True)
+    order_id = Column(Integer, nullable=True)  # to-order sonrası service.db Order.id
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_imported_documents_user_status", "user_id", "status", "created_at"),
+    )
+
+class CacheEntry(Base):
+    __tablename__ = "ai_cache_entries"
+    namespace = Column(String(50), primary_key=True)  # ocr_parse | llm | page_text ...
+    key = Column(String(200), primary_key=True)       # içerik hash'i + pipeline sürümü
+    value = Column(Text, nullable=False)              # JSON
+    size_bytes = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_ai_cache_ns_last_used", "namespace", "last_used_at"),
+    )
+
+class OcrStrategyStat(Base):
+    __tablename__ = "ocr_strategy_stats"
+    form_type = Column(String(50), primary_key=True)  # photo | pdf ...
+    strategy = Column(String(50), primary_key=True)   # ör. "tur+eng/psm6"
+    wins = Column(Integer, nullable=False, default=0)
+    runs = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)  # içerik adresi
+    ext = Column(String(16), nullable=False, default=".bin")
+    size_bytes = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)  # File + ImportedDocument referansları
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class VehicleSnapshot(Base):
+    """Plakadan araç aramaları için denormalize satır; app.snapshots tarafından güncel tutulur."""
+    __tablename__ = "vehicle_snapshots"
+    vehicle_id = Column(String, ForeignKey("vehicles.id", ondelete="CASCADE"), primary_key=True)
+    plate_normalized = Column(String, index=True)  # güncel plaka
+    brand = Column(String)
+    model = Column(String)
+    year = Column(Integer)
+    customer_id = Column(String)
+    customer_name = Column(String)
+    customer_email = Column(String)
+    customer_phone = Column(String)
+    last_km = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,71 @@
+# app/pagination.py
+"""
+(created_at, id) üzerinden keyset (cursor) sayfalama.
+
+OFFSET yerine son satırın anahtarından devam edilir; (created_at, id) index'i ile
+her sayfa aynı maliyettedir. Cursor istemci için opaktır (base64); sonraki
+sayfanın cursor'ı `X-Next-Cursor` başlığında döner (yoksa son sayfa), gövde
+biçimi değişmez.
+
+    stmt = keyset(select(Order), Order.created_at, Order.id, cursor, limit)
+    rows, next_cursor = split(db.execute(stmt).all(), limit)
+    set_next_cursor(response, next_cursor)
+
+Anahtar, veritabanında saklandığı haliyle (SQLite'ta metin) karşılaştırılır:
+server_default ile yazılan '2024-01-01 10:00:00' ile Python'un yazdığı
+'2024-01-01 10:00:00.000000' aynı datetime'a çözülür ama aynı metin değildir.
+"""
+import base64
+import json
+
+from fastapi import HTTPException, Response
+from sqlalchemy import String, tuple_, type_coerce
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(ts, id_) -> str:
+    raw = json.dumps([str(ts) if ts is not None else None, id_], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, object]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id_ = json.loads(raw)
+        if not isinstance(ts, str) or not isinstance(id_, (int, str)):
+            raise ValueError
+        return ts, id_
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+
+def keyset(stmt, created_col, id_col, cursor: str | None, limit: int):
+    """
+    Select/Query'ye yeni->eski sıralama, cursor filtresi ve limit+1 ekle. Satırların
+    sonuna (saklanan created_at, id) kolonları eklenir; `split` bunları ayırır.
+    """
+    stored_ts = type_coerce(created_col, String)  # SQL'de CAST yok: index kullanılır
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        stmt = stmt.filter(tuple_(stored_ts, id_col) < tuple_(ts, last_id))
+    return (
+        stmt.add_columns(stored_ts.label("cursor_ts"), id_col.label("cursor_id"))
+        .order_by(None)
+        .order_by(created_col.desc(), id_col.desc())
+        .limit(limit + 1)
+    )
+
+
+def split(rows, limit: int) -> tuple[list, str | None]:
+    """`keyset` sonuçlarını (cursor kolonları çıkarılmış satırlar, sonraki cursor) olarak ayır."""
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last[-2], last[-1])
+    return [tuple(r[:-2]) for r in rows[:limit]], next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,343 @@
+# app/plate_index.py
+"""
+OCR hatalarına dayanıklı bulanık plaka index'i (bellekte, süreç başına).
+
+OCR plakalarda O/0, I/1, Z/2, B/8, S/5, G/6 karıştırır. Aday bulma:
+1) iskelet: her karakter karışma sınıfının temsilcisine çevrilir
+   ("34ABO12" ve "34AB012" aynı iskelet) -> sözlükten O(1),
+2) iskelet trigramları (ters index) -> ortak trigram sayısına göre en iyi adaylar,
+3) adaylar karışma ağırlıklı edit mesafesiyle sıralanır (aynı sınıf içi
+   değişim 0.2, diğer değişim / ekleme / silme 1).
+
+İki kaynak ayrı tutulur: "app" (app.db plates, historik plakalar dahil ->
+vehicle_id) ve "service" (service.db vehicles.plate -> id). İlk kullanımda
+yüklenir; kayıtlı modellerin insert/update/delete olayları oturumda biriktirilir
+ve commit'ten sonra uygulanır (rollback'te atılır, index'e hayalet plaka girmez),
+diğer worker'ların yazdıkları için PLATE_INDEX_TTL saniyede bir yeniden yüklenir.
+
+`correct_ocr` ROI'den okunan plakayı konuma göre düzeltir: il kodu ve son
+blok rakam, ortadaki blok harf olmalıdır (yalnızca karışma sınıfı içinde).
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, NamedTuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+TTL = float(os.getenv("PLATE_INDEX_TTL", "300"))
+MAX_CANDIDATES = 8
+_BIG_POSTING = 1000  # bundan büyük trigram listeleri ("^34" gibi) sayılmaz
+
+# 01-81 il kodu + (1 harf 4-5 rakam | 2 harf 3-4 rakam | 3 harf 2-3 rakam)
+TR_PLATE_RE = re.compile(r"^(?:0[1-9]|[1-7]\d|8[01])(?:[A-Z]\d{4,5}|[A-Z]{2}\d{3,4}|[A-Z]{3}\d{2,3})$")
+
+# karışma sınıfları: (rakam, harfler)
+_CONFUSIONS = [("0", "ODQ"), ("1", "IL"), ("2", "Z"), ("5", "S"), ("6", "G"), ("8", "B")]
+_SKELETON = {}
+_TO_DIGIT = {}
+_TO_LETTER = {}
+for _digit, _letters in _CONFUSIONS:
+    _SKELETON[_digit] = _digit
+    for _ch in _letters:
+        _SKELETON[_ch] = _digit
+        _TO_DIGIT[_ch] = _digit
+    _TO_LETTER[_digit] = _letters[0]
+_SIMILAR_COST = 0.2
+# yalnızca OCR karışmaları (en çok iki sınıf içi değişim); gerçek harf/rakam farkı eşleşmez
+OCR_MAX_COST = 2 * _SIMILAR_COST
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]")
+
+
+def normalize(plate: str | None) -> str:
+    return _NON_ALNUM_RE.sub("", (plate or "").upper().replace("İ", "I"))
+
+
+def skeleton(plate: str) -> str:
+    return "".join(_SKELETON.get(ch, ch) for ch in plate)
+
+
+def _trigrams(skel: str) -> set[str]:
+    s = f"^{skel}$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _sub_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if _SKELETON.get(a, a) == _SKELETON.get(b, b):
+        return _SIMILAR_COST
+    return 1.0
+
+
+def distance(a: str, b: str, limit: float = 99.0) -> float:
+    """Karışma ağırlıklı Levenshtein (satır minimumu `limit`i aşarsa erken çıkar)."""
+    sk = _SKELETON
+    b_skel = [sk.get(ch, ch) for ch in b]
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        sa = sk.get(ca, ca)
+        cur = [i]
+        left = i
+        for j, cb in enumerate(b, 1):
+            diag = prev[j - 1]
+            if ca != cb:
+                diag += _SIMILAR_COST if sa == b_skel[j - 1] else 1
+            up = prev[j] + 1
+            left = left + 1
+            if up < left:
+                left = up
+            if diag < left:
+                left = diag
+            cur.append(left)
+        if min(cur) > limit:
+            return min(cur)
+        prev = cur
+    return prev[-1]
+
+
+# ---------- ROI düzeltmesi ----------
+
+def correct_ocr(raw: str | None) -> str | None:
+    """
+    OCR plakasını TR biçimine oturt: il kodu ve son blok rakama, ortadaki 1-3
+    karakter harfe çevrilir (yalnızca karışma sınıfı içinde). Geçerli biçimlerden
+    en az değişiklik gerekeni döner; hiçbiri olmuyorsa normalize metin.
+    """
+    p = normalize(raw)
+    if len(p) < 5:
+        return p or None
+    if TR_PLATE_RE.match(p):
+        return p
+    best, best_changes = None, 99
+    for letters in (1, 2, 3):
+        out, changes = [], 0
+        for i, ch in enumerate(p):
+            want_letter = 2 <= i < 2 + letters
+            if want_letter and ch.isdigit():
+                ch2 = _TO_LETTER.get(ch, ch)
+            elif not want_letter and ch.isalpha():
+                ch2 = _TO_DIGIT.get(ch, ch)
+            else:
+                ch2 = ch
+            changes += ch2 != ch
+            out.append(ch2)
+        cand = "".join(out)
+        if TR_PLATE_RE.match(cand) and changes < best_changes:
+            best, best_changes = cand, changes
+    return best or p
+
+
+# ---------- Index ----------
+
+class Candidate(NamedTuple):
+    plate: str       # kayıtlı (normalize) plaka
+    ref: object      # vehicle_id (app) / Vehicle.id (service)
+    cost: float      # karışma ağırlıklı mesafe (0 = birebir)
+
+
+class PlateIndex:
+    def __init__(self, loader: Callable[[], list[tuple[str, object]]]):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = None
+        self._reloading = False
+        self._refs: dict[str, set] = {}          # plaka -> ref'ler
+        self._by_skel: dict[str, set[str]] = {}  # iskelet -> plakalar
+        self._grams: dict[str, set[str]] = {}    # iskelet trigramı -> plakalar
+
+    # --- yükleme / güncelleme ---
+    def _add(self, plate: str, ref):
+        if not plate:
+            return
+        if plate not in self._refs:
+            skel = skeleton(plate)
+            self._by_skel.setdefault(skel, set()).add(plate)
+            for g in _trigrams(skel):
+                self._grams.setdefault(g, set()).add(plate)
+        self._refs.setdefault(plate, set()).add(ref)
+
+    def _remove(self, plate: str, ref):
+        refs = self._refs.get(plate)
+        if not refs:
+            return
+        refs.discard(ref)
+        if refs:
+            return
+        del self._refs[plate]
+        skel = skeleton(plate)
+        self._by_skel.get(skel, set()).discard(plate)
+        for g in _trigrams(skel):
+            self._grams.get(g, set()).discard(plate)
+
+    def reload(self):
+        # yeni yapılar kilitsiz kurulur, kilit altında yer değiştirir
+        fresh = PlateIndex(self._loader)
+        for plate, ref in self._loader():
+            fresh._add(normalize(plate), ref)
+        with self._lock:
+            self._refs, self._by_skel, self._grams = fresh._refs, fresh._by_skel, fresh._grams
+            self._loaded_at = time.monotonic()
+        self._reloading = False
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        except Exception:
+            self._reloading = False
+
+    def _ensure(self):
+        if self._loaded_at is None:
+            with self._load_lock:  # ilk yükleme bir kez (açılıştaki ısıtma ile yarışabilir)
+                if self._loaded_at is None:
+                    self.reload()
+        elif time.monotonic() - self._loaded_at > TTL and not self._reloading:
+            # eski index ile cevap vermeye devam et; yenisi arka planda yüklenir
+            self._reloading = True
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def add(self, plate: str, ref):
+        if self._loaded_at is not None:
+            with self._lock:
+                self._add(normalize(plate), ref)
+
+    def remove(self, plate: str, ref):
+        if self._loaded_at is not None:
+            with self._lock:
+                self._remove(normalize(plate), ref)
+
+    def __len__(self):
+        return len(self._refs)
+
+    # --- arama ---
+    def candidates(self, plate: str, limit: int = 5, max_cost: float = 2.0,
+                   exhaustive: bool = True) -> list[Candidate]:
+        """
+        Maliyete göre sıralı adaylar (birebir eşleşme maliyet 0). exhaustive=False:
+        iskelet eşleşmesi varsa trigram taraması atlanır (karışma hataları < 1 maliyet,
+        gerçek bir düzenleme >= 1 olduğundan en iyi aday değişmez).
+        """
+        self._ensure()
+        q = normalize(plate)
+        if not q:
+            return []
+        skel = skeleton(q)
+        with self._lock:
+            # 1) yalnızca karışma hataları: iskelet birebir (maliyet < 1)
+            pool = set(self._by_skel.get(skel, ()))
+            # 2) gerçek değişim/ekleme/silme: seçici trigramlar üzerinden aday say
+            if max_cost >= 1.0 and (not pool if not exhaustive else len(pool) < limit):
+                grams = sorted(_trigrams(skel), key=lambda g: len(self._grams.get(g, ())))
+                used = [g for g in grams if len(self._grams.get(g, ())) <= _BIG_POSTING] or grams[:2]
+                counts = Counter()
+                for g in used:
+                    counts.update(self._grams.get(g, ()))
+                need = max(1, len(used) - 3 * int(max_cost))  # her düzenleme en çok 3 trigramı bozar
+                pool.update(p for p, n in counts.most_common(MAX_CANDIDATES) if n >= need)
+            refs = {p: sorted(self._refs.get(p, ()), key=str) for p in pool}
+
+        out = []
+        for p in pool:
+            if abs(len(p) - len(q)) > max_cost:
+                continue
+            cost = round(distance(q, p, max_cost), 2)
+            if cost <= max_cost:
+                out.extend(Candidate(p, ref, cost) for ref in refs[p])
+        out.sort(key=lambda c: (c.cost, c.plate != q, c.plate))
+        return out[:limit]
+
+    def best(self, plate: str, max_cost: float = 1.0) -> Candidate | None:
+        """Tek ve açık en iyi aday (eşit maliyetli ikinci bir plaka varsa None)."""
+        cands = self.candidates(plate, limit=4, max_cost=max_cost, exhaustive=False)
+        if not cands:
+            return None
+        top = cands[0]
+        if any(c.cost == top.cost and (c.plate, c.ref) != (top.plate, top.ref) for c in cands[1:]):
+            return None
+        return top
+
+
+# ---------- Kaynaklar ----------
+
+def _load_app() -> list[tuple[str, object]]:
+    from .database import SessionLocal
+    from .models import Plate
+    with SessionLocal() as db:
+        return db.query(Plate.plate_normalized, Plate.vehicle_id).all()
+
+
+_INDEXES: dict[str, PlateIndex] = {"app": PlateIndex(_load_app)}
+
+
+def index(source: str = "app") -> PlateIndex:
+    return _INDEXES[source]
+
+
+def warm():
+    """Tüm kaynakları yükle (açılışta arka plan thread'inde; ilk istek beklemesin)."""
+    for idx in list(_INDEXES.values()):
+        try:
+            idx._ensure()
+        except Exception:
+            pass  # tablo henüz yok vb.: ilk aramada yeniden denenir
+
+
+# ---------- yazma kancaları (commit'ten sonra) ----------
+
+_PENDING = "plate_index_pending"
+
+
+def _defer(obj, op: Callable, plate: str, ref):
+    """Değişikliği oturumda biriktir; oturum yoksa hemen uygula."""
+    session = object_session(obj)
+    if session is None:
+        op(plate, ref)
+        return
+    session.info.setdefault(_PENDING, []).append((op, plate, ref))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for op, plate, ref in session.info.pop(_PENDING, ()):
+        op(plate, ref)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def register(source: str, model: type, plate_attr: str, loader: Callable[[], list[tuple[str, object]]],
+             ref_attr: str = "id"):
+    """Kaynağı tanımla ve modelin yazma olaylarını index'e bağla."""
+    idx = _INDEXES.setdefault(source, PlateIndex(loader))
+
+    def on_insert(_mapper, _conn, obj):
+        _defer(obj, idx.add, getattr(obj, plate_attr), getattr(obj, ref_attr))
+
+    def on_update(_mapper, _conn, obj):
+        hist = inspect(obj).attrs[plate_attr].history
+        if hist.has_changes():
+            for old in hist.deleted or ():
+                _defer(obj, idx.remove, old, getattr(obj, ref_attr))
+            _defer(obj, idx.add, getattr(obj, plate_attr), getattr(obj, ref_attr))
+
+    def on_delete(_mapper, _conn, obj):
+        _defer(obj, idx.remove, getattr(obj, plate_attr), getattr(obj, ref_attr))
+
+    event.listen(model, "after_insert", on_insert)
+    event.listen(model, "after_update", on_update)
+    event.listen(model, "after_delete", on_delete)
+    return idx
+
+
+def _register_app_models():
+    from .models import Plate
+    register("app", Plate, "plate_normalized", _load_app, ref_attr="vehicle_id")
+
+
+_register_app_models()
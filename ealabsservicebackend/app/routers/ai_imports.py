@@ -1,20 +1,31 @@
 # app/routers/ai_imports.py
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
-import os, uuid, re
-import requests, json
+from datetime import datetime, timedelta, timezone
+import asyncio, hashlib, os, re, threading, time, zipfile
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 
 from ..deps import get_db, require_roles, get_current_user
+from ..database import SessionLocal
+from .. import plate_index, totals
+from ..models import ImportedDocument
+from ..ai import workers, ocr_strategy, ocr_backend, fields, llm
+from ..ai.cache import ocr_parse_cache, llm_cache
+from ..uploads import save_upload, copy_stream, safe_ext, MAX_UPLOAD_MB, StoredUpload
+from ..storage import blob_store
 
 # ---- OCR / Görüntü işleme (offline) ----
 # Sistem:  brew install tesseract poppler tesseract-lang
 # Python:  pip install pytesseract pillow opencv-python pdf2image numpy pillow-heif
-import pytesseract
+#          (opsiyonel) pip install tesserocr  -> kalıcı OCR motorları, bkz. app/ai/ocr_backend.py
 from PIL import Image
 import cv2
 import numpy as np
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 
 router = APIRouter(
     prefix="/ai/imports",
@@ -22,21 +33,41 @@ router = APIRouter(
     dependencies=[Depends(require_roles(["AI_DIRECTOR", "OWNER"]))],  # sadece AI_DIRECTOR/OWNER
 )
 
-STORAGE_DIR = "./storage_uploads"
-os.makedirs(STORAGE_DIR, exist_ok=True)
+# OCR/parse hattı değiştiğinde artır: önbellekteki eski sonuçlar geçersiz olur
+PIPELINE_VERSION = "10"
 
-# In-memory import store (MVP)
-IMPORTS: dict[int, dict] = {}
-AUTO_ID = 0
+# PDF: yalnızca ilk N sayfa rasterize edilir; aynı anda en fazla K sayfa bellekte
+PDF_DPI = 400
+MAX_PDF_PAGES = int(os.getenv("AI_MAX_PDF_PAGES", "5"))
+PAGES_IN_FLIGHT = max(1, int(os.getenv("AI_PAGES_IN_FLIGHT", "2")))
+
+# Arka plan görevlerine referans (GC toplamasın)
+_TASKS: set[asyncio.Task] = set()
+# Bu süreçte işlenen import id'leri (süpürme bunlara dokunmaz)
+_IN_FLIGHT: set[int] = set()
+
+# queued/running/committing'de bu kadar dakikadır güncellenmeyen kayıt yarıda kalmış sayılır
+STALE_IMPORT_MIN = float(os.getenv("AI_STALE_IMPORT_MIN", "15"))
 
 
 # =========================================================
 #                    OCR & PARSING
 # =========================================================
 
-def _pdf_to_images(path: str):
-    # PDF -> PIL Image list (poppler gerekir)
-    return convert_from_path(path, dpi=400)
+def _pdf_to_images(path: str, max_pages: int = MAX_PDF_PAGES):
+    """
+    PDF -> PIL Image üreteci (poppler gerekir). Sayfalar tek tek rasterize edilir;
+    tüm belge hiçbir zaman bellekte tutulmaz.
+    """
+    try:
+        page_count = int(pdfinfo_from_path(path).get("Pages") or max_pages)
+    except Exception:
+        page_count = max_pages
+    for no in range(1, min(page_count, max_pages) + 1):
+        pages = convert_from_path(path, dpi=PDF_DPI, first_page=no, last_page=no, grayscale=True)
+        if not pages:
+            break
+        yield pages[0]
 
 
 def _prep_for_ocr(pil_img: Image.Image) -> Image.Image:
@@ -63,56 +94,50 @@ def _prep_for_ocr(pil_img: Image.Image) -> Image.Image:
 
     # Tesseract OSD ile deskew
     try:
-        osd = pytesseract.image_to_osd(Image.fromarray(bw))
-        m = re.search(r"Rotate:\s*(\d+)", osd)
-        if m:
-            angle = int(m.group(1)) % 360
-            if angle:
-                (h, w) = bw.shape[:2]
-                M = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
-                bw = cv2.warpAffine(
-                    bw, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
-                )
+        angle = ocr_backend.osd_rotation(Image.fromarray(bw))
+        if angle:
+            (h, w) = bw.shape[:2]
+            M = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+            bw = cv2.warpAffine(
+                bw, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
+            )
     except Exception:
         pass
 
     return Image.fromarray(bw)
 
 
-def _ocr_image(pil_img: Image.Image) -> str:
+def _ocr_image(pil_img: Image.Image, form_type: str = "photo") -> str:
     """
-    Farklı PSM/OEM kombinasyonları ile dene. Türkçe varsa tur+eng.
+    Uyarlanabilir strateji motoru (tur+eng/eng, psm 6/4): kelime güveniyle
+    puanlar, eşik aşılınca durur; form tipine göre kazananı önce dener.
     """
-    tries = [
-        ("tur+eng", "--oem 1 --psm 6"),  # tek sütun/karışık blok
-        ("tur+eng", "--oem 1 --psm 4"),  # sütunlu
-        ("eng",     "--oem 1 --psm 6"),
-        ("eng",     "--oem 1 --psm 4"),
-    ]
-    for lang, cfg in tries:
-        try:
-            txt = pytesseract.image_to_string(pil_img, lang=lang, config=cfg)
-            if txt and len(txt.strip()) > 10:
-                return txt
-        except Exception:
-            continue
-    return pytesseract.image_to_string(pil_img)
+    return ocr_strategy.ocr_best(pil_img, form_type)["text"]
 
 
-def _ocr_singleline(pil_img: Image.Image, lang="tur+eng") -> str:
-    """
-    Tek satırlık alanlar için (psm 7) — plaka, marka, model gibi.
-    """
-    try:
-        return (pytesseract.image_to_string(pil_img, lang=lang, config="--oem 1 --psm 7") or "").strip()
-    except Exception:
-        return ""
+def _ocr_page(pil_img: Image.Image) -> str:
+    return _ocr_image(_prep_for_ocr(pil_img), form_type="pdf")
 
 
-def _load_and_ocr(path: str) -> str:
+def _ocr_pages(pages) -> list[str]:
     """
-    Tüm sayfayı OCR et (kalemler/Toplam için). HEIC desteği ve düşük çözünürlük büyütme var.
+    Sayfaları thread'lerde OCR et (tesseract ayrı süreç, OpenCV GIL'i bırakır).
+    Pencere PAGES_IN_FLIGHT ile sınırlı: üreteçten yeni sayfa ancak yer açılınca
+    alınır. Sayfa sırası korunur.
     """
+    texts = []
+    window = deque()
+    with ThreadPoolExecutor(max_workers=PAGES_IN_FLIGHT) as ex:
+        for page in pages:
+            window.append(ex.submit(_ocr_page, page))
+            if len(window) >= PAGES_IN_FLIGHT:
+                texts.append(window.popleft().result())
+        while window:
+            texts.append(window.popleft().result())
+    return texts
+
+
+def _register_heif():
     # HEIC desteği
     try:
         from pillow_heif import register_heif_opener
@@ -120,28 +145,109 @@ def _load_and_ocr(path: str) -> str:
     except Exception:
         pass
 
-    text_chunks = []
-    try:
-        if path.lower().endswith(".pdf"):
-            pages = _pdf_to_images(path)
-            for p in pages[:5]:
-                prepped = _prep_for_ocr(p)
-                text_chunks.append(_ocr_image(prepped))
-        else:
-            pil = Image.open(path)
+
+class DocumentContext:
+    """
+    Tek belge için pahalı ara ürünleri (decode edilmiş ilk sayfa, hazırlanmış
+    bitmap, OCR metni, kelime kutuları, ROI alanları) bir kez hesaplar;
+    ROI, kural tabanlı ayrıştırma ve LLM aşamaları aynı nesneyi paylaşır.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_pdf = path.lower().endswith(".pdf")
+        self.timings: dict[str, float] = {}
+        self._rest_pages = iter(())  # PDF: ilk sayfadan sonrası (üreteç)
+
+    def _timed(self, stage: str, t0: float):
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + (time.perf_counter() - t0) * 1000, 1)
+
+    @cached_property
+    def image(self) -> Image.Image | None:
+        """İlk sayfa (ROI'ler ve kelime kutuları bu sayfadan)."""
+        t = time.perf_counter()
+        try:
+            if self.is_pdf:
+                pages = _pdf_to_images(self.path)
+                first = next(pages, None)
+                self._rest_pages = pages
+                return first
+            _register_heif()
+            pil = Image.open(self.path)
             if min(pil.size) < 1400:
                 pil = pil.resize((int(pil.width * 1.6), int(pil.height * 1.6)))
-            prepped = _prep_for_ocr(pil)
-            text_chunks.append(_ocr_image(prepped))
-    except Exception:
-        return ""
-    return "\n".join(text_chunks)
+            return pil
+        except Exception:
+            return None
+        finally:
+            self._timed("decode_ms", t)
+
+    @cached_property
+    def prepped(self) -> Image.Image | None:
+        if self.image is None:
+            return None
+        t = time.perf_counter()
+        try:
+            return _prep_for_ocr(self.image)
+        finally:
+            self._timed("prep_ms", t)
+
+    @cached_property
+    def first_page_ocr(self) -> dict:
+        """ocr_strategy sonucu: text + tesseract kelime kutuları (data) + strateji."""
+        if self.prepped is None:
+            return {"text": "", "data": None, "strategy": None, "score": 0.0}
+        t = time.perf_counter()
+        try:
+            return ocr_strategy.ocr_best(self.prepped, "pdf" if self.is_pdf else "photo")
+        except Exception:
+            return {"text": "", "data": None, "strategy": None, "score": 0.0}
+        finally:
+            self._timed("ocr_ms", t)
+
+    @cached_property
+    def text(self) -> str:
+        """Tüm sayfaların OCR metni (kalemler/toplamlar için)."""
+        chunks = [self.first_page_ocr["text"]]
+        if self.is_pdf:
+            t = time.perf_counter()
+            try:
+                chunks.extend(_ocr_pages(self._rest_pages))
+            except Exception:
+                pass
+            finally:
+                self._timed("ocr_ms", t)
+        return "\n".join(c for c in chunks if c)
+
+    @property
+    def words(self) -> dict | None:
+        return self.first_page_ocr.get("data")
+
+    @cached_property
+    def scanned(self) -> dict:
+        """Tam metnin tek geçişli alan taraması (app.ai.fields)."""
+        return fields.scan(self.text)
+
+    @cached_property
+    def roi(self) -> dict:
+        if self.image is None:
+            return {}
+        t = time.perf_counter()
+        try:
+            return _extract_by_roi(self.image, self.prepped)
+        finally:
+            self._timed("roi_ms", t)
+
+
+def _load_and_ocr(path: str) -> str:
+    """
+    Tüm sayfayı OCR et (kalemler/Toplam için). HEIC desteği ve düşük çözünürlük büyütme var.
+    """
+    return DocumentContext(path).text
 
 
 # ---------- Basit kural tabanlı ayrıştırıcılar ----------
 _PLATE_RE = re.compile(r"\b(\d{2}\s*[A-ZÇĞİÖŞÜ]{1,3}\s*\d{2,5})\b")
-_DATE_RE  = re.compile(r"\b(\d{1,2}[./-]\d{1,2}[./-]\d{2,4})\b")
-_MONEY_RE = re.compile(r"(?P<val>\d{1,3}(?:[\.\s]\d{3})*(?:[.,]\d{2})?)\s*(?:TL|₺)?", re.IGNORECASE)
 
 _BRANDS = [
     "RENAULT","FIAT","FORD","MERCEDES","MERCEDES-BENZ","VOLKSWAGEN","VW","OPEL","PEUGEOT",
@@ -156,16 +262,14 @@ def _extract_plate(text: str):
     return None
 
 
-def _extract_date(text: str):
-    m = _DATE_RE.search(text)
-    if not m:
-        return None
-    raw = m.group(1)
-    for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d/%m/%y"):
-        try:
-            return datetime.strptime(raw, fmt)
-        except Exception:
-            pass
+def _extract_date(text: str, scanned: dict | None = None):
+    scanned = scanned or fields.scan(text)
+    for tok in scanned["dates"]:
+        for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d/%m/%y"):
+            try:
+                return datetime.strptime(tok.text, fmt)
+            except Exception:
+                pass
     return None
 
 
@@ -182,117 +286,118 @@ def _extract_brand_model(text: str):
     return (brand, model)
 
 
-def _money_to_float(s: str) -> float:
-    s = s.strip().replace(" ", "")
-    if "," in s and "." in s:
-        s = s.replace(".", "").replace(",", ".")  # 1.234,56 -> 1234.56
-    elif "," in s:
-        s = s.replace(",", ".")
-    try:
-        return float(s)
-    except Exception:
-        return 0.0
-
-
-def _extract_totals(text: str) -> dict:
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    totals = {"subtotal": None, "vat_rate": 0.20, "vat_amount": None, "grand_total": None}
-    for l in lines:
-        low = l.lower()
-        if "genel toplam" in low or "geneltoplam" in low:
-            m = list(_MONEY_RE.finditer(l))
-            if m:
-                totals["grand_total"] = _money_to_float(m[-1].group("val"))
-        elif "kdv" in low:
-            perc = re.search(r"%\s*(\d+(?:[.,]\d+)?)", low)
-            if perc:
-                try:
-                    totals["vat_rate"] = float(perc.group(1).replace(",", ".")) / 100.0
-                except Exception:
-                    pass
-            m = list(_MONEY_RE.finditer(l))
-            if m:
-                totals["vat_amount"] = _money_to_float(m[-1].group("val"))
-        elif "toplam" in low:
-            m = list(_MONEY_RE.finditer(l))
-            if m:
-                totals["subtotal"] = _money_to_float(m[-1].group("val"))
-    return totals
+def _extract_totals(text: str, scanned: dict | None = None) -> dict:
+    return fields.totals(scanned or fields.scan(text))
 
 
-def _extract_items(text: str):
+def _extract_items(text: str, scanned: dict | None = None):
     """
     Para geçen satırları kalem sayar. 3x150, 2 x 120, 4 adet gibi miktarları yakalar.
+    Tarama app.ai.fields ile tek geçişte yapılır; `scanned` verilirse tekrar taranmaz.
     """
     items = []
-    for line in text.splitlines():
-        l = line.strip()
-        if not l:
-            continue
-        prices = list(_MONEY_RE.finditer(l))
-        if not prices:
-            continue
-        price = _money_to_float(prices[-1].group("val"))
-        qty = 1
-        mqty = re.search(r"(\d+)\s*[xX*]\s*\d", l)
-        if mqty:
-            qty = int(mqty.group(1))
+    for c in fields.items(scanned or fields.scan(text), text):
+        qty = c["qty"]
+        if c["unit_price"] is not None:
+            price = c["unit_price"]
         else:
-            madet = re.search(r"(\d+)\s*(?:adet|psc|qty)", l, re.IGNORECASE)
-            if madet:
-                qty = int(madet.group(1))
-        name = re.sub(_MONEY_RE, "", l)
-        name = re.sub(r"\b(\d+\s*[xX*]\s*\d+)\b", "", name)
-        name = re.sub(r"\s{2,}", " ", name).strip(":-— ").strip()
-        if len(name) < 3:
-            name = "Kalem"
-        items.append({
-            "type": "labor" if any(k in l.lower() for k in ["işçilik", "iscilik", "emek", "labour", "labor"]) else "part",
-            "name": name[:120],
-            "qty": qty,
-            "price": round(price / max(qty, 1), 2) if qty > 1 else price
-        })
-    return items[:20]
+            price = round(c["price"] / qty, 2) if qty > 1 else c["price"]
+        items.append({"type": c["type"], "name": c["name"], "qty": qty, "price": price})
+    return items
 
 
 # --------- Form'a özel: ROI okuma (üst-sağ kutular) ---------
 
-def _ocr_roi_singleline(full_pil: Image.Image, box: tuple[float, float, float, float]) -> str:
-    """
-    box: (x1, y1, x2, y2) yüzde cinsinden (0..1)
-    """
-    W, H = full_pil.size
-    x1, y1, x2, y2 = box
-    crop = full_pil.crop((int(W * x1), int(H * y1), int(W * x2), int(H * y2)))
-    # küçükse büyüt
-    if min(crop.size) < 200:
-        crop = crop.resize((crop.width * 2, crop.height * 2))
-    crop_prep = _prep_for_ocr(crop)
-    return _ocr_singleline(crop_prep)
+# ROI kutuları alt alta: x aynı, y aralıkları ardışık (yüzde, 0..1)
+_ROI_X = (0.60, 0.95)
+_ROI_FIELDS = [
+    ("date",  0.11, 0.17),
+    ("plate", 0.17, 0.23),
+    ("brand", 0.23, 0.29),
+    ("model", 0.29, 0.35),
+    ("km",    0.35, 0.41),
+]
+
+# Alan bazlı karakter beyaz listeleri. Tek image_to_data çağrısında tesseract
+# whitelist'i alan bazında verilemediği için OCR sonrası uygulanır.
+_DIGIT_FIXES = str.maketrans({"O": "0", "o": "0", "D": "0", "Q": "0", "I": "1", "l": "1", "|": "1",
+                              "!": "1", "Z": "2", "z": "2", "S": "5", "s": "5", "B": "8", "G": "6"})
+_ROI_WHITELIST = {
+    "date":  set("0123456789./-"),
+    "km":    set("0123456789.,"),
+    "plate": set("ABCDEFGHIJKLMNOPRSTUVYZ0123456789"),
+}
 
 
-def _extract_by_roi(full_pil: Image.Image) -> dict:
+def _roi_words(prepped: Image.Image) -> dict[str, list[tuple[str, float]]]:
+    """
+    Tüm ROI bandını tek image_to_data çağrısıyla oku, kelimeleri dikey
+    merkezlerine göre alanlara dağıt. Dönüş: alan -> [(kelime, güven)].
+    """
+    W, H = prepped.size
+    top, bottom = _ROI_FIELDS[0][1], _ROI_FIELDS[-1][2]
+    band = prepped.crop((int(W * _ROI_X[0]), int(H * top), int(W * _ROI_X[1]), int(H * bottom)))
+    scale = 2 if min(band.size) < 200 else 1
+    if scale > 1:
+        band = band.resize((band.width * scale, band.height * scale))
+
+    fields = {name: [] for name, _, _ in _ROI_FIELDS}
+    try:
+        data = ocr_backend.image_to_data(band, lang="tur+eng", psm=6)
+    except Exception:
+        return fields
+
+    band_h = band.height
+    words = []
+    for i, txt in enumerate(data["text"]):
+        txt = (txt or "").strip()
+        conf = float(data["conf"][i])
+        if not txt or conf < 0:
+            continue
+        cy = data["top"][i] + data["height"][i] / 2.0
+        y = top + (bottom - top) * (cy / band_h)  # sayfa yüzdesine geri çevir
+        words.append((data["block_num"][i], data["par_num"][i], data["line_num"][i], data["left"][i], y, txt, conf))
+
+    for *_, y, txt, conf in sorted(words):
+        for name, y1, y2 in _ROI_FIELDS:
+            if y1 <= y < y2:
+                fields[name].append((txt, conf))
+                break
+    return fields
+
+
+def _roi_field_text(field: str, words: list[tuple[str, float]]) -> str:
+    txt = " ".join(w for w, _ in words)
+    if field in ("date", "km"):
+        txt = txt.translate(_DIGIT_FIXES)
+    elif field == "plate":
+        txt = txt.upper().replace("|", "I")
+    allowed = _ROI_WHITELIST.get(field)
+    if allowed:
+        txt = "".join(ch for ch in txt if ch in allowed or ch == " ")
+    return txt.strip()
+
+
+def _extract_by_roi(full_pil: Image.Image, prepped: Image.Image | None = None) -> dict:
     """
     Paylaştığın form fotoğrafına göre ROI yüzdeleri.
     Gerekirse milim oynarız; çözünürlükten bağımsız çalışır.
+    Sayfa bir kez hazırlanır (deskew + binarize), tüm kutular tek OCR geçişinde okunur.
     """
-    # (sol, üst, sağ, alt) — yüzdeler
-    roi_date  = (0.60, 0.11, 0.95, 0.17)
-    roi_plate = (0.60, 0.17, 0.95, 0.23)
-    roi_brand = (0.60, 0.23, 0.95, 0.29)
-    roi_model = (0.60, 0.29, 0.95, 0.35)
-    roi_km    = (0.60, 0.35, 0.95, 0.41)
+    if prepped is None:
+        prepped = _prep_for_ocr(full_pil)
+    words = _roi_words(prepped)
 
-    date_txt  = _ocr_roi_singleline(full_pil, roi_date)
-    plate_txt = _ocr_roi_singleline(full_pil, roi_plate)
-    brand_txt = _ocr_roi_singleline(full_pil, roi_brand)
-    model_txt = _ocr_roi_singleline(full_pil, roi_model)
-    km_txt    = _ocr_roi_singleline(full_pil, roi_km)
+    date_txt  = _roi_field_text("date", words["date"])
+    plate_txt = _roi_field_text("plate", words["plate"])
+    brand_txt = _roi_field_text("brand", words["brand"])
+    model_txt = _roi_field_text("model", words["model"])
+    km_txt    = _roi_field_text("km", words["km"])
+    # alan başına ortalama tesseract kelime güveni (0..100)
+    conf = {name: (sum(c for _, c in ws) / len(ws) if ws else 0.0) for name, ws in words.items()}
 
-    # normalize plaka
-    plate = plate_txt.upper().replace(" ", "").replace("|", "I")
-    if len(plate) >= 6:
-        plate = plate.replace("O", "0").replace("I", "1").replace("Z", "2")
+    # normalize plaka: konuma göre düzelt (il kodu/son blok rakam, orta blok harf)
+    plate = plate_index.correct_ocr(plate_txt.replace("|", "I")) or ""
 
     # tarih
     dt = None
@@ -320,35 +425,29 @@ def _extract_by_roi(full_pil: Image.Image) -> dict:
         "model": (model_txt or "").strip().title() or None,
         "km": km_num,
         "date": dt,
+        "conf": conf,
     }
 
 
-def parse_document_ocr(path: str) -> dict:
-    # HEIC desteği
-    try:
-        from pillow_heif import register_heif_opener
-        register_heif_opener()
-    except Exception:
-        pass
-
-    pil = Image.open(path)
-
-    # ROI alanları
-    roi = _extract_by_roi(pil)
+def parse_document_ocr(path: str | DocumentContext) -> dict:
+    """Kural tabanlı ayrıştırma. Pipeline içinden çağrılırken hazır bağlam verilir."""
+    ctx = path if isinstance(path, DocumentContext) else DocumentContext(path)
+    if ctx.image is None:
+        raise ValueError("Belge açılamadı")
 
-    # Tam sayfa OCR (kalemler/toplamlar için). Fallback de var.
-    text = _load_and_ocr(path)
-    if not text or len(text.strip()) < 8:
-        big = pil if min(pil.size) >= 1400 else pil.resize((int(pil.width * 1.6), int(pil.height * 1.6)))
-        text = pytesseract.image_to_string(_prep_for_ocr(big), lang="tur+eng", config="--oem 1 --psm 6")
+    # ROI alanları + tam sayfa OCR (kalemler/toplamlar için) — bağlamdan, tekrar hesaplanmaz
+    roi = ctx.roi
+    text = ctx.text
 
-    items = _extract_items(text)
+    t = time.perf_counter()
+    scanned = ctx.scanned
+    items = _extract_items(text, scanned)
     brand2, model2 = _extract_brand_model(text)
 
     brand = roi.get("brand") or brand2
     model = roi.get("model") or model2
     plate = roi.get("plate")
-    date  = roi.get("date") or _extract_date(text) or datetime.utcnow()
+    date  = roi.get("date") or _extract_date(text, scanned) or datetime.utcnow()
     km    = roi.get("km")
 
     # Müşteri adı (soldaki kutudan yakalama denemesi)
@@ -361,6 +460,7 @@ def parse_document_ocr(path: str) -> dict:
 
     if not items:
         items = [{"type": "labor", "name": "İşçilik", "qty": 1, "price": 0.0}]
+    ctx._timed("rules_ms", t)
 
     return {
         "customer": {"type": "person", "name": cust_name or "Bilinmeyen", "phone": None, "email": None},
@@ -372,10 +472,142 @@ def parse_document_ocr(path: str) -> dict:
     }
 
 
+# ---------- Alan güveni ve LLM yönlendirmesi ----------
+# Kural/ROI taslağının her alanı tesseract kelime güveni x doğrulayıcı ile 0..1
+# puanlanır. Kapı alanlarından biri eşiğin altındaysa LLM çağrılır ve yalnızca
+# eşik altı alanlar LLM cevabıyla doldurulur; yoksa Ollama hiç çağrılmaz.
+LLM_ROUTE_THRESHOLD = float(os.getenv("AI_LLM_ROUTE_THRESHOLD", "0.80"))
+LLM_GATE_FIELDS = [f for f in os.getenv("AI_LLM_GATE_FIELDS", "plate,date,items").split(",") if f]
+
+_TR_PLATE_RE = plate_index.TR_PLATE_RE
+_PLACEHOLDER_ITEMS = [{"type": "labor", "name": "İşçilik", "qty": 1, "price": 0.0}]
+
+# alan -> taslaktaki yolu
+_FIELD_PATHS = {
+    "plate": ("vehicle", "plate"),
+    "brand": ("vehicle", "brand"),
+    "model": ("vehicle", "model"),
+    "km": ("vehicle", "km"),
+    "date": ("startedAt",),
+    "items": ("items",),
+    "customer": ("customer",),
+}
+
+
+def _valid_plate(plate) -> bool:
+    return bool(plate) and bool(_TR_PLATE_RE.match(re.sub(r"\s+", "", str(plate)).upper()))
+
+
+def _sane_date(dt: datetime | None) -> bool:
+    return dt is not None and 2000 <= dt.year and dt <= datetime.utcnow() + timedelta(days=1)
+
+
+def _items_match_totals(items: list[dict], totals: dict) -> bool | None:
+    """Kalem toplamı, belgedeki ara toplam (yoksa genel toplam - KDV) ile uyuşuyor mu? Referans yoksa None."""
+    ref = totals.get("subtotal")
+    if ref is None and totals.get("grand_total") is not None:
+        ref = totals["grand_total"] - (totals.get("vat_amount") or 0.0)
+    if not ref:
+        return None
+    total = sum(float(i.get("qty") or 1) * float(i.get("price") or 0) for i in items)
+    return abs(total - ref) <= max(1.0, ref * 0.02)
+
+
+def _score_fields(ctx: DocumentContext, draft: dict) -> dict:
+    """Alan -> {"source": roi|rules|default, "confidence": 0..1}."""
+    roi = ctx.roi
+    conf = roi.get("conf", {})
+    page = (ctx.first_page_ocr.get("score") or 0.0) / 100.0
+    v = draft["vehicle"]
+
+    def meta(source, score):
+        return {"source": source, "confidence": round(max(0.0, min(1.0, score)), 3)}
+
+    out = {}
+    out["plate"] = meta("roi", conf.get("plate", 0) / 100 * _valid_plate(v["plate"])) if v["plate"] \
+        else meta("default", 0)
+
+    if roi.get("date"):
+        out["date"] = meta("roi", conf.get("date", 0) / 100 * _sane_date(roi["date"]))
+    else:
+        text_date = _extract_date(ctx.text, ctx.scanned)
+        out["date"] = meta("rules", page * _sane_date(text_date)) if text_date else meta("default", 0)
+
+    km = v["km"]
+    out["km"] = meta("roi", conf.get("km", 0) / 100 * (0 < km < 2_000_000)) if km else meta("default", 0)
+
+    for f in ("brand", "model"):
+        if roi.get(f):
+            known = f != "brand" or roi[f] in _BRANDS
+            out[f] = meta("roi", conf.get(f, 0) / 100 * (1.0 if known else 0.7))
+        elif v[f]:
+            out[f] = meta("rules", page)
+        else:
+            out[f] = meta("default", 0)
+
+    if draft["items"] == _PLACEHOLDER_ITEMS:
+        out["items"] = meta("default", 0)
+    else:
+        match = _items_match_totals(draft["items"], fields.totals(ctx.scanned))
+        out["items"] = meta("rules", page * {True: 1.0, None: 0.7, False: 0.4}[match])
+
+    name = draft["customer"]["name"]
+    out["customer"] = meta("rules", page) if name and name != "Bilinmeyen" else meta("default", 0)
+    return out
+
+
+def _draft_confidence(field_meta: dict) -> float:
+    return min((field_meta[f]["confidence"] for f in LLM_GATE_FIELDS if f in field_meta), default=0.0)
+
+
+def _low_fields(field_meta: dict) -> list[str]:
+    return [f for f, m in field_meta.items() if m["confidence"] < LLM_ROUTE_THRESHOLD]
+
+
+def _parse_iso(val) -> datetime | None:
+    """ISO8601 metin -> saf (UTC) datetime; geçersizse None."""
+    try:
+        dt = datetime.fromisoformat(str(val).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _merge_llm(draft: dict, field_meta: dict, llm_draft: dict, low: list[str]) -> tuple[dict, dict]:
+    """
+    Eşik altı alanları LLM cevabıyla değiştir (geçerliyse); kaynakları güncelle.
+    `llm_draft` varsayılanları doldurulmamış taslaktır (`_normalize_llm_json`):
+    LLM'in bulamadığı tarih / müşteri belgedeki değeri ezmez.
+    """
+    out = json.loads(json.dumps(draft))
+    meta = {f: dict(m) for f, m in field_meta.items()}
+    for f in low:
+        *parents, leaf = _FIELD_PATHS[f]
+        src, dst = llm_draft, out
+        for k in parents:
+            src, dst = (src or {}).get(k), dst[k]
+        val = (src or {}).get(leaf)
+        if f == "plate" and val:
+            val = re.sub(r"\s+", "", str(val)).upper()
+            if not _valid_plate(val):
+                continue
+        if f == "date" and val and not _sane_date(_parse_iso(val)):
+            continue
+        if not val or (f == "customer" and val.get("name") in (None, "", "Bilinmeyen")):
+            continue
+        dst[leaf] = val
+        meta[f] = {"source": "llm", "confidence": None}
+    return out, meta
+
+
 # =========================================================
 #                 LLM ENTEGRASYONU (OLLAMA)
 # =========================================================
 
+# Prompt metni/şeması değişince artır: LLM önbelleğindeki eski cevaplar kullanılmaz
+PROMPT_VERSION = "1"
+
+
 def _build_llm_prompt(ocr_text: str) -> str:
     return f"""
 Aşağıdaki metin bir servis iş emri/iş formundan OCR ile çekildi.
@@ -407,35 +639,12 @@ OCR_METNİ:
 """.strip()
 
 
-def _ask_ollama_for_json(model: str, prompt: str, host: str = "http://localhost:11434") -> dict | None:
-    try:
-        resp = requests.post(
-            f"{host}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
-            timeout=120,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        raw = (data.get("response") or "").strip()
-
-        # Kod bloğu/ek metin geldiyse temizle
-        if raw.startswith("```"):
-            # ör: ```json\n{...}\n```
-            first = raw.find("{")
-            last = raw.rfind("}")
-            if first != -1 and last != -1:
-                raw = raw[first:last+1]
-
-        # İlk JSON bloğunu al
-        if "{" in raw and "}" in raw:
-            raw = raw[raw.find("{"): raw.rfind("}") + 1]
-
-        return json.loads(raw)
-    except Exception:
-        return None
-
-
 def _normalize_llm_json(d: dict) -> dict:
+    """
+    LLM cevabını taslak şemasına getir. Bulunamayan tarih ve müşteri adı None
+    kalır (alan bazlı birleştirmede belgedeki değeri ezmesin); tam taslak olarak
+    kullanılacaksa `_with_llm_defaults`.
+    """
     # güvenli alan erişimi
     cust = (d.get("customer") or {}) if isinstance(d, dict) else {}
     veh  = (d.get("vehicle") or {}) if isinstance(d, dict) else {}
@@ -468,15 +677,12 @@ def _normalize_llm_json(d: dict) -> dict:
         price_f = to_float(it.get("price"))
         typ = (it.get("type") or "").lower()
         if typ not in ("labor","part"):
-            typ = "labor" if any(k in name.lower() for k in ["işçilik","iscilik","emek","labour","labor"]) else "part"
+            typ = "labor" if fields.is_labor(name) else "part"
         norm_items.append({"type": typ, "name": name[:120], "qty": qty_i, "price": price_f})
 
     startedAt = d.get("startedAt")
-    if isinstance(startedAt, str):
-        try:
-            _ = datetime.fromisoformat(startedAt.replace("Z","+00:00"))
-        except:
-            startedAt = None
+    if not isinstance(startedAt, str) or _parse_iso(startedAt) is None:
+        startedAt = None
 
     status = d.get("status") or "open"
     if status not in ("open","closed"): status = "open"
@@ -484,7 +690,7 @@ def _normalize_llm_json(d: dict) -> dict:
     return {
         "customer": {
             "type": cust.get("type") if cust.get("type") in ("person","company") else "person",
-            "name": cust.get("name") or "Bilinmeyen",
+            "name": cust.get("name"),
             "phone": cust.get("phone"),
             "email": cust.get("email"),
         },
@@ -495,105 +701,587 @@ def _normalize_llm_json(d: dict) -> dict:
             "year": veh.get("year"),
             "km": veh.get("km"),
         },
-        "startedAt": startedAt or datetime.utcnow().isoformat(),
+        "startedAt": startedAt,
         "notes": d.get("notes"),
         "items": norm_items,
         "status": status,
     }
 
 
+def _with_llm_defaults(draft: dict) -> dict:
+    """Tam taslak olarak kullanılacak LLM cevabının boş tarih / müşteri adını doldur."""
+    out = dict(draft, customer=dict(draft["customer"]))
+    out["startedAt"] = out.get("startedAt") or datetime.utcnow().isoformat()
+    out["customer"]["name"] = out["customer"].get("name") or "Bilinmeyen"
+    return out
+
+
+def _llm_cache_key(ocr_text: str, model: str) -> str:
+    normalized = " ".join(ocr_text.split())
+    raw = f"{PROMPT_VERSION}\0{model}\0{normalized}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _parse_with_llm(ocr_text: str) -> tuple[dict | None, bool]:
+    """
+    Paylaşılan Ollama istemcisiyle taslak çıkar (bloklar; thread'de çağır).
+    Aynı (normalize metin, model, prompt sürümü) daha önce sorulduysa cevap
+    önbellekten gelir. Host sağlıksızsa devre kesici hemen None döner.
+    Taslağın varsayılanları doldurulmaz (tarih / müşteri adı None kalabilir).
+    Dönüş: (taslak | None, önbellekten_mi)
+    """
+    client = llm.get_client()
+    key = _llm_cache_key(ocr_text, client.model)
+    llm_raw = llm_cache.get(key)
+    cached = llm_raw is not None
+    if not cached:
+        llm_raw = client.generate_json(_build_llm_prompt(ocr_text))
+    if not llm_raw:
+        return None, False
+    try:
+        # ham cevap saklanır; normalize ucuz
+        parsed = _normalize_llm_json(llm_raw)
+    except Exception:
+        return None, False
+    if parsed and isinstance(parsed, dict) and parsed.get("items") is not None:
+        if not cached:
+            llm_cache.put(key, llm_raw)
+        return parsed, cached
+    return None, False
+
+
 # =========================================================
 #                       ENDPOINTS
 # =========================================================
 
-@router.post("", summary="Belge yükle ve AI ile taslak oluştur (yalnızca AI Director/Owner)")
+def _run_ocr_stage(fpath: str) -> dict:
+    """
+    Süreç havuzunda çalışır: OCR + kural tabanlı taslak + alan güvenleri (aynı bağlamdan).
+    LLM çağrısı (gerekirse) ana süreçte paylaşılan istemciyle yapılır.
+    """
+    ctx = DocumentContext(fpath)
+    ocr_text = ctx.text
+    try:
+        rules = parse_document_ocr(ctx)
+        field_meta = _score_fields(ctx, rules)
+    except Exception:
+        rules, field_meta = None, None
+    return {"ocr_text": ocr_text, "rules": rules, "fields": field_meta, "timings": ctx.timings}
+
+
+# ---------- Import kayıtları (ImportedDocument tablosu) ----------
+# Durum DB'de tutulur: PATCH/to-order hangi worker'a düşerse düşsün kaydı bulur,
+# restart sonrası taslaklar kaybolmaz.
+
+def _import_to_dict(doc: ImportedDocument, with_raw: bool = False) -> dict:
+    out = {
+        "id": doc.id,
+        "file_path": doc.original_url,
+        "owner_user_id": doc.user_id,
+        "status": doc.status,
+        "parsed_json": json.loads(doc.parsed_json) if doc.parsed_json else None,
+        "created_at": doc.created_at.isoformat() if doc.created_at else None,
+        "updated_at": doc.updated_at.isoformat() if doc.updated_at else None,
+        "llm_used": bool(doc.llm_used),
+        "llm_model": doc.llm_model,
+        "llm_cached": bool(doc.llm_cached),
+        "timings": json.loads(doc.timings_json) if doc.timings_json else {},
+        "confidence": doc.confidence,
+        "field_sources": json.loads(doc.field_sources_json) if doc.field_sources_json else None,
+        "error": doc.error,
+        "order_id": doc.order_id,
+    }
+    if with_raw:
+        out["raw_text"] = (doc.raw_text or "")[:1500] if doc.raw_text else None
+    return out
+
+
+def _update_import(import_id: int, **fields):
+    """Arka plan görevinden çağrılır; kendi oturumunu açar."""
+    if "timings" in fields:
+        fields["timings_json"] = json.dumps(fields.pop("timings"))
+    if "parsed_json" in fields and fields["parsed_json"] is not None:
+        fields["parsed_json"] = json.dumps(fields["parsed_json"], ensure_ascii=False)
+    fields["updated_at"] = datetime.utcnow()
+    with SessionLocal() as db:
+        db.query(ImportedDocument).filter(ImportedDocument.id == import_id).update(fields)
+        db.commit()
+
+
+def sweep_stale_imports(older_than_min: float = STALE_IMPORT_MIN) -> dict:
+    """
+    Önceki (çökmüş / yeniden başlatılmış) süreçten yarıda kalan kayıtları kurtar:
+    queued/running -> failed (dosya yeniden yüklenirse önbellekten hızlı döner),
+    committing -> parsed (sipariş oluşmuş olabilir; hata alanında not düşülür).
+    Bu süreçte işlenenler ve son `older_than_min` dakikada güncellenenler atlanır;
+    süren işlerin kayıtları her süreçte `_heartbeat` ile tazelenir, yani eşiği
+    aşan kayıt sahibi süreç artık yok demektir.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=older_than_min)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        stale = db.query(ImportedDocument).filter(ImportedDocument.updated_at < cutoff)
+        if _IN_FLIGHT:
+            stale = stale.filter(ImportedDocument.id.notin_(list(_IN_FLIGHT)))
+        failed = stale.filter(ImportedDocument.status.in_(("queued", "running"))).update(
+            {"status": "failed", "error": "İşlem yarıda kaldı (süreç yeniden başladı); dosyayı yeniden yükleyin",
+             "updated_at": now},
+            synchronize_session=False,
+        )
+        reverted = stale.filter(ImportedDocument.status == "committing").update(
+            {"status": "parsed",
+             "error": "Siparişe çevirme yarıda kaldı; tekrar denemeden önce siparişleri kontrol edin",
+             "updated_at": now},
+            synchronize_session=False,
+        )
+        db.commit()
+    return {"failed": failed, "reverted": reverted}
+
+
+def _heartbeat():
+    """Bu süreçte süren importların updated_at'ini tazele (başka worker süpürmesin)."""
+    ids = list(_IN_FLIGHT)
+    if not ids:
+        return
+    with SessionLocal() as db:
+        db.query(ImportedDocument).filter(
+            ImportedDocument.id.in_(ids), ImportedDocument.status.in_(("queued", "running"))
+        ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+
+
+def _sweep_loop(interval_s: float):
+    while True:
+        try:
+            _heartbeat()
+            sweep_stale_imports()
+        except Exception:
+            pass  # tablo henüz yok / kilit / küme değişti: sonraki turda
+        time.sleep(interval_s)
+
+
+def start_sweeper():
+    """Açılışta ve sonra eşiğin üçte biri aralıkla kalp atışı + süpürme (daemon thread)."""
+    threading.Thread(target=_sweep_loop, args=(max(10.0, STALE_IMPORT_MIN * 20),), daemon=True).start()
+
+
+def _get_import_or_404(db: Session, import_id: int) -> ImportedDocument:
+    doc = db.get(ImportedDocument, import_id)
+    if not doc:
+        raise HTTPException(404, "Import not found")
+    return doc
+
+
+def _fail_import(import_id: int, error: str):
+    """Hâlâ queued/running ise failed yap (bitmiş sonucu ezmez)."""
+    with SessionLocal() as db:
+        db.query(ImportedDocument).filter(
+            ImportedDocument.id == import_id, ImportedDocument.status.in_(("queued", "running"))
+        ).update({"status": "failed", "error": error, "updated_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+
+
+async def _process_import(import_id: int, fpath: str, cache_key: str, include_debug: bool):
+    """
+    Arka plan görevi. Ne olursa olsun (hata, iptal / kapanış) kayıt queued/running
+    kalmaz: bitiremezse failed olur.
+    """
+    _IN_FLIGHT.add(import_id)
+    try:
+        await _run_import(import_id, fpath, cache_key, include_debug)
+    except BaseException as e:
+        error = "İşlem iptal edildi" if isinstance(e, asyncio.CancelledError) else (str(e) or e.__class__.__name__)
+        try:
+            await asyncio.to_thread(_fail_import, import_id, error)
+        except BaseException:
+            _fail_import(import_id, error)  # döngü kapanıyor: doğrudan yaz
+        raise
+    finally:
+        _IN_FLIGHT.discard(import_id)
+
+
+async def _run_import(import_id: int, fpath: str, cache_key: str, include_debug: bool):
+    t0 = time.perf_counter()
+    timings = {}
+    async with workers.slots():
+        timings["queue_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        await asyncio.to_thread(_update_import, import_id, status="running", timings=dict(timings))
+        try:
+            result = await workers.run_in_pool(_run_ocr_stage, fpath)
+        except Exception as e:
+            timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            await asyncio.to_thread(
+                _update_import, import_id, status="failed", error=str(e) or e.__class__.__name__, timings=timings
+            )
+            return
+    timings.update(result["timings"])
+    ocr_text = result["ocr_text"]
+    parsed, field_meta = result["rules"], result["fields"]
+    confidence = _draft_confidence(field_meta) if field_meta else None
+
+    # ---------- Kapı: kural/ROI taslağı yeterince güvenliyse LLM atlanır ----------
+    low = _low_fields(field_meta) if field_meta else list(_FIELD_PATHS)
+    need_llm = parsed is None or any(f in LLM_GATE_FIELDS for f in low)
+    llm_used, llm_cached, llm_model = False, False, None
+    if need_llm and ocr_text and ocr_text.strip():
+        t = time.perf_counter()
+        llm_parsed, llm_cached = await asyncio.to_thread(_parse_with_llm, ocr_text)
+        timings["llm_ms"] = round((time.perf_counter() - t) * 1000, 1)
+        if llm_parsed:
+            llm_used, llm_model = True, llm.get_client().model
+            if parsed is None:
+                parsed = _with_llm_defaults(llm_parsed)
+                field_meta = {f: {"source": "llm", "confidence": None} for f in _FIELD_PATHS}
+            else:
+                # yalnızca eşik altı alanlar LLM'den
+                parsed, field_meta = _merge_llm(parsed, field_meta, llm_parsed, low)
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    if not parsed:
+        await asyncio.to_thread(_update_import, import_id, status="failed", error="Belge okunamadı", timings=timings)
+        return
+
+    # DB / önbellek yazıları bloklayıcı: olay döngüsü dışında
+    await asyncio.to_thread(ocr_parse_cache.put, cache_key, {
+        "ocr_text": ocr_text,
+        "parsed": parsed,
+        "fields": field_meta,
+        "confidence": confidence,
+        "llm_used": llm_used,
+        "llm_model": llm_model,
+    })
+    await asyncio.to_thread(
+        _update_import,
+        import_id,
+        status="parsed",
+        parsed_json=parsed,
+        field_sources_json=json.dumps(field_meta),
+        confidence=confidence,
+        raw_text=ocr_text if include_debug else None,
+        llm_used=llm_used,
+        llm_model=llm_model,
+        llm_cached=llm_cached,
+        timings=timings,
+    )
+
+
+def _open_import(db: Session, user_id: int, stored: StoredUpload, include_debug: bool):
+    """
+    Dosyayı blob deposuna al ve import kaydını aç (bloklayıcı; thread'de çalışır).
+    Aynı içerik daha önce işlendiyse kayıt doğrudan parsed olur.
+    Dönüş: (kayıt, önbellek_değeri | None, dosya yolu, önbellek anahtarı)
+    """
+    blob = blob_store.ingest(db, stored)
+    try:
+        return _insert_import(db, user_id, blob, include_debug)
+    except Exception:
+        # kayıt açılamadı: ingest'in eklediği referansı geri al
+        db.rollback()
+        blob_store.release(db, blob.sha256)
+        raise
+
+
+def _insert_import(db: Session, user_id: int, blob, include_debug: bool):
+    fpath = blob_store.path_for(blob.sha256, blob.ext)
+    cache_key = f"{blob.sha256}:{PIPELINE_VERSION}"
+    t = time.perf_counter()
+    cached = ocr_parse_cache.get(cache_key)
+    if cached:
+        doc = ImportedDocument(
+            user_id=user_id,
+            status="parsed",
+            original_url=fpath,
+            blob_sha256=blob.sha256,
+            parsed_json=json.dumps(cached["parsed"], ensure_ascii=False),
+            field_sources_json=json.dumps(cached.get("fields")),
+            confidence=cached.get("confidence"),
+            raw_text=cached["ocr_text"] if include_debug else None,
+            llm_used=cached["llm_used"],
+            llm_model=cached["llm_model"],
+            timings_json=json.dumps({"cache_ms": round((time.perf_counter() - t) * 1000, 1)}),
+        )
+        db.add(doc)
+        db.commit()
+        return doc, cached, fpath, cache_key
+
+    doc = ImportedDocument(user_id=user_id, status="queued", original_url=fpath, blob_sha256=blob.sha256)
+    db.add(doc)
+    db.commit()
+    return doc, None, fpath, cache_key
+
+
+async def _start_import(db: Session, user_id: int, stored: StoredUpload, include_debug: bool):
+    """
+    Import kaydını aç; önbellekte yoksa OCR/LLM arka planda başlar.
+    Dönüş: (kayıt, önbellek_değeri | None, görev | None)
+    """
+    doc, cached, fpath, cache_key = await asyncio.to_thread(_open_import, db, user_id, stored, include_debug)
+    if cached:
+        return doc, cached, None
+    task = asyncio.create_task(_process_import(doc.id, fpath, cache_key, include_debug))
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+    return doc, None, task
+
+
+@router.post(
+    "",
+    status_code=202,
+    summary="Belge yükle; OCR/AI ayrıştırma arka planda (yalnızca AI Director/Owner)",
+)
 async def import_document(
+    response: Response,
     file: UploadFile = File(...),
     user = Depends(get_current_user),
-    include_debug: bool = Query(False, description="Ham OCR metnini ilk 1500 karakterle döndür")
+    db: Session = Depends(get_db),
+    include_debug: bool = Query(False, description="Ham OCR metnini import kaydında sakla (GET ile ilk 1500 karakter)")
 ):
-    global AUTO_ID
-    # 1) Dosyayı kaydet
-    ext = os.path.splitext(file.filename or "")[1] or ".bin"
-    fname = f"{uuid.uuid4().hex}{ext}"
-    fpath = os.path.join(STORAGE_DIR, fname)
-    with open(fpath, "wb") as f:
-        f.write(await file.read())
-
-    # ---------- OCR ham metni ----------
-    ocr_text = _load_and_ocr(fpath)
-
-    # ---------- LLM ile alan çıkarımı (öncelik LLM) ----------
-    parsed = None
-    llm_used = False
-    llm_model = os.getenv("OLLAMA_MODEL", "llama3")
-    llm_host  = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-
-    if ocr_text and len(ocr_text.strip()) > 0:
-        prompt = _build_llm_prompt(ocr_text)
-        llm_raw = _ask_ollama_for_json(llm_model, prompt, host=llm_host)
-        if llm_raw:
+    # 1) Dosyayı parça parça kaydet, bu sırada SHA-256 hesapla (sınır: MAX_UPLOAD_MB)
+    stored = await save_upload(file, blob_store.tmp_dir)
+
+    # 2) Aynı içerik daha önce işlendiyse OCR/LLM'i atla; yoksa kayıt queued,
+    #    OCR/LLM süreç havuzunda çalışır
+    doc, cached, _ = await _start_import(db, user.id, stored, include_debug)
+    if cached:
+        response.status_code = 200
+        return {
+            "import_id": doc.id, "status": "parsed", "cached": True,
+            "parsed_json": cached["parsed"], "llm_used": cached["llm_used"],
+        }
+    return {"import_id": doc.id, "status": "queued", "cached": False, "poll_url": f"/ai/imports/{doc.id}"}
+
+
+# ---------- Toplu import (ay sonu taramaları) ----------
+BATCH_MAX_FILES = int(os.getenv("AI_BATCH_MAX_FILES", "500"))
+BATCH_MAX_MEMBER_MB = int(os.getenv("AI_BATCH_MAX_MEMBER_MB", "50"))
+BATCH_MAX_ZIP_MB = int(os.getenv("AI_BATCH_MAX_ZIP_MB", "1024"))
+_BATCH_EXTS = {".jpg", ".jpeg", ".png", ".heic", ".heif", ".webp", ".tif", ".tiff", ".bmp", ".pdf"}
+
+
+def _unpack_zip(zip_path: str, limit: int) -> list[tuple[str, StoredUpload]]:
+    """ZIP içindeki belgeleri geçici dizine aç (hash hesaplayarak). Dönüş: [(ad, dosya)]."""
+    out = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            ext = os.path.splitext(name)[1].lower()
+            if info.is_dir() or name.startswith("__MACOSX/") or ext not in _BATCH_EXTS:
+                continue
+            if info.file_size > BATCH_MAX_MEMBER_MB * 1024 * 1024:
+                continue
+            if len(out) >= limit:
+                break
+            # file_size başlığı yanıltıcı olabilir; sınır kopyalarken de uygulanır
             try:
-                parsed_llm = _normalize_llm_json(llm_raw)
-                if parsed_llm and isinstance(parsed_llm, dict) and parsed_llm.get("items") is not None:
-                    parsed = parsed_llm
-                    llm_used = True
-            except Exception:
-                parsed = None
+                with zf.open(info) as src:
+                    stored = copy_stream(src, blob_store.tmp_dir, ext, BATCH_MAX_MEMBER_MB * 1024 * 1024)
+            except HTTPException:
+                continue
+            out.append((name, stored))
+    return out
 
-    # ---------- LLM başarısızsa: kural tabanlı OCR fallback ----------
-    if not parsed:
-        parsed = parse_document_ocr(fpath)
-
-    debug_raw = (ocr_text or "") if include_debug else None
-
-    # 3) Bellekte import kaydı
-    AUTO_ID += 1
-    IMPORTS[AUTO_ID] = {
-        "id": AUTO_ID,
-        "file_path": fpath,
-        "owner_user_id": user.id,
-        "status": "parsed",            # queued/parsed/failed/committed
-        "parsed_json": parsed,         # UI düzeltmesi için
-        "raw_text": debug_raw,         # sadece debug amaçlı
-        "created_at": datetime.utcnow().isoformat(),
-        "llm_used": llm_used,
-        "llm_model": llm_model if llm_used else None,
-    }
-    resp = {"import_id": AUTO_ID, "status": "parsed", "parsed_json": parsed, "llm_used": llm_used}
-    if include_debug:
-        resp["debug_raw"] = (debug_raw or "")[:1500]
-    return resp
 
+def _batch_line(event: dict, fmt: str) -> str:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
 
-@router.get("/{import_id}", summary="Import durum/taslak getir")
-def get_import(import_id: int):
-    imp = IMPORTS.get(import_id)
-    if not imp:
-        raise HTTPException(404, "Import not found")
-    return imp
+
+@router.post("/batch", summary="Çoklu dosya veya ZIP yükle; sonuçlar tamamlandıkça NDJSON/SSE akışı")
+async def import_batch(
+    files: list[UploadFile] = File(...),
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    include_debug: bool = Query(False),
+):
+    # 1) Tüm belgeleri diske al (istek bitince UploadFile'lar kapanır)
+    docs: list[tuple[str, StoredUpload]] = []
+    collected = False
+    try:
+        for f in files:
+            if len(docs) >= BATCH_MAX_FILES:
+                break
+            is_zip = safe_ext(f.filename) == ".zip"
+            max_bytes = (BATCH_MAX_ZIP_MB if is_zip else MAX_UPLOAD_MB) * 1024 * 1024
+            stored = await save_upload(f, blob_store.tmp_dir, max_bytes)
+            if is_zip:
+                try:
+                    docs += await asyncio.to_thread(_unpack_zip, stored.path, BATCH_MAX_FILES - len(docs))
+                except zipfile.BadZipFile:
+                    raise HTTPException(400, f"Geçersiz ZIP: {f.filename}")
+                finally:
+                    os.remove(stored.path)
+            else:
+                docs.append((f.filename or os.path.basename(stored.path), stored))
+        collected = True
+    finally:
+        if not collected:
+            # sonraki bir dosya reddedildi (413, geçersiz ZIP...): öncekilerin geçici dosyaları silinir
+            for _, stored in docs:
+                try:
+                    os.remove(stored.path)
+                except OSError:
+                    pass
+    if not docs:
+        raise HTTPException(400, "İşlenecek belge bulunamadı")
+
+    # 2) Kayıtları aç; işler ortak süreç havuzu (workers.slots) ile sınırlı
+    started = []
+    for name, stored in docs:
+        doc, cached, task = await _start_import(db, user.id, stored, include_debug)
+        started.append((name, doc.id, cached is not None, task))
+
+    def _load(import_id: int) -> dict:
+        with SessionLocal() as s:
+            return _import_to_dict(s.get(ImportedDocument, import_id))
+
+    async def _wait(index: int, name: str, import_id: int, cached: bool, task):
+        if task is not None:
+            await task
+        return index, name, cached, await asyncio.to_thread(_load, import_id)
+
+    async def stream():
+        t0 = time.perf_counter()
+        total, done, failed = len(started), 0, 0
+        yield _batch_line({"type": "start", "total": total, "import_ids": [i for _, i, _, _ in started]}, format)
+        waits = [_wait(n, name, iid, cached, task) for n, (name, iid, cached, task) in enumerate(started)]
+        for fut in asyncio.as_completed(waits):
+            index, name, cached, rec = await fut
+            done += 1
+            failed += rec["status"] == "failed"
+            elapsed = time.perf_counter() - t0
+            yield _batch_line({
+                "type": "result",
+                "index": index,
+                "filename": name,
+                "import_id": rec["id"],
+                "status": rec["status"],
+                "cached": cached,
+                "parsed_json": rec["parsed_json"],
+                "field_sources": rec["field_sources"],
+                "error": rec["error"],
+                "timings": rec["timings"],
+                "done": done,
+                "total": total,
+                "docs_per_min": round(done / elapsed * 60, 1) if elapsed > 0 else None,
+            }, format)
+        elapsed = time.perf_counter() - t0
+        yield _batch_line({
+            "type": "summary",
+            "total": total,
+            "parsed": total - failed,
+            "failed": failed,
+            "elapsed_s": round(elapsed, 2),
+            "docs_per_min": round(total / elapsed * 60, 1) if elapsed > 0 else None,
+        }, format)
+
+    media = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media)
+
+
+@router.get("/cache/stats", summary="OCR/parse ve LLM önbellekleri: isabet/ıska sayaçları")
+def cache_stats():
+    return {"ocr_parse": ocr_parse_cache.stats(), "llm": llm_cache.stats()}
+
+
+@router.get("/llm/stats", summary="Ollama istemcisi: devre kesici durumu ve sayaçlar")
+def llm_stats():
+    return llm.get_client().stats()
+
+
+@router.get("/ocr/strategies", summary="Form tipine göre OCR stratejisi kazanma istatistikleri")
+def ocr_strategies():
+    return ocr_strategy.strategy_stats()
+
+
+@router.get("", summary="Kullanıcının importlarını listele (durum filtresi)")
+def list_imports(
+    status: str | None = Query(None, description="queued/running/parsed/failed/committed"),
+    limit: int = Query(50, ge=1, le=200),
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    q = db.query(ImportedDocument).filter(ImportedDocument.user_id == user.id)
+    if status:
+        q = q.filter(ImportedDocument.status == status)
+    rows = q.order_by(ImportedDocument.created_at.desc()).limit(limit).all()
+    return [_import_to_dict(r) for r in rows]
+
+
+@router.get("/{import_id}", summary="Import durum/taslak getir (queued/running/parsed/failed + aşama süreleri)")
+def get_import(import_id: int, db: Session = Depends(get_db)):
+    return _import_to_dict(_get_import_or_404(db, import_id), with_raw=True)
 
 
 @router.patch("/{import_id}/parsed", summary="Parsed JSON'ı güncelle (UI düzeltmesi)")
-def patch_parsed(import_id: int, payload: dict):
-    imp = IMPORTS.get(import_id)
-    if not imp:
-        raise HTTPException(404, "Import not found")
-    base = imp["parsed_json"]
+def patch_parsed(import_id: int, payload: dict, db: Session = Depends(get_db)):
+    doc = _get_import_or_404(db, import_id)
+    if doc.status != "parsed":
+        raise HTTPException(409, f"Import henüz düzenlenemez (durum: {doc.status})")
+    base = json.loads(doc.parsed_json) if doc.parsed_json else {}
     base.update(payload)  # shallow merge
-    imp["parsed_json"] = base
+    doc.parsed_json = json.dumps(base, ensure_ascii=False)
+    db.commit()
     return {"ok": True, "parsed_json": base}
 
 
+@router.delete("/{import_id}", summary="Import kaydını sil (dosya son referanssa depodan kalkar)")
+def delete_import(import_id: int, db: Session = Depends(get_db)):
+    doc = _get_import_or_404(db, import_id)
+    sha = doc.blob_sha256
+    # Atomik: arka plan işi / siparişe çevirme bu kayda hâlâ yazıyor olabilir
+    deleted = (
+        db.query(ImportedDocument)
+        .filter(ImportedDocument.id == import_id,
+                ImportedDocument.status.notin_(("queued", "running", "committing")))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    if not deleted:
+        db.refresh(doc)
+        raise HTTPException(409, f"Import şu an silinemez (durum: {doc.status})")
+    blob_store.release(db, sha)
+    return {"ok": True}
+
+
 @router.post("/{import_id}/to-order", summary="Taslak veriden sipariş (Order) oluştur")
 def import_to_order(import_id: int, db: Session = Depends(get_db)):
-    # Döngüyü kırmak için lazy import
-    from ..main import Customer, Vehicle, Order, OrderItem
+    # Döngüyü kırmak için lazy import (siparişler service.db'de)
+    from ..main import SessionLocal as ServiceSession
+
+    doc = _get_import_or_404(db, import_id)
+    # Atomik sahiplenme: aynı taslak iki worker'dan iki kez siparişe çevrilmesin
+    claimed = (
+        db.query(ImportedDocument)
+        .filter(ImportedDocument.id == import_id, ImportedDocument.status == "parsed")
+        .update({"status": "committing", "updated_at": datetime.utcnow()})
+    )
+    db.commit()
+    if not claimed:
+        db.refresh(doc)
+        raise HTTPException(409, f"Import siparişe çevrilemez (durum: {doc.status})")
+    data = json.loads(doc.parsed_json) if doc.parsed_json else {}
 
-    imp = IMPORTS.get(import_id)
-    if not imp:
-        raise HTTPException(404, "Import not found")
-    data = imp["parsed_json"] or {}
+    sdb = ServiceSession()
+    try:
+        result = _create_order_from_parsed(sdb, data)
+    except BaseException:
+        sdb.rollback()
+        doc.status = "parsed"
+        db.commit()
+        raise
+    finally:
+        sdb.close()
+
+    doc.status = "committed"
+    doc.order_id = result["order_id"]
+    db.commit()
+    return result
+
+
+def _create_order_from_parsed(db: Session, data: dict) -> dict:
+    from ..main import Customer, Vehicle, Order, OrderItem
 
     # --- Customer upsert (basit) ---
     cust_name = (data.get("customer", {}) or {}).get("name") or "Müşteri"
@@ -613,6 +1301,12 @@ def import_to_order(import_id: int, db: Session = Depends(get_db)):
     vdata = data.get("vehicle", {}) or {}
     plate = (vdata.get("plate") or "").strip().upper()
     vehicle = db.query(Vehicle).filter(Vehicle.plate == plate).first() if plate else None
+    if not vehicle and plate:
+        # OCR karışması (O/0, I/1, B/8...) yüzünden mükerrer araç açma: yalnızca
+        # karışma sınıfı içi en çok iki farklılık (gerçek bir düzenleme değil)
+        cand = plate_index.index("service").best(plate, max_cost=plate_index.OCR_MAX_COST)
+        if cand is not None:
+            vehicle = db.get(Vehicle, cand.ref)
     if not vehicle:
         vehicle = Vehicle(
             plate=plate or "PLAKASIZ",
@@ -643,27 +1337,29 @@ def import_to_order(import_id: int, db: Session = Depends(get_db)):
     db.flush()
 
     # --- Items ---
+    lines = []
     for it in data.get("items", []):
-        db.add(OrderItem(
+        item = OrderItem(
             order=order,
             type=it.get("type") or "labor",
             name=it.get("name") or "Kalem",
             qty=int(it.get("qty") or 1),
             price=float(it.get("price") or 0.0),
-        ))
+            vat_rate=float(it["vat_rate"]) if it.get("vat_rate") is not None else totals.DEFAULT_VAT_RATE,
+        )
+        db.add(item)
+        lines.append((item.qty, item.price, item.vat_rate))
+    totals.apply(order, lines)
 
     db.commit()
-    db.refresh(order)
-
-    imp["status"] = "committed"
-    imp["order_id"] = order.id
 
-    total = sum(i.qty * (i.price or 0) for i in order.items)
     return {
         "order_id": order.id,
         "plate": vehicle.plate,
         "customer": customer.name,
         "status": order.status,
-        "item_count": len(order.items),
-        "total": round(total, 2),
+        "item_count": len(lines),
+        "total": float(order.subtotal),
+        "vat_total": float(order.vat_total),
+        "grand_total": float(order.grand_total),
     }
\ No newline at end of file
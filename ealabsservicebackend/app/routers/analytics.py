@@ -0,0 +1,74 @@
+# app/routers/analytics.py
+from datetime import date, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from .. import analytics
+from ..deps import require_roles
+
+router = APIRouter(prefix="/analytics", tags=["analytics"], dependencies=[Depends(require_roles(["OWNER"]))])
+
+# service: /orders (service.db), app: iş emirleri (app.db)
+Source = Literal["service", "app"]
+
+
+def _range(date_from: Optional[date], date_to: Optional[date], default_days: int):
+    date_to = date_to or date.today()
+    return date_from or date_to - timedelta(days=default_days - 1), date_to
+
+
+@router.get("/revenue/daily")
+def revenue_daily(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    source: Source = "service",
+):
+    """Günlük ciro (varsayılan: son 30 gün)."""
+    date_from, date_to = _range(date_from, date_to, 30)
+    with analytics.session_for(source) as db:
+        return analytics.daily_revenue(db, source, date_from, date_to)
+
+
+@router.get("/revenue/monthly")
+def revenue_monthly(
+    months: int = Query(12, ge=1, le=120),
+    source: Source = "service",
+):
+    """Aylık ciro (varsayılan: içinde bulunulan ay dahil son 12 ay)."""
+    today = date.today()
+    y, m = divmod(today.year * 12 + today.month - 1 - (months - 1), 12)
+    with analytics.session_for(source) as db:
+        return analytics.monthly_revenue(db, source, date(y, m + 1, 1), today)
+
+
+@router.get("/parts-vs-labor")
+def parts_vs_labor(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    source: Source = "service",
+):
+    """Parça / işçilik ayrımı (KDV hariç; varsayılan: son 30 gün)."""
+    date_from, date_to = _range(date_from, date_to, 30)
+    with analytics.session_for(source) as db:
+        return {"date_from": date_from, "date_to": date_to,
+                **analytics.parts_vs_labor(db, source, date_from, date_to)}
+
+
+@router.get("/brands/avg-ticket")
+def avg_ticket_by_brand(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    source: Source = "service",
+):
+    """Marka başına ortalama iş emri tutarı (KDV dahil; varsayılan: son 365 gün)."""
+    date_from, date_to = _range(date_from, date_to, 365)
+    with analytics.session_for(source) as db:
+        return analytics.avg_ticket_by_brand(db, source, date_from, date_to)
+
+
+@router.get("/open-orders/aging")
+def open_orders_aging(source: Source = "service"):
+    """Açık iş emirlerinin yaş dağılımı (gün)."""
+    with analytics.session_for(source) as db:
+        return analytics.open_order_aging(db, source)
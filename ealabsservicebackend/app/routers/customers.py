@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..deps import get_db
-from .. import models, schemas
+from .. import models, schemas, pagination
 
 router = APIRouter(prefix="/customers", tags=["customers"])
 
@@ -14,5 +14,14 @@ def create_customer(payload: schemas.CustomerCreate, db: Session = Depends(get_d
     return obj
 
 @router.get("", response_model=List[schemas.CustomerRead])
-def list_customers(db: Session = Depends(get_db)):
-    return db.query(models.Customer).order_by(models.Customer.created_at.desc()).all()
\ No newline at end of file
+def list_customers(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Önceki cevabın X-Next-Cursor başlığı"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    # yeni -> eski; sonraki sayfa X-Next-Cursor başlığında
+    q = pagination.keyset(db.query(models.Customer), models.Customer.created_at, models.Customer.id, cursor, limit)
+    rows, next_cursor = pagination.split(q.all(), limit)
+    pagination.set_next_cursor(response, next_cursor)
+    return [c for (c,) in rows]
@@ -35,9 +35,46 @@ def fetch_orders_by_ids(ids: List[str]):
       "items": [{"desc":"Yağ filtresi","qty":1,"unit_price":300.0},
                 {"desc":"Motor yağı 5W-30","qty":4,"unit_price":180.0}]
     }
+    Toplamlar iş emri satırında saklanan değerlerdir (app.totals); kalemler
+    yalnızca tablo için okunur.
     """
-    # TODO: DB sorgusu
-    raise NotImplementedError
+    from sqlalchemy.orm import selectinload
+    from ..database import SessionLocal
+    from ..models import Customer, Plate, ServiceOrder
+
+    with SessionLocal() as db:
+        rows = (
+            db.query(ServiceOrder)
+            .filter(ServiceOrder.id.in_(ids))
+            .options(selectinload(ServiceOrder.items), selectinload(ServiceOrder.vehicle))
+            .all()
+        )
+        customers = {c.id: c for c in db.query(Customer).filter(Customer.id.in_({o.customer_id for o in rows}))}
+        plates = dict(
+            db.query(Plate.vehicle_id, Plate.plate_normalized)
+            .filter(Plate.vehicle_id.in_({o.vehicle_id for o in rows}), Plate.valid_to.is_(None))
+        )
+        by_id = {o.id: o for o in rows}
+        out = []
+        for oid in ids:
+            o = by_id.get(oid)
+            if o is None:
+                continue
+            c, v = customers.get(o.customer_id), o.vehicle
+            out.append({
+                "id": o.id,
+                "number": f"IE-{o.opened_at:%Y}-{o.id[:8].upper()}",
+                "created_at": o.opened_at,
+                "subtotal": float(o.subtotal or 0),
+                "vat": float(o.vat_total or 0),
+                "total": float(o.grand_total or 0),
+                "customer": {"name": c.name, "email": c.email or "-", "phone": c.phone or "-"} if c else {},
+                "vehicle": {"plate": plates.get(o.vehicle_id, ""), "brand": v.brand or "", "model": v.model or "",
+                            "year": v.year or "-", "km": o.odometer_km or "-"},
+                "items": [{"desc": i.description, "qty": i.qty, "unit_price": float(i.unit_price or 0)}
+                          for i in o.items],
+            })
+        return out
 
 def _draw_order_pdf(order) -> bytes:
     buf = io.BytesIO()
@@ -89,7 +126,7 @@ def _draw_order_pdf(order) -> bytes:
     c.line(120*mm, y, 190*mm, y)
     y -= 8*mm
     c.drawRightString(160*mm, y, "Ara Toplam:")
-    c.drawRightString(190*mm, y, f"{(order['total'] - order.get('vat',0)):.2f} ₺")
+    c.drawRightString(190*mm, y, f"{order.get('subtotal', order['total'] - order.get('vat',0)):.2f} ₺")
     y -= 6*mm
     c.drawRightString(160*mm, y, "KDV:")
     c.drawRightString(190*mm, y, f"{order.get('vat',0):.2f} ₺")
@@ -1,19 +1,35 @@
-import os
-from fastapi import APIRouter, Depends, UploadFile, File as F
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as F
 from sqlalchemy.orm import Session
 from ..deps import get_db
 from .. import models, schemas
-
-UPLOAD_DIR = "uploads"
+from ..uploads import save_upload
+from ..storage import blob_store
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 @router.post("")
 async def upload_file(file: UploadFile = F(...), db: Session = Depends(get_db)):
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    dest = os.path.join(UPLOAD_DIR, file.filename)
-    with open(dest, "wb") as out:
-        out.write(await file.read())
-    obj = models.File(path=dest, kind="scan", status="raw")
-    db.add(obj); db.commit(); db.refresh(obj)
-    return {"id": obj.id, "path": obj.path}
\ No newline at end of file
+    # parça parça geçici dizine, sonra içerik adresli depoya (aynı içerik tek kopya)
+    stored = await save_upload(file, blob_store.tmp_dir)
+    blob = blob_store.ingest(db, stored)
+    obj = models.File(path=blob_store.path_for(blob.sha256, blob.ext), blob_sha256=blob.sha256,
+                      kind="scan", status="raw")
+    try:
+        db.add(obj); db.commit(); db.refresh(obj)
+    except Exception:
+        # kayıt açılamadı: ingest'in eklediği referansı geri al
+        db.rollback()
+        blob_store.release(db, blob.sha256)
+        raise
+    return {"id": obj.id, "path": obj.path, "sha256": stored.sha256, "size": stored.size}
+
+@router.delete("/{file_id}")
+def delete_file(file_id: str, db: Session = Depends(get_db)):
+    obj = db.get(models.File, file_id)
+    if not obj:
+        raise HTTPException(404, "Dosya bulunamadı")
+    sha = obj.blob_sha256
+    db.delete(obj); db.commit()
+    # son referanssa blob ve dosya da silinir
+    blob_store.release(db, sha)
+    return {"ok": True}
\ No newline at end of file
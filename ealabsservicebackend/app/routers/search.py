@@ -1,18 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..deps import get_db
-from .. import models
+from .. import models, plate_index
 from ..utils import norm_plate
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-@router.get("/plate/{plate}")
-def search_plate(plate: str, db: Session = Depends(get_db)):
-    p = norm_plate(plate)
-    active = db.query(models.Plate).filter(
+def _active_plate(db: Session, p: str):
+    return db.query(models.Plate).filter(
         models.Plate.plate_normalized == p,
         models.Plate.valid_to.is_(None)
     ).order_by(models.Plate.valid_from.desc()).first()
-    if not active:
+
+
+@router.get("/plate/{plate}")
+def search_plate(plate: str, db: Session = Depends(get_db)):
+    p = norm_plate(plate)
+    active = _active_plate(db, p)
+    if active:
+        return {"vehicle_id": active.vehicle_id}
+
+    # birebir yok: eşleşme yalnızca OCR karışmalarıyla (O/0, I/1, B/8...); gerçek
+    # harf/rakam farkı başka aracı seçmesin, yalnızca adaylarda (maliyete göre sıralı) döner
+    idx = plate_index.index("app")
+    cands = idx.candidates(p)
+    best = idx.best(p, max_cost=plate_index.OCR_MAX_COST)
+    active = _active_plate(db, best.plate) if best else None
+    if not active and not cands:
         raise HTTPException(404, "Bu plakaya ait aktif araç bulunamadı")
-    return {"vehicle_id": active.vehicle_id}
\ No newline at end of file
+    return {
+        "vehicle_id": active.vehicle_id if active else None,
+        "matched_plate": best.plate if active else None,
+        "candidates": [{"plate": c.plate, "vehicle_id": c.ref, "cost": c.cost} for c in cands],
+    }
\ No newline at end of file
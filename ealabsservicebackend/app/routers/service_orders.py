@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from ..deps import get_db
-from .. import models, schemas
+from .. import models, schemas, totals
 
 router = APIRouter(prefix="/service-orders", tags=["service_orders"])
 
@@ -33,11 +33,14 @@ def list_items(order_id: str, db: Session = Depends(get_db)):
 
 @router.post("/{order_id}/items", response_model=schemas.ServiceItemRead)
 def add_item(order_id: str, item: schemas.ServiceItemCreate, db: Session = Depends(get_db)):
-    o = db.query(models.ServiceOrder).filter(models.ServiceOrder.id == order_id).first()
+    # sipariş satırı kilitlenir: eşzamanlı kalem eklemeleri toplamları sırayla yazar
+    o = db.query(models.ServiceOrder).filter(models.ServiceOrder.id == order_id).with_for_update().first()
     if not o:
         raise HTTPException(404, "İş emri bulunamadı")
     it = models.ServiceItem(service_order_id=order_id, **item.model_dump())
     db.add(it)
+    # toplamlar kalemlerden aynı transaction'da yeniden hesaplanır
+    totals.recompute(db, o)
     db.commit(); db.refresh(it)
     return it
 
@@ -56,6 +59,7 @@ def replace_items(order_id: str, payload: schemas.ItemsBulkPayload, db: Session
     for it in payload.items:
         row = models.ServiceItem(service_order_id=order_id, **it.model_dump())
         db.add(row); db.flush(); created.append(row)
+    totals.apply(o, [(it.qty, it.unit_price, it.vat_rate) for it in payload.items])
 
     db.commit()
     # taze nesneleri tekrar yükleyelim
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import date
+from typing import Optional
 from ..deps import get_db, require_roles
-from .. import models, schemas
+from .. import models, schemas, pagination, search_index
 from ..utils import norm_plate
 
 router = APIRouter(
@@ -39,14 +40,24 @@ def prefill_by_plate(plate: str, db: Session = Depends(get_db)):
     return {"vehicle": vehicle, "last_customer": last_customer}
 
 @router.get("/find-customer", response_model=list[schemas.CustomerRead])
-def find_customer(q: str = Query(..., min_length=2), db: Session = Depends(get_db)):
-    # Basit, case-insensitive LIKE
-    return (
-        db.query(models.Customer)
-        .filter(func.lower(models.Customer.name).like(f"%{q.lower()}%"))
-        .order_by(models.Customer.created_at.desc())
-        .limit(20).all()
-    )
+def find_customer(
+    response: Response,
+    q: str = Query(..., min_length=2),
+    cursor: Optional[str] = Query(None, description="Önceki cevabın X-Next-Cursor başlığı"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    # FTS5 (Türkçe katlama, ad/telefon/e-posta); index yoksa case-insensitive LIKE.
+    # Sonuçlar (created_at, id) sırasıyla sayfalanır.
+    refs = search_index.match_refs(db, q, "customer")
+    if refs is not None:
+        query = db.query(models.Customer).filter(models.Customer.id.in_(refs))
+    else:
+        query = db.query(models.Customer).filter(func.lower(models.Customer.name).like(f"%{q.lower()}%"))
+    query = pagination.keyset(query, models.Customer.created_at, models.Customer.id, cursor, limit)
+    rows, next_cursor = pagination.split(query.all(), limit)
+    pagination.set_next_cursor(response, next_cursor)
+    return [c for (c,) in rows]
 
 @router.post("/quick-order", response_model=schemas.QuickOrderResponse)
 def quick_order(payload: schemas.QuickOrderPayload, db: Session = Depends(get_db)):
@@ -1,12 +1,13 @@
 # app/routers/vehicles.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import desc, func, or_
 
+from app import plate_index, search_index, snapshots
 from app.deps import get_db
-from app.models import Vehicle, Customer, Plate, Ownership, ServiceOrder
+from app.models import Vehicle, Customer, Plate, Ownership, ServiceOrder, VehicleSnapshot
 
 router = APIRouter(prefix="/api/vehicles", tags=["vehicles"])
 
@@ -21,11 +22,27 @@ class VehicleByPlateResponse(BaseModel):
     customerName: Optional[str] = None
     customerEmail: Optional[str] = None
     customerPhone: Optional[str] = None
+    # birebir eşleşme yoksa bulanık index'in bulduğu kayıtlı plaka (OCR/yazım hatası)
+    matchedPlate: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class VehicleSearchResult(BaseModel):
+    id: str
+    vin: Optional[str] = None
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    plate: Optional[str] = None  # güncel plaka (valid_to IS NULL)
+
+
+def _search_result(v: Vehicle) -> VehicleSearchResult:
+    current = next((p.plate_normalized for p in v.plates if p.valid_to is None), None)
+    return VehicleSearchResult(id=v.id, vin=v.vin, brand=v.brand, model=v.model, year=v.year, plate=current)
+
+
 def normalize_plate_for_lookup(plate: str) -> str:
     """
     Plate.plate_normalized ile eşleşmesi için:
@@ -36,6 +53,37 @@ def normalize_plate_for_lookup(plate: str) -> str:
     return "".join(ch for ch in p if ch.isalnum())
 
 
+def _latest_plate_row(db: Session, norm: str) -> Optional[Plate]:
+    # En güncel plate kaydı (valid_to IS NULL öncelik; sonra valid_from'a göre en yeni)
+    return (
+        db.query(Plate)
+        .filter(Plate.plate_normalized == norm)
+        .order_by(Plate.valid_to.is_(None).desc(), desc(Plate.valid_from))
+        .first()
+    )
+
+
+@router.get("/search", response_model=List[VehicleSearchResult])
+def search_vehicles(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50),
+                    db: Session = Depends(get_db)):
+    """
+    Marka / model / şasi no ile araç arama (FTS5, bm25 sıralı; index yoksa LIKE).
+    Plaka için /by-plate (birebir + bulanık) kullanılır.
+    """
+    refs = search_index.search(db, q, "vehicle", limit)
+    query = db.query(Vehicle).options(selectinload(Vehicle.plates))
+    if refs is None:
+        ql = f"%{q.strip().lower()}%"
+        rows = query.filter(or_(
+            func.lower(Vehicle.brand).like(ql),
+            func.lower(Vehicle.model).like(ql),
+            func.lower(Vehicle.vin).like(ql),
+        )).limit(limit).all()
+        return [_search_result(v) for v in rows]
+    rows = {v.id: v for v in query.filter(Vehicle.id.in_(refs))}
+    return [_search_result(rows[r]) for r in refs if r in rows]
+
+
 @router.get("/by-plate/{plate}", response_model=VehicleByPlateResponse)
 def get_by_plate(plate: str, db: Session = Depends(get_db)):
     """
@@ -47,14 +95,36 @@ def get_by_plate(plate: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Plaka gerekli")
 
     norm = normalize_plate_for_lookup(plate)
+    matched = None
 
-    # En güncel plate kaydını bul (valid_to IS NULL öncelik; sonra valid_from'a göre en yeni)
-    plate_row: Optional[Plate] = (
-        db.query(Plate)
-        .filter(Plate.plate_normalized == norm)
-        .order_by(Plate.valid_to.is_(None).desc(), desc(Plate.valid_from))
-        .first()
-    )
+    # Hızlı yol: önbellek / vehicle_snapshots (güncel plaka, tek indeksli okuma)
+    snap = snapshots.lookup(db, norm)
+    plate_row = _latest_plate_row(db, norm) if snap is None else None
+    if snap is None and plate_row is None:
+        # Birebir yok: yalnızca OCR karışmaları (O/0, I/1, Z/2, B/8...) için bulanık
+        # index; tek ve açık aday varsa onunla devam. Gerçek bir harf/rakam farkı
+        # başka bir aracın sahibini (ad/e-posta/telefon) döndürmesin diye eşleşmez.
+        cand = plate_index.index("app").best(norm, max_cost=plate_index.OCR_MAX_COST)
+        if cand is None:
+            raise HTTPException(status_code=404, detail="Araç bulunamadı")
+        matched = cand.plate
+        snap = snapshots.lookup(db, matched)
+        plate_row = _latest_plate_row(db, matched) if snap is None else None
+
+    if snap is not None:
+        return VehicleByPlateResponse(
+            plate=plate.upper(),
+            brand=snap["brand"],
+            model=snap["model"],
+            year=snap["year"],
+            km=snap["last_km"],
+            customerName=snap["customer_name"],
+            customerEmail=snap["customer_email"],
+            customerPhone=snap["customer_phone"],
+            matchedPlate=matched,
+        )
+
+    # Yavaş yol (eski plaka veya henüz hesaplanmamış araç)
     if not plate_row:
         raise HTTPException(status_code=404, detail="Araç bulunamadı")
 
@@ -84,6 +154,10 @@ def get_by_plate(plate: str, db: Session = Depends(get_db)):
     )
     last_km = last_order.odometer_km if last_order and last_order.odometer_km is not None else None
 
+    # Satırı olmayan araç için anlık görüntüyü tamamla (sonraki aramalar hızlı yoldan)
+    if db.get(VehicleSnapshot, vehicle.id) is None:
+        snapshots.refresh(db, vehicle.id)
+
     # Frontend'in beklediği FLAT cevap
     return VehicleByPlateResponse(
         plate=plate.upper(),
@@ -94,4 +168,5 @@ def get_by_plate(plate: str, db: Session = Depends(get_db)):
         customerName=(customer.name if customer else None),
         customerEmail=(customer.email if customer else None),
         customerPhone=(customer.phone if customer else None),
+        matchedPlate=matched,
     )
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Json
+from typing import Dict, Optional, List
 
 # ---- Customers
 class CustomerCreate(BaseModel):
@@ -64,6 +64,10 @@ class ServiceOrderRead(BaseModel):
     odometer_km: Optional[int] = None
     status: str
     notes: Optional[str] = None
+    subtotal: Optional[float] = None
+    vat_total: Optional[float] = None
+    grand_total: Optional[float] = None
+    vat_breakdown: Optional[Json[Dict[str, str]]] = None  # oran -> matrah
     items: List[ServiceItemRead] = []
     model_config = ConfigDict(from_attributes=True)
 
@@ -0,0 +1,263 @@
+# app/search_index.py
+"""
+Müşteri / araç arama index'i (SQLite FTS5).
+
+- Metin Türkçe kurallarla katlanır (`fold`): 'İ'->'i', 'I'->'ı', sonra ı/ş/ğ/ç/ö/ü
+  -> i/s/g/c/o/u ve diğer aksanlar atılır. "işçi", "IŞÇI", "isci" aynı metne
+  düşer; sorgu da aynı şekilde katlanır.
+- Tek parçalı 3+ karakterli sorgu search_fts'te (trigram) aranır: ismin /
+  telefonun / e-postanın herhangi bir yerinde geçebilir ("lmaz", "21234").
+  Çok parçalı ya da kısa sorgular search_fts_prefix'te (unicode61, prefix
+  index) kelime başı olarak aranır ("ahmet yıl", "ay"); çok parçalı trigram
+  sorguları yoğun veride yavaştır.
+- search_docs: (tür, kayıt id) -> FTS rowid. Hem app.db (UUID) hem service.db
+  (int) id'leri tek biçimde tutulur; güncelleme rowid ile yapılır (tam tarama yok).
+- Sıralama: bm25, ad alanı ağırlıklı. Maliyet puanlanan satır sayısıyla büyür
+  (eşleşmeyi bulmak ucuz, bm25 pahalı), bu yüzden puanlama SEARCH_RANK_CANDIDATES
+  (500) eşleşmeyle sınırlanır: FTS rowid sırasıyla en yeni 500 eşleşmede durur,
+  bm25 bunlara uygulanır, sonra tür süzülür ve limit uygulanır.
+  * Eşleşme <= 500: sıralama tamdır (eski kayıtlar da ilk sıraya çıkar).
+  * Daha geniş sorgular ("yilmaz", "ahm"): yalnızca en yeni 500 eşleşme
+    sıralanır; daha eski ve daha iyi eşleşen kayıt görünmeyebilir. Arayüz
+    sorguyu daraltmayı (ad + soyad, telefon parçası) önermeli.
+  200k müşteride (yoğun sentetik veri, 10 ad x 10 soyad; "yilmaz" ~20k eşleşme)
+  p95 ~5 ms. Sınırsız puanlama (SEARCH_RANK_CANDIDATES=0) aynı sorguda ~50-60 ms.
+
+Senkron: kayıtlı modellerin (register) insert/update/delete olayları aynı flush
+içinde index'i günceller. Tablolar ve ilk doldurma app.migrations adımıdır;
+tablo yoksa (FTS5/trigram desteklenmiyor, SQLite < 3.34) aramalar None döner
+ve çağıran eski LIKE sorgusuna düşer.
+
+    python -m app.search_index rebuild [--db app|service|all]
+"""
+import argparse
+import os
+import re
+import unicodedata
+from typing import Callable
+
+from sqlalchemy import column, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+_TR_MAP = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u"})
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+_NON_DIGIT_RE = re.compile(r"\D+")
+
+# model -> (tür, kayıt -> (ad, iletişim, ek))
+_REGISTRY: dict[type, tuple[str, Callable]] = {}
+_ready: dict[str, bool] = {}  # engine url -> index tabloları var mı
+
+
+def fold(s: str | None) -> str:
+    """Türkçe büyük/küçük harf ve aksan katlama; harf/rakam dışı boşluk olur."""
+    if not s:
+        return ""
+    s = s.replace("İ", "i").replace("I", "ı").lower().translate(_TR_MAP)
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    return _NON_ALNUM_RE.sub(" ", s).strip()
+
+
+def digits(s: str | None) -> str:
+    """Telefonlar boşluksuz indexlenir ('0532 123 45 67' -> '05321234567')."""
+    return _NON_DIGIT_RE.sub("", s or "")
+
+
+# ---------- Şema ----------
+
+_DDL = [
+    "CREATE TABLE IF NOT EXISTS search_docs ("
+    " id INTEGER PRIMARY KEY, kind VARCHAR(20) NOT NULL, ref VARCHAR(64) NOT NULL)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_search_docs_kind_ref ON search_docs (kind, ref)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(name, contact, extra, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts_prefix USING fts5("
+    "name, contact, extra, tokenize='unicode61', prefix='1 2')",
+]
+_FTS_TABLES = ("search_fts", "search_fts_prefix")
+_WEIGHTS = "10.0, 2.0, 1.0"  # bm25: name, contact, extra
+RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "500"))  # 0: tüm eşleşmeler puanlanır
+
+
+def _has_tables(conn: Connection) -> bool:
+    key = str(conn.engine.url)
+    if key not in _ready:
+        _ready[key] = conn.dialect.name == "sqlite" and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")
+        ).first() is not None
+    return _ready[key]
+
+
+def install(conn: Connection, metadata) -> int:
+    """Tabloları oluştur ve `metadata`'daki kayıtlı modellerden doldur (migration adımı)."""
+    if conn.dialect.name != "sqlite":
+        return 0
+    try:
+        for stmt in _DDL:
+            conn.execute(text(stmt))
+    except Exception:
+        # FTS5 / trigram yok: aramalar LIKE ile devam eder
+        return 0
+    _ready[str(conn.engine.url)] = True
+    return rebuild(conn, metadata)
+
+
+def rebuild(conn: Connection, metadata) -> int:
+    """Index'i sıfırdan doldur."""
+    conn.execute(text("DELETE FROM search_docs"))
+    for table in _FTS_TABLES:
+        conn.execute(text(f"DELETE FROM {table}"))
+    n = 0
+    for model, (kind, _) in _REGISTRY.items():
+        if model.__table__.metadata is not metadata:
+            continue
+        for obj in Session(bind=conn).query(model).yield_per(1000):
+            _upsert(conn, model, obj)
+            n += 1
+    return n
+
+
+# ---------- Yazma kancaları ----------
+
+def _doc_id(conn: Connection, kind: str, ref: str) -> int:
+    conn.execute(
+        text("INSERT INTO search_docs (kind, ref) VALUES (:k, :r) ON CONFLICT (kind, ref) DO NOTHING"),
+        {"k": kind, "r": ref},
+    )
+    return conn.execute(
+        text("SELECT id FROM search_docs WHERE kind = :k AND ref = :r"), {"k": kind, "r": ref}
+    ).scalar_one()
+
+
+def _upsert(conn: Connection, model: type, obj):
+    kind, fields = _REGISTRY[model]
+    name, contact, extra = (fold(v) for v in fields(obj))
+    doc = _doc_id(conn, kind, str(obj.id))
+    for table in _FTS_TABLES:
+        conn.execute(text(f"DELETE FROM {table} WHERE rowid = :id"), {"id": doc})
+        conn.execute(
+            text(f"INSERT INTO {table} (rowid, name, contact, extra) VALUES (:id, :n, :c, :e)"),
+            {"id": doc, "n": name, "c": contact, "e": extra},
+        )
+
+
+def _remove(conn: Connection, kind: str, ref: str):
+    doc = conn.execute(
+        text("SELECT id FROM search_docs WHERE kind = :k AND ref = :r"), {"k": kind, "r": ref}
+    ).scalar()
+    if doc is None:
+        return
+    for table in _FTS_TABLES:
+        conn.execute(text(f"DELETE FROM {table} WHERE rowid = :id"), {"id": doc})
+    conn.execute(text("DELETE FROM search_docs WHERE id = :id"), {"id": doc})
+
+
+def register(model: type, kind: str, fields: Callable):
+    """Modeli index'e bağla. `fields(obj)` -> (ad, iletişim, ek) ham metinleri."""
+    _REGISTRY[model] = (kind, fields)
+
+    def on_write(_mapper, conn, obj):
+        if _has_tables(conn):
+            _upsert(conn, model, obj)
+
+    def on_delete(_mapper, conn, obj):
+        if _has_tables(conn):
+            _remove(conn, kind, str(obj.id))
+
+    event.listen(model, "after_insert", on_write)
+    event.listen(model, "after_update", on_write)
+    event.listen(model, "after_delete", on_delete)
+
+
+# ---------- Arama ----------
+
+def _match(q: str) -> tuple[str, str] | None:
+    """Sorgu -> (FTS tablosu, MATCH ifadesi). Parçalar AND ile bağlanır."""
+    tokens = fold(q).split()
+    if not tokens:
+        return None
+    if len(tokens) == 1 and len(tokens[0]) >= 3:
+        return "search_fts", f'"{tokens[0]}"'
+    return "search_fts_prefix", " ".join(f'"{t}"*' for t in tokens)
+
+
+def match_refs(db: Session, q: str, kind: str):
+    """
+    Eşleşen kayıt id'lerinin alt sorgusu (`Model.id.in_(...)` için). Index yoksa
+    None; boş sorgu için boş sonuç.
+    """
+    if not _has_tables(db.connection()):
+        return None
+    m = _match(q)
+    if m is None:
+        return text("SELECT ref FROM search_docs WHERE 0").columns(column("ref"))
+    table, expr = m
+    return text(
+        f"SELECT d.ref FROM {table} f JOIN search_docs d ON d.id = f.rowid"
+        f" WHERE {table} MATCH :m AND d.kind = :k"
+    ).bindparams(m=expr, k=kind).columns(column("ref"))
+
+
+def search(db: Session, q: str, kind: str, limit: int = 20) -> list[str] | None:
+    """
+    bm25 ile sıralı (eşitlikte en yeni önce) ilk `limit` kayıt id'si (metin).
+    Yalnızca en yeni RANK_CANDIDATES eşleşme puanlanır (modül açıklaması).
+    Index yoksa None.
+    """
+    if not _has_tables(db.connection()):
+        return None
+    m = _match(q)
+    if m is None:
+        return []
+    table, expr = m
+    cap = f" ORDER BY rowid DESC LIMIT {max(RANK_CANDIDATES, limit)}" if RANK_CANDIDATES > 0 else ""
+    rows = db.execute(
+        text(
+            f"SELECT d.ref FROM ("
+            f" SELECT rowid AS id, bm25({table}, {_WEIGHTS}) AS score FROM {table}"
+            f" WHERE {table} MATCH :m{cap}"
+            f") f JOIN search_docs d ON d.id = f.id"
+            f" WHERE d.kind = :k ORDER BY f.score, f.id DESC LIMIT :n"
+        ),
+        {"m": expr, "k": kind, "n": limit},
+    )
+    return [r for (r,) in rows]
+
+
+# ---------- app.db modelleri ----------
+
+def _register_app_models():
+    from . import models
+    register(models.Customer, "customer",
+             lambda c: (c.name, f"{digits(c.phone)} {c.email or ''}", ""))
+    register(models.Vehicle, "vehicle",
+             lambda v: (f"{v.brand or ''} {v.model or ''}", "", v.vin))
+
+
+if __name__ != "__main__":
+    _register_app_models()
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Müşteri/araç arama index'i")
+    ap.add_argument("cmd", choices=["rebuild"])
+    ap.add_argument("--db", choices=["app", "service", "all"], default="all")
+    args = ap.parse_args(argv)
+
+    from . import migrations
+    for target in (["app", "service"] if args.db == "all" else [args.db]):
+        migrations.ensure_current(target)
+        engine, metadata = migrations.TARGETS[target]()
+        with engine.begin() as conn:
+            if not _has_tables(conn):
+                print(f"{target}: FTS5 index yok (SQLite trigram desteği gerekli)")
+                continue
+            print(f"{target}: {rebuild(conn, metadata)} kayıt indexlendi")
+
+
+if __name__ == "__main__":
+    # `python -m` bu dosyayı ayrı bir modül olarak yükler; kayıtlar/kancalar paket
+    # modülünde (main.py de onu kullanır)
+    from app import search_index
+    search_index.main()
@@ -0,0 +1,264 @@
+# app/snapshots.py
+"""
+Araç anlık görüntüsü (vehicle_snapshots): güncel plaka + güncel sahibin iletişim
+bilgisi + son km. /api/vehicles/by-plate plakanın güncel sahibini (aktif plate
+kaydı) ve o aracın satırını indeksli okur.
+
+Güncelleme: app.database.SessionLocal oturumlarında
+- after_flush: yazılan Plate/Ownership/ServiceOrder/Vehicle/Customer kayıtlarından
+  etkilenen araç (ve müşteri) id'leri toplanır,
+- before_commit: bu araçların satırları yeniden hesaplanır (aynı transaction'da),
+- after_commit: bellek önbelleği yazarak güncellenir (eski plaka anahtarı silinir).
+
+Bellek önbelleği sınırlı LRU'dur (VEHICLE_SNAPSHOT_CACHE); başka worker'ların
+yazdıkları için kısa bir TTL (VEHICLE_SNAPSHOT_TTL sn) ile eskime sınırlanır.
+
+    python -m app.snapshots rebuild    # tüm araçlar için yeniden hesapla
+"""
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import desc, event, inspect
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Customer, Ownership, Plate, ServiceOrder, Vehicle, VehicleSnapshot
+
+CACHE_SIZE = int(os.getenv("VEHICLE_SNAPSHOT_CACHE", "2048"))
+CACHE_TTL = float(os.getenv("VEHICLE_SNAPSHOT_TTL", "30"))
+
+_VEHICLE_KEYED = (Plate, Ownership, ServiceOrder)
+
+
+# ---------- sınırlı LRU önbellek ----------
+
+class SnapshotCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._by_plate: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._plate_of: dict[str, str] = {}  # vehicle_id -> plate anahtarı
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, plate: str) -> dict | None:
+        with self._lock:
+            hit = self._by_plate.get(plate)
+            if hit is None or time.monotonic() - hit[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._by_plate.move_to_end(plate)
+            self.hits += 1
+            return hit[1]
+
+    def _drop_vehicle(self, vehicle_id: str):
+        old = self._plate_of.pop(vehicle_id, None)
+        if old is not None:
+            self._by_plate.pop(old, None)
+
+    def put(self, snap: dict, current: bool = False):
+        """
+        `current`: satırın plakanın güncel sahibi olduğu veritabanında doğrulandı
+        (lookup). Yazma yolundan gelen satır aynı plakayı başka bir araçta bulursa
+        (plaka devri, iki aktif kayıt) hangisinin güncel olduğu bilinmez: anahtar
+        düşer, sonraki okuma veritabanından güncel sahibi alır.
+        """
+        with self._lock:
+            self._drop_vehicle(snap["vehicle_id"])
+            if not snap.get("plate_normalized"):
+                return
+            prev = self._by_plate.pop(snap["plate_normalized"], None)
+            if prev is not None:
+                self._plate_of.pop(prev[1]["vehicle_id"], None)
+                if not current:
+                    return
+            self._by_plate[snap["plate_normalized"]] = (time.monotonic(), snap)
+            self._plate_of[snap["vehicle_id"]] = snap["plate_normalized"]
+            while len(self._by_plate) > self.max_entries:
+                _, (_, evicted) = self._by_plate.popitem(last=False)
+                self._plate_of.pop(evicted["vehicle_id"], None)
+
+    def invalidate(self, vehicle_id: str):
+        with self._lock:
+            self._drop_vehicle(vehicle_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._by_plate), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+cache = SnapshotCache()
+
+
+# ---------- hesaplama ----------
+
+def _to_dict(s: VehicleSnapshot) -> dict:
+    return {c.name: getattr(s, c.name) for c in VehicleSnapshot.__table__.columns if c.name != "updated_at"}
+
+
+def compute(db: Session, vehicle_id: str) -> VehicleSnapshot | None:
+    """Aracın satırını kaynak tablolardan yeniden hesapla (eklenir/güncellenir; commit etmez)."""
+    vehicle = db.get(Vehicle, vehicle_id)
+    snap = db.get(VehicleSnapshot, vehicle_id)
+    if vehicle is None:
+        if snap is not None:
+            db.delete(snap)
+        return None
+
+    # yalnızca aktif plaka (valid_to IS NULL); kapanmış plaka ile aranırsa yavaş yol
+    plate = (
+        db.query(Plate.plate_normalized)
+        .filter(Plate.vehicle_id == vehicle_id, Plate.valid_to.is_(None))
+        .order_by(desc(Plate.valid_from))
+        .first()
+    )
+    owner = (
+        db.query(Customer)
+        .join(Ownership, Ownership.customer_id == Customer.id)
+        .filter(Ownership.vehicle_id == vehicle_id)
+        .order_by(Ownership.to_date.is_(None).desc(), desc(Ownership.from_date))
+        .first()
+    )
+    last_km = (
+        db.query(ServiceOrder.odometer_km)
+        .filter(ServiceOrder.vehicle_id == vehicle_id)
+        .order_by(
+            ServiceOrder.closed_at.is_(None).desc(),
+            desc(ServiceOrder.closed_at),
+            desc(ServiceOrder.opened_at),
+        )
+        .first()
+    )
+
+    if snap is None:
+        snap = VehicleSnapshot(vehicle_id=vehicle_id)
+        db.add(snap)
+    snap.plate_normalized = plate[0] if plate else None
+    snap.brand, snap.model, snap.year = vehicle.brand, vehicle.model, vehicle.year
+    snap.customer_id = owner.id if owner else None
+    snap.customer_name = owner.name if owner else None
+    snap.customer_email = owner.email if owner else None
+    snap.customer_phone = owner.phone if owner else None
+    snap.last_km = last_km[0] if last_km else None
+    return snap
+
+
+def lookup(db: Session, plate_normalized: str) -> dict | None:
+    """
+    Önce bellek, sonra iki indeksli okuma: plakanın güncel sahibi (aktif kayıt,
+    en yeni valid_from; yavaş yoldaki sıra) ve o aracın satırı. Satır yoksa ya da
+    başka plakayı gösteriyorsa None (çağıran yavaş yola düşer).
+    """
+    hit = cache.get(plate_normalized)
+    if hit is not None:
+        return hit
+    holder = (
+        db.query(Plate.vehicle_id)
+        .filter(Plate.plate_normalized == plate_normalized, Plate.valid_to.is_(None))
+        .order_by(desc(Plate.valid_from))
+        .first()
+    )
+    row = db.get(VehicleSnapshot, holder[0]) if holder else None
+    if row is None or row.plate_normalized != plate_normalized:
+        return None
+    snap = _to_dict(row)
+    cache.put(snap, current=True)
+    return snap
+
+
+def refresh(db: Session, vehicle_id: str) -> dict | None:
+    """Tek aracı yeniden hesapla ve commit et (eksik satırı tamamlamak için)."""
+    snap = compute(db, vehicle_id)
+    data = _to_dict(snap) if snap is not None else None
+    db.commit()
+    if data is not None:
+        cache.put(data)
+    return data
+
+
+# ---------- oturum olayları ----------
+
+def _collect(session: Session, obj) -> None:
+    vehicles = session.info.setdefault("snapshot_vehicles", set())
+    if isinstance(obj, _VEHICLE_KEYED):
+        vehicles.add(obj.vehicle_id)
+        # kayıt başka araca taşındıysa eski araç da etkilenir
+        hist = inspect(obj).attrs.vehicle_id.history
+        vehicles.update(v for v in hist.deleted or () if v)
+    elif isinstance(obj, Vehicle):
+        vehicles.add(obj.id)
+    elif isinstance(obj, Customer):
+        session.info.setdefault("snapshot_customers", set()).add(obj.id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _after_flush(session, _ctx):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, VehicleSnapshot):
+            _collect(session, obj)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _before_commit(session):
+    if session.new or session.dirty or session.deleted:
+        session.flush()  # autoflush kapalı: bekleyen yazılar toplansın ve sorgularda görünsün
+    if not session.info.get("snapshot_vehicles") and not session.info.get("snapshot_customers"):
+        return
+    vehicle_ids = session.info.pop("snapshot_vehicles", set())
+    customer_ids = session.info.pop("snapshot_customers", set())
+    if customer_ids:
+        vehicle_ids |= {
+            v for (v,) in session.query(Ownership.vehicle_id).filter(Ownership.customer_id.in_(customer_ids))
+        }
+    # satırlar commit'in son flush'ı ile yazılır (snapshot nesneleri yeniden toplanmaz);
+    # önbellek değerleri commit sonrası sorgu atmamak için burada alınır
+    done = session.info.setdefault("snapshot_done", {})
+    for vid in vehicle_ids:
+        if vid:
+            snap = compute(session, vid)
+            done[vid] = _to_dict(snap) if snap is not None else None
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_commit(session):
+    for vid, data in (session.info.pop("snapshot_done", None) or {}).items():
+        if data is None:
+            cache.invalidate(vid)
+        else:
+            cache.put(data)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _after_rollback(session):
+    for key in ("snapshot_vehicles", "snapshot_customers", "snapshot_done"):
+        session.info.pop(key, None)
+
+
+# ---------- CLI ----------
+
+def rebuild_all() -> int:
+    with SessionLocal() as db:
+        ids = [v for (v,) in db.query(Vehicle.id)]
+        for vid in ids:
+            compute(db, vid)
+        db.query(VehicleSnapshot).filter(~VehicleSnapshot.vehicle_id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+    return len(ids)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Araç anlık görüntüleri")
+    ap.add_argument("cmd", choices=["rebuild"])
+    args = ap.parse_args(argv)
+    if args.cmd == "rebuild":
+        from .migrations import ensure_current
+        ensure_current("app")
+        print(f"{rebuild_all()} araç yeniden hesaplandı")
+
+
+if __name__ == "__main__":
+    main()
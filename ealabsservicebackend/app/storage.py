@@ -0,0 +1,214 @@
+# app/storage.py
+"""
+İçerik adresli dosya deposu.
+
+    storage_blobs/ab/cd/abcd...ef.jpg     (ilk 2+2 hex karakterle parçalı dizin)
+
+- Aynı içerik bir kez saklanır; `blobs.ref_count` File ve ImportedDocument
+  referanslarını sayar, 0'a düşen blob diskten silinir.
+- Yüklemeler önce `storage_blobs/tmp/` altına yazılır (app.uploads), sonra aynı dosya
+  sisteminde os.replace ile yerine taşınır.
+
+Referansı düşüren/değiştiren her yol (kayıt silme, başarısız commit) `release`
+çağırır. Eski düz dizinlerdeki dosyaları (kayıtlı yollar + LEGACY_UPLOAD_DIR
+altındaki sahipsiz dosyalar) taşımak için:
+
+    python -m app.storage migrate --dry-run
+    python -m app.storage migrate
+"""
+import argparse
+import hashlib
+import os
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Blob, File, ImportedDocument
+from .uploads import CHUNK, StoredUpload
+
+BLOB_ROOT = os.getenv("BLOB_ROOT", "./storage_blobs")
+LEGACY_UPLOAD_DIR = os.getenv("LEGACY_UPLOAD_DIR", "./storage_uploads")
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_ROOT):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+    def _incref(self, db: Session, sha256: str, ext: str, size: int) -> Blob:
+        # Kendi commit'ini yapar; çağıranın oturumunda bekleyen değişiklik olmamalı
+        res = db.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1))
+        if res.rowcount == 0:
+            try:
+                db.add(Blob(sha256=sha256, ext=ext, size_bytes=size, ref_count=1))
+                db.flush()
+            except IntegrityError:
+                # aynı içerik eşzamanlı eklendi
+                db.rollback()
+                db.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1))
+        db.commit()
+        return db.get(Blob, sha256)
+
+    def ingest(self, db: Session, stored: StoredUpload) -> Blob:
+        """
+        Geçici dosyayı depoya al ve bir referans ekle. Aynı içerik zaten varsa
+        geçici dosya silinir (tekilleştirme). Dönüş: Blob (yol için `path_for`).
+        """
+        ext = os.path.splitext(stored.path)[1] or ".bin"
+        blob = self._incref(db, stored.sha256, ext, stored.size)
+        target = self.path_for(blob.sha256, blob.ext)
+        if os.path.exists(target):
+            os.remove(stored.path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(stored.path, target)
+        return blob
+
+    def release(self, db: Session, sha256: str | None):
+        """
+        Bir referansı bırak; son referanssa blob satırı ve dosya silinir. Kendi
+        commit'ini yapar. Satır yoksa (hiç alınmamış / zaten silinmiş) bir şey yapmaz.
+        """
+        if not sha256:
+            return
+        res = db.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - 1))
+        if res.rowcount == 0:
+            db.commit()
+            return
+        blob = db.get(Blob, sha256)
+        db.refresh(blob)
+        if blob.ref_count <= 0:
+            path = self.path_for(blob.sha256, blob.ext)
+            db.delete(blob)
+            db.commit()
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            db.commit()
+
+
+blob_store = BlobStore()
+
+
+# ---------- Eski dosyaları taşıma ----------
+
+def _hash_file(path: str) -> StoredUpload:
+    sha, size = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            sha.update(chunk)
+            size += len(chunk)
+    return StoredUpload(path, sha.hexdigest(), size)
+
+
+def _legacy_paths(legacy_dir: str, store: BlobStore):
+    """Eski yükleme dizinindeki dosyalar (blob deposunun kendisi hariç)."""
+    if not legacy_dir or not os.path.isdir(legacy_dir):
+        return
+    root = os.path.abspath(store.root)
+    for dirpath, dirnames, filenames in os.walk(legacy_dir):
+        if os.path.commonpath([os.path.abspath(dirpath), root]) == root:
+            dirnames[:] = []
+            continue
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+
+def migrate(store: BlobStore = blob_store, dry_run: bool = False,
+            legacy_dir: str | None = LEGACY_UPLOAD_DIR) -> dict:
+    """
+    File.path ve ImportedDocument.original_url ile gösterilen düz dosyaları bloba
+    çevir, yolu güncelle. Birden fazla kayıt aynı dosyayı gösteriyorsa hepsi
+    aynı bloba bağlanır.
+
+    Ardından `legacy_dir` altında hiçbir kaydın göstermediği dosyalar da bloba
+    alınır; her biri için kind="legacy" bir File satırı açılır. Blob referansının
+    sahibi bu satırdır (silinince `release` ile blob da temizlenir); aynı içerikli
+    dosyalar tek bloba iner.
+
+    Tekrar çalıştırmak güvenlidir (blob_sha256 dolu kayıtlar atlanır, taşınan
+    dosyalar eski dizinden kalkar).
+    """
+    counts = {"files": 0, "imports": 0, "legacy": 0, "missing": 0, "deduplicated": 0, "bytes_saved": 0}
+    moved: dict[str, Blob] = {}  # eski yol -> blob
+
+    def rehome(path: str | None) -> Blob | None:
+        if not path:
+            return None
+        key = os.path.abspath(path)
+        if key in moved:
+            blob = moved[key]
+            if not dry_run:
+                db.execute(update(Blob).where(Blob.sha256 == blob.sha256).values(ref_count=Blob.ref_count + 1))
+            return blob
+        if not os.path.exists(path):
+            counts["missing"] += 1
+            return None
+        stored = _hash_file(path)
+        if db.get(Blob, stored.sha256) is not None or any(b.sha256 == stored.sha256 for b in moved.values()):
+            counts["deduplicated"] += 1
+            counts["bytes_saved"] += stored.size
+        if dry_run:
+            blob = Blob(sha256=stored.sha256, ext=os.path.splitext(path)[1] or ".bin")
+        else:
+            blob = store.ingest(db, stored)
+        moved[key] = blob
+        return blob
+
+    with SessionLocal() as db:
+        for obj in db.query(File).filter(File.blob_sha256.is_(None)).all():
+            blob = rehome(obj.path)
+            if blob is None:
+                continue
+            counts["files"] += 1
+            if not dry_run:
+                obj.path = store.path_for(blob.sha256, blob.ext)
+                obj.blob_sha256 = blob.sha256
+                db.commit()
+        for doc in db.query(ImportedDocument).filter(ImportedDocument.blob_sha256.is_(None)).all():
+            blob = rehome(doc.original_url)
+            if blob is None:
+                continue
+            counts["imports"] += 1
+            if not dry_run:
+                doc.original_url = store.path_for(blob.sha256, blob.ext)
+                doc.blob_sha256 = blob.sha256
+                db.commit()
+        for path in list(_legacy_paths(legacy_dir, store)):
+            if os.path.abspath(path) in moved:  # dry-run: kayıt üzerinden zaten sayıldı
+                continue
+            blob = rehome(path)
+            if blob is None:
+                continue
+            counts["legacy"] += 1
+            if not dry_run:
+                db.add(File(path=store.path_for(blob.sha256, blob.ext), blob_sha256=blob.sha256,
+                            kind="legacy", status="raw"))
+                db.commit()
+    return counts
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="İçerik adresli dosya deposu araçları")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="düz dizindeki yüklemeleri bloba taşı")
+    m.add_argument("--dry-run", action="store_true", help="yalnızca say, dosyalara dokunma")
+    m.add_argument("--legacy-dir", default=LEGACY_UPLOAD_DIR,
+                   help="kayıtsız dosyaları da taşınacak eski yükleme dizini (varsayılan: %(default)s)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "migrate":
+        from .migrations import ensure_current
+        ensure_current("app")
+        counts = migrate(dry_run=args.dry_run, legacy_dir=args.legacy_dir)
+        print(("[dry-run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# app/totals.py
+"""
+Sipariş toplamları (Decimal, kuruş hassasiyetinde) ve KDV oran kırılımı.
+
+Toplamlar sipariş satırında saklanır (subtotal / vat_total / grand_total /
+vat_breakdown); listeler ve dışa aktarma kalem satırlarına dokunmaz.
+
+- Satır tutarı: qty * birim fiyat, kuruşa yuvarlanır (ROUND_HALF_UP).
+- KDV oran başına matrah üzerinden bir kez hesaplanır (faturadaki gibi);
+  satır satır yuvarlama farkı birikmez.
+- vat_breakdown: {"0.20": "1250.00", ...} oran -> matrah (JSON metin); KDV ve
+  toplamlar matrahlardan türetilir.
+
+Yazan uçlar (sipariş oluşturma, kalem ekleme/değiştirme, içe aktarma) kalemler
+değiştiğinde `apply` ya da `recompute` çağırır; eski kayıtlar app.migrations
+adımıyla doldurulur. Saklanan matrahlara ekleme yapılmaz: iki worker aynı
+siparişe eşzamanlı kalem eklerse biri diğerinin matrahını ezerdi.
+"""
+import json
+import os
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, selectinload
+
+CENT = Decimal("0.01")
+DEFAULT_VAT_RATE = float(os.getenv("DEFAULT_VAT_RATE", "0.20"))
+
+
+def money(x) -> Decimal:
+    """Kuruşa yuvarla. float'lar önce metne çevrilir (0.1 -> '0.1', ikili hata yok)."""
+    if x is None:
+        return Decimal("0.00")
+    if not isinstance(x, Decimal):
+        x = Decimal(str(x))
+    return x.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def rate_key(rate) -> str:
+    """Oran anahtarı: 0.2, '0.20', Decimal('0.200') -> '0.20'."""
+    q = Decimal(str(DEFAULT_VAT_RATE if rate is None else rate)).quantize(Decimal("0.0001"))
+    return str(q.quantize(CENT)) if q == q.quantize(CENT) else str(q.normalize())
+
+
+def line_net(qty, unit_price) -> Decimal:
+    return money(Decimal(str(qty or 0)) * Decimal(str(unit_price or 0)))
+
+
+def breakdown(lines: Iterable[tuple]) -> dict[str, Decimal]:
+    """(qty, birim fiyat, kdv oranı) satırları -> oran -> matrah."""
+    bases: dict[str, Decimal] = {}
+    for qty, price, rate in lines:
+        key = rate_key(rate)
+        bases[key] = bases.get(key, Decimal("0.00")) + line_net(qty, price)
+    return bases
+
+
+def summarize(bases: dict[str, Decimal]) -> dict:
+    """Matrahlardan ara toplam, oran başına KDV ve genel toplam."""
+    subtotal = sum(bases.values(), Decimal("0.00"))
+    vat = {k: money(base * Decimal(k)) for k, base in bases.items()}
+    vat_total = sum(vat.values(), Decimal("0.00"))
+    return {
+        "subtotal": money(subtotal),
+        "vat_total": money(vat_total),
+        "grand_total": money(subtotal + vat_total),
+        "vat": vat,
+    }
+
+
+# ---------- sipariş satırı ----------
+
+def load_breakdown(order) -> dict[str, Decimal]:
+    raw = json.loads(order.vat_breakdown) if order.vat_breakdown else {}
+    return {k: Decimal(v) for k, v in raw.items()}
+
+
+def _store(order, bases: dict[str, Decimal]):
+    s = summarize(bases)
+    order.subtotal = s["subtotal"]
+    order.vat_total = s["vat_total"]
+    order.grand_total = s["grand_total"]
+    order.vat_breakdown = json.dumps(
+        {k: str(v) for k, v in sorted(bases.items()) if v}, separators=(",", ":")
+    )
+
+
+def apply(order, lines: Iterable[tuple]):
+    """Kalemler baştan yazıldığında: (qty, birim fiyat, kdv oranı) satırlarından hesapla."""
+    _store(order, breakdown(lines))
+
+
+def recompute(db: Session, order, target: str = "app"):
+    """
+    Kalem eklenip/silindikten sonra: kalemleri aynı transaction'da yeniden oku ve
+    hesapla. Sipariş satırı çağıran tarafından kilitlenmiş olmalı (FOR UPDATE;
+    SQLite'ta yazma zaten tek sıradadır).
+    """
+    _, line = _sources(target)
+    db.flush()
+    db.expire(order, ["items"])
+    apply(order, (line(i) for i in order.items))
+
+
+def vat_rows(order) -> list[dict]:
+    """Cevaplar için oran başına [{rate, base, vat}] (oran sırasıyla)."""
+    bases = load_breakdown(order)
+    vat = summarize(bases)["vat"]
+    return [{"rate": float(k), "base": float(v), "vat": float(vat[k])} for k, v in sorted(bases.items())]
+
+
+# ---------- toplu doldurma ----------
+
+def _sources(target: str):
+    """Hedef -> (sipariş modeli, kalem -> (qty, birim fiyat, kdv oranı))."""
+    if target == "app":
+        from .models import ServiceOrder
+        return ServiceOrder, lambda i: (i.qty, i.unit_price, i.vat_rate)
+    from .main import Order
+    return Order, lambda i: (i.qty, i.price, i.vat_rate)
+
+
+def backfill(conn: Connection, target: str, batch: int = 500) -> int:
+    """Tüm siparişlerin toplamlarını kalemlerden yeniden hesapla (migration adımı)."""
+    model, line = _sources(target)
+    db = Session(bind=conn)
+    ids = [i for (i,) in db.query(model.id)]
+    for start in range(0, len(ids), batch):
+        chunk = ids[start:start + batch]
+        for order in db.query(model).filter(model.id.in_(chunk)).options(selectinload(model.items)):
+            apply(order, (line(i) for i in order.items))
+        db.flush()
+        db.expunge_all()
+    return len(ids)
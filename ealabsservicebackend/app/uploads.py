@@ -0,0 +1,85 @@
+# app/uploads.py
+"""
+Yüklemeleri belleğe almadan diske yazma:
+- parça parça okuma (bellek kullanımı dosya boyundan bağımsız)
+- yazarken SHA-256
+- üst sınır (MAX_UPLOAD_MB) aşılırsa 413
+- önce geçici dosya, bitince os.replace ile üretilen ada taşınır (yarım dosya / ad çakışması yok)
+"""
+import hashlib
+import os
+import re
+import uuid
+from typing import NamedTuple
+
+from fastapi import HTTPException, UploadFile
+
+CHUNK = 1024 * 1024
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "25"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+_EXT_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def safe_ext(filename: str | None) -> str:
+    """İstemci adından yalnızca uzantıyı al; şüpheliyse .bin."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if _EXT_RE.match(ext) else ".bin"
+
+
+def _targets(dest_dir: str, ext: str) -> tuple[str, str]:
+    os.makedirs(dest_dir, exist_ok=True)
+    name = uuid.uuid4().hex
+    return os.path.join(dest_dir, f".{name}.part"), os.path.join(dest_dir, f"{name}{ext}")
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(413, f"Dosya çok büyük (en fazla {max_bytes // (1024 * 1024)} MB)")
+
+
+async def save_upload(file: UploadFile, dest_dir: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredUpload:
+    """UploadFile'ı `dest_dir/<uuid><ext>` olarak kaydet."""
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    tmp, final = _targets(dest_dir, safe_ext(file.filename))
+    sha, size = hashlib.sha256(), 0
+    try:
+        with open(tmp, "wb") as out:
+            while chunk := await file.read(CHUNK):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                sha.update(chunk)
+                out.write(chunk)
+        os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return StoredUpload(final, sha.hexdigest(), size)
+
+
+def copy_stream(src, dest_dir: str, ext: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredUpload:
+    """Senkron sürüm (ör. ZIP üyesi): okunabilir dosya nesnesini aynı kurallarla kaydet."""
+    tmp, final = _targets(dest_dir, ext)
+    sha, size = hashlib.sha256(), 0
+    try:
+        with open(tmp, "wb") as out:
+            while chunk := src.read(CHUNK):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                sha.update(chunk)
+                out.write(chunk)
+        os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return StoredUpload(final, sha.hexdigest(), size)
@@ -0,0 +1,18 @@
+# tests/conftest.py
+"""
+Testler gerçek app.db / service.db / storage_blobs'a dokunmaz: app import
+edilmeden önce veritabanları ve blob deposu geçici bir dizine yönlendirilir
+(service.db çalışma dizinine göre açıldığı için dizin de değiştirilir).
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="ealabs-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'app.db')}"
+os.environ["BLOB_ROOT"] = os.path.join(_TMP, "storage_blobs")
+os.environ["LEGACY_UPLOAD_DIR"] = os.path.join(_TMP, "storage_uploads")
+os.chdir(_TMP)
@@ -0,0 +1,32 @@
+# tests/test_fields_labor.py
+import pytest
+
+from app.ai import fields
+
+
+def _types(text: str) -> list[str]:
+    return [i["type"] for i in fields.items(fields.scan(text), text)]
+
+
+@pytest.mark.parametrize("line", [
+    "Iscilik 500,00",
+    "ISCILIK 500,00",
+    "IŞÇİLİK 500,00",
+    "işçilik 500,00",
+    "Labour 300,00",
+])
+def test_labor_lines(line):
+    assert _types(line) == ["labor"]
+
+
+@pytest.mark.parametrize("line", [
+    "Fren balatası 2 adet 750,00",
+    "YAĞ FİLTRESİ 1 adet 180,00",
+])
+def test_part_lines(line):
+    assert _types(line) == ["part"]
+
+
+@pytest.mark.parametrize("name", ["IŞÇİLİK", "Iscilik", "ISCILIK", "Emek bedeli"])
+def test_is_labor(name):
+    assert fields.is_labor(name)
@@ -0,0 +1,84 @@
+# tests/test_import_recovery.py
+"""Import kayıtları hata / iptal / süreç ölümü sonrası queued-running-committing'de kalmaz."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import migrations
+from app.database import SessionLocal
+from app.models import ImportedDocument
+from app.routers import ai_imports
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    migrations.ensure_current("app")
+
+
+def _new(status: str, age_min: float = 0) -> int:
+    with SessionLocal() as db:
+        doc = ImportedDocument(user_id=1, status=status)
+        db.add(doc)
+        db.commit()
+        if age_min:
+            doc.updated_at = datetime.utcnow() - timedelta(minutes=age_min)
+            db.commit()
+        return doc.id
+
+
+def _status(import_id: int) -> tuple[str, str | None]:
+    with SessionLocal() as db:
+        doc = db.get(ImportedDocument, import_id)
+        return doc.status, doc.error
+
+
+def test_exception_after_ocr_marks_failed(monkeypatch):
+    async def boom(import_id, *_):
+        ai_imports._update_import(import_id, status="running")
+        raise RuntimeError("önbellek yazılamadı")
+
+    monkeypatch.setattr(ai_imports, "_run_import", boom)
+    import_id = _new("queued")
+    with pytest.raises(RuntimeError):
+        asyncio.run(ai_imports._process_import(import_id, "x.jpg", "k", False))
+    assert _status(import_id) == ("failed", "önbellek yazılamadı")
+    assert import_id not in ai_imports._IN_FLIGHT
+
+
+def test_cancellation_marks_failed(monkeypatch):
+    async def slow(import_id, *_):
+        ai_imports._update_import(import_id, status="running")
+        await asyncio.sleep(30)
+
+    async def run(import_id):
+        task = asyncio.create_task(ai_imports._process_import(import_id, "x.jpg", "k", False))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    monkeypatch.setattr(ai_imports, "_run_import", slow)
+    import_id = _new("queued")
+    asyncio.run(run(import_id))
+    assert _status(import_id)[0] == "failed"
+
+
+def test_sweep_recovers_rows_from_dead_process():
+    queued, running, committing = _new("queued", 60), _new("running", 60), _new("committing", 60)
+    fresh, parsed, mine = _new("running"), _new("parsed", 60), _new("running", 60)
+    ai_imports._IN_FLIGHT.add(mine)
+    try:
+        counts = ai_imports.sweep_stale_imports(older_than_min=15)
+    finally:
+        ai_imports._IN_FLIGHT.discard(mine)
+    assert counts["failed"] >= 2 and counts["reverted"] >= 1
+    assert _status(queued)[0] == _status(running)[0] == "failed"
+    assert _status(committing)[0] == "parsed"
+    assert _status(fresh) == ("running", None)
+    assert _status(parsed) == ("parsed", None)
+    assert _status(mine) == ("running", None)
+
+    # süpürülen kayıt artık silinebilir
+    with SessionLocal() as db:
+        assert ai_imports.delete_import(running, db) == {"ok": True}
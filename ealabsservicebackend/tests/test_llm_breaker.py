@@ -0,0 +1,107 @@
+# tests/test_llm_breaker.py
+"""
+OllamaClient + CircuitBreaker, sahte Ollama sunucusuna (app.ai.fake_ollama)
+karşı: gecikme, timeout, hata -> devre açılır, açıkken istek atılmadan kural
+tabanlı yola düşülür, half-open denemesiyle yeniden kapanır.
+"""
+import time
+
+import pytest
+
+from app import migrations
+from app.ai import fake_ollama, llm
+from app.routers import ai_imports
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kw):
+        server = fake_ollama.serve_in_thread(**kw)
+        servers.append(server)
+        host, port = server.server_address
+        return f"http://{host}:{port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _client(host: str, timeout: float = 5.0, threshold: int = 3, reset_after: float = 30.0):
+    return llm.OllamaClient(host, "fake", timeout=timeout, connect_timeout=1.0, queue_timeout=1.0,
+                            breaker=llm.CircuitBreaker(failure_threshold=threshold, reset_after=reset_after))
+
+
+def test_slow_host_within_timeout_returns_draft(serve):
+    client = _client(serve(latency=0.3), timeout=5.0)
+    t = time.perf_counter()
+    draft = client.generate_json("Plaka 34 ABC 123")
+    assert time.perf_counter() - t >= 0.3
+    assert draft["vehicle"]["plate"] == "34ABC123"
+    assert client.breaker.state == "closed"
+
+
+def test_timeout_is_honoured(serve):
+    client = _client(serve(mode="hang", hang_seconds=2.0), timeout=0.3)
+    t = time.perf_counter()
+    assert client.generate_json("x") is None
+    assert time.perf_counter() - t < 1.5
+    assert client.counters["errors"] == 1 and client.breaker.failures == 1
+
+
+def test_breaker_opens_after_repeated_failures_and_short_circuits(serve):
+    client = _client(serve(mode="error"), threshold=3)
+    for _ in range(3):
+        assert client.generate_json("x") is None
+    assert client.breaker.state == "open"
+
+    t = time.perf_counter()
+    assert client.generate_json("x") is None
+    assert time.perf_counter() - t < 0.05  # istek atılmadı
+    assert client.counters["requests"] == 3 and client.counters["short_circuited"] == 1
+
+
+def test_open_breaker_falls_back_to_rules(serve, monkeypatch):
+    migrations.ensure_current("app")  # LLM önbelleği
+    client = _client(serve(mode="error", latency=0.2), threshold=1)
+    client.breaker.record_failure()  # açık
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    t = time.perf_counter()
+    assert ai_imports._parse_with_llm("önbellekte olmayan metin 34 ZZ 999") == (None, False)
+    assert time.perf_counter() - t < 0.2  # sunucu gecikmesini beklemedi
+    assert client.counters["requests"] == 0
+
+
+def test_half_open_probe_closes_or_reopens(serve):
+    failing, healthy = serve(mode="error"), serve()
+    client = _client(failing, threshold=2, reset_after=0.2)
+    client.generate_json("x"), client.generate_json("x")
+    assert client.breaker.state == "open"
+
+    # başarısız deneme: tekrar açık
+    time.sleep(0.25)
+    assert client.breaker.state == "half-open"
+    assert client.generate_json("x") is None
+    assert client.breaker.state == "open"
+
+    # host düzeldi: deneme başarılı -> kapalı
+    client.host = healthy
+    time.sleep(0.25)
+    assert client.generate_json("34 ABC 123") is not None
+    assert client.breaker.state == "closed" and client.breaker.failures == 0
+
+
+def test_half_open_allows_single_probe():
+    breaker = llm.CircuitBreaker(failure_threshold=1, reset_after=0.0)
+    breaker.record_failure()
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # deneme sürerken ikinci istek geçmez
+    breaker.release_probe()
+    assert breaker.allow() is True
+
+
+def test_garbage_answer_does_not_open_breaker(serve):
+    client = _client(serve(mode="garbage"), threshold=1)
+    assert client.generate_json("x") is None
+    assert client.breaker.state == "closed"
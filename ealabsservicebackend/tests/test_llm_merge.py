@@ -0,0 +1,58 @@
+# tests/test_llm_merge.py
+"""LLM cevabı yalnızca bulduğu ve geçerli olan alanlarla düşük güvenli taslağı düzeltir."""
+from datetime import datetime, timedelta
+
+from app.routers import ai_imports as ai
+
+
+def _draft():
+    return {
+        "customer": {"type": "person", "name": "Ayşe Demir", "phone": None, "email": None},
+        "vehicle": {"plate": "34ABC123", "brand": "FORD", "model": "FOCUS", "year": None, "km": 120000},
+        "startedAt": "2024-03-12T00:00:00",
+        "notes": None,
+        "items": [{"type": "part", "name": "Fren balatası", "qty": 1, "price": 750.0}],
+        "status": "open",
+    }
+
+
+def _meta(conf=0.6):
+    return {f: {"source": "rules", "confidence": conf} for f in ai._FIELD_PATHS}
+
+
+def _merge(llm_raw: dict, low=("date", "plate", "customer")):
+    return ai._merge_llm(_draft(), _meta(), ai._normalize_llm_json(llm_raw), list(low))
+
+
+def test_missing_llm_fields_keep_document_values():
+    out, meta = _merge({"startedAt": None, "vehicle": {"plate": None}, "customer": {"name": None}, "items": []})
+    assert out["startedAt"] == "2024-03-12T00:00:00"
+    assert out["vehicle"]["plate"] == "34ABC123"
+    assert out["customer"]["name"] == "Ayşe Demir"
+    assert {meta[f]["source"] for f in ("date", "plate", "customer")} == {"rules"}
+
+
+def test_invalid_llm_values_are_ignored():
+    future = (datetime.utcnow() + timedelta(days=30)).isoformat()
+    for date in ("1999-01-01", future, "dün"):
+        out, meta = _merge({"startedAt": date, "vehicle": {"plate": "ABC"},
+                            "customer": {"name": "Bilinmeyen"}, "items": []})
+        assert out["startedAt"] == "2024-03-12T00:00:00"
+        assert out["vehicle"]["plate"] == "34ABC123"
+        assert out["customer"]["name"] == "Ayşe Demir"
+        assert meta["date"]["source"] == "rules"
+
+
+def test_valid_llm_values_replace_low_confidence_fields():
+    out, meta = _merge({"startedAt": "2024-03-13T09:30:00Z", "vehicle": {"plate": "34 abc 124"},
+                        "customer": {"name": "Ayşe Yılmaz"}, "items": []})
+    assert out["startedAt"] == "2024-03-13T09:30:00Z"
+    assert out["vehicle"]["plate"] == "34ABC124"
+    assert out["customer"]["name"] == "Ayşe Yılmaz"
+    assert meta["date"] == {"source": "llm", "confidence": None}
+
+
+def test_full_llm_draft_gets_defaults():
+    d = ai._with_llm_defaults(ai._normalize_llm_json({"startedAt": None, "customer": {}, "items": []}))
+    assert d["customer"]["name"] == "Bilinmeyen"
+    assert datetime.fromisoformat(d["startedAt"]).date() == datetime.utcnow().date()
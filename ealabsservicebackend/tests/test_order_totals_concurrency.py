@@ -0,0 +1,46 @@
+# tests/test_order_totals_concurrency.py
+"""
+İki worker aynı iş emrine kalem eklerken toplamlar kaybolmamalı: ikinci istek
+siparişi ilki commit etmeden önce okumuş olsa bile kalemlerden yeniden hesaplanır.
+"""
+from decimal import Decimal
+
+import pytest
+
+from app import migrations, schemas
+from app.database import SessionLocal
+from app.models import Customer, ServiceOrder, Vehicle
+from app.routers.service_orders import add_item
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    migrations.ensure_current("app")
+
+
+def test_interleaved_add_item_keeps_both_lines():
+    with SessionLocal() as db:
+        c, v = Customer(name="Eşzamanlı Müşteri"), Vehicle(brand="FORD", model="FOCUS")
+        db.add_all([c, v])
+        db.flush()
+        o = ServiceOrder(vehicle_id=v.id, customer_id=c.id, odometer_km=1000)
+        db.add(o)
+        db.commit()
+        order_id = o.id
+
+    with SessionLocal() as worker_a, SessionLocal() as worker_b:
+        # B siparişi (boş matrahlarla) A'nın commit'inden önce okur
+        stale = worker_b.get(ServiceOrder, order_id)
+        assert not stale.vat_breakdown
+        add_item(order_id, schemas.ServiceItemCreate(type="part", description="Balata", qty=2,
+                                                     unit_price=750, vat_rate=0.20), worker_a)
+        add_item(order_id, schemas.ServiceItemCreate(type="labor", description="İşçilik", qty=1,
+                                                     unit_price=500, vat_rate=0.10), worker_b)
+        del stale
+
+    with SessionLocal() as db:
+        o = db.get(ServiceOrder, order_id)
+        assert o.subtotal == Decimal("2000.00")
+        assert o.vat_total == Decimal("350.00")
+        assert o.grand_total == Decimal("2350.00")
+        assert len(o.items) == 2
@@ -0,0 +1,81 @@
+# tests/test_orders_query_count.py
+"""
+/orders ve /orders/by-plate sayfa başına sabit sayıda sorgu çalıştırmalı
+(kalem / müşteri / araç ilişkileri sipariş başına ayrı sorgu üretmemeli).
+"""
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import main, totals
+
+N_ORDERS = 300
+PLATE = "34QC0001"
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        with main.SessionLocal() as db:
+            customers = [main.Customer(name=f"Müşteri {i}", phone=f"0532{i:07d}") for i in range(20)]
+            vehicles = [main.Vehicle(plate=f"34QC{i:04d}", brand="FORD", model="FOCUS") for i in range(1, 21)]
+            db.add_all(customers + vehicles)
+            db.flush()
+            for n in range(N_ORDERS):
+                o = main.Order(customer=customers[n % 20], vehicle=vehicles[n % 20], status="open")
+                lines = [("part", "Fren balatası", 2, 750.0, 0.20), ("labor", "İşçilik", 1, 500.0, 0.20)]
+                for typ, name, qty, price, rate in lines:
+                    o.items.append(main.OrderItem(type=typ, name=name, qty=qty, price=price, vat_rate=rate))
+                totals.apply(o, [(q, p, r) for _, _, q, p, r in lines])
+                db.add(o)
+            db.commit()
+        yield c
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before(conn, cursor, statement, params, context, executemany):
+        statements.append(statement)
+
+    event.listen(main.engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(main.engine, "before_cursor_execute", before)
+
+
+def _get(client, url, **params):
+    with count_queries() as stmts:
+        res = client.get(url, params=params)
+    assert res.status_code == 200, res.text
+    return res, len(stmts)
+
+
+def test_orders_page_query_count_is_fixed(client):
+    res, n200 = _get(client, "/orders", size=200)
+    assert len(res.json()) == 200
+    assert all(o["items"] for o in res.json())
+    assert n200 <= 4
+
+    _, n50 = _get(client, "/orders", size=50)
+    assert n50 == n200
+
+    # sonraki sayfa (keyset) da aynı maliyette
+    _, n_next = _get(client, "/orders", size=200, cursor=res.headers[main.pagination.NEXT_CURSOR_HEADER])
+    assert n_next == n200
+
+
+def test_orders_offset_page_query_count_is_fixed(client):
+    _, n_small = _get(client, "/orders", size=20, page=2)
+    _, n_large = _get(client, "/orders", size=100, page=2)
+    assert n_small == n_large <= 4
+
+
+def test_orders_by_plate_query_count_is_fixed(client):
+    res, n = _get(client, f"/orders/by-plate/{PLATE}")
+    assert len(res.json()) == N_ORDERS // 20
+    assert n <= 4
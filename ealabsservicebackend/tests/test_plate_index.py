@@ -0,0 +1,74 @@
+# tests/test_plate_index.py
+import pytest
+
+from app import main, migrations, plate_index
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    migrations.ensure_current("service")
+    plate_index.index("service").candidates("34")  # index'i yükle
+
+
+def test_index_follows_commit_not_flush():
+    idx = plate_index.index("service")
+
+    with main.SessionLocal() as db:
+        db.add(main.Vehicle(plate="34TST01"))
+        db.flush()
+        db.rollback()
+    assert idx.best("34TST01", max_cost=0) is None
+
+    with main.SessionLocal() as db:
+        v = main.Vehicle(plate="34TST02")
+        db.add(v)
+        db.flush()
+        assert idx.best("34TST02", max_cost=0) is None  # henüz commit yok
+        db.commit()
+        assert idx.best("34TST02", max_cost=0).ref == v.id
+
+        v.plate = "34TST03"
+        db.commit()
+        assert idx.best("34TST02", max_cost=0) is None
+        assert idx.best("34TST03", max_cost=0).ref == v.id
+
+        db.delete(v)
+        db.flush()
+        db.rollback()
+        assert idx.best("34TST03", max_cost=0).ref == v.id
+
+
+def test_ocr_max_cost_only_matches_confusions():
+    idx = plate_index.index("service")
+    with main.SessionLocal() as db:
+        db.add(main.Vehicle(plate="06ABC108"))
+        db.commit()
+    assert idx.best("O6ABC1O8", max_cost=plate_index.OCR_MAX_COST).plate == "06ABC108"
+    assert idx.best("06ABC107", max_cost=plate_index.OCR_MAX_COST) is None
+
+
+def test_search_plate_picks_only_confusion_matches():
+    from fastapi import HTTPException
+
+    from app import models
+    from app.database import SessionLocal
+    from app.routers.search import search_plate
+
+    migrations.ensure_current("app")
+    plate_index.index("app").candidates("34")
+    with SessionLocal() as db:
+        v = models.Vehicle(brand="FIAT", model="EGEA")
+        db.add(v)
+        db.flush()
+        db.add(models.Plate(vehicle_id=v.id, plate_normalized="35KLM208"))
+        db.commit()
+
+        res = search_plate("35KLM2O8", db)  # O/0 karışması
+        assert (res["vehicle_id"], res["matched_plate"]) == (v.id, "35KLM208")
+
+        res = search_plate("35KLM209", db)  # gerçek rakam farkı: seçilmez, yalnızca aday
+        assert res["vehicle_id"] is None and res["matched_plate"] is None
+        assert [c["plate"] for c in res["candidates"]] == ["35KLM208"]
+
+        with pytest.raises(HTTPException):
+            search_plate("01ZZZ999", db)
@@ -0,0 +1,35 @@
+# tests/test_search_ranking.py
+"""search_index.search: bm25 sırası eski kayıtları da kapsar; puanlanan eşleşme sayısı sınırlıdır."""
+import pytest
+
+from app import main, migrations, search_index
+
+
+@pytest.fixture(scope="module")
+def ids():
+    migrations.ensure_current("service")
+    with main.SessionLocal() as db:
+        best = main.Customer(name="Zerrin Kılıçarslan")  # en eski, adda eşleşir
+        newer = [main.Customer(name=f"Müşteri {i}", email=f"kilicarslan{i}@example.com") for i in range(5)]
+        db.add(best)
+        db.flush()
+        db.add_all(newer)
+        db.commit()
+        return str(best.id), [str(c.id) for c in newer]
+
+
+def test_older_better_match_ranks_first(ids):
+    best, newer = ids
+    with main.SessionLocal() as db:
+        refs = search_index.search(db, "kılıçarslan", "customer", limit=3)
+    assert refs[0] == best
+    assert set(refs[1:]) <= set(newer)
+
+
+def test_candidate_cap_limits_scored_matches(ids, monkeypatch):
+    best, newer = ids
+    monkeypatch.setattr(search_index, "RANK_CANDIDATES", 3)
+    with main.SessionLocal() as db:
+        refs = search_index.search(db, "kilicarslan", "customer", limit=3)
+    # yalnızca en yeni 3 eşleşme puanlandı: eski kayıt dışarıda
+    assert best not in refs and set(refs) <= set(newer[-3:])
@@ -0,0 +1,64 @@
+# tests/test_snapshots_plate_transfer.py
+"""
+Plaka devrinden sonra eski araca yapılan yazım /api/vehicles/by-plate'in eski
+sahibi döndürmesine yol açmamalı (anlık görüntü + bellek önbelleği).
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from app import migrations, snapshots
+from app.database import SessionLocal
+from app.models import Customer, Ownership, Plate, ServiceOrder, Vehicle
+from app.routers.vehicles import get_by_plate
+
+PLATE = "34XY123"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    migrations.ensure_current("app")
+
+
+def test_lookup_returns_current_holder_after_transfer():
+    with SessionLocal() as db:
+        old_owner = Customer(name="Eski Sahip", phone="05320000001", email="eski@example.com")
+        new_owner = Customer(name="Yeni Sahip", phone="05320000002", email="yeni@example.com")
+        fiat = Vehicle(brand="FIAT", model="EGEA")
+        ford = Vehicle(brand="FORD", model="FOCUS")
+        db.add_all([old_owner, new_owner, fiat, ford])
+        db.flush()
+        db.add_all([
+            Ownership(vehicle_id=fiat.id, customer_id=old_owner.id),
+            Ownership(vehicle_id=ford.id, customer_id=new_owner.id),
+            Plate(vehicle_id=fiat.id, plate_normalized=PLATE, valid_from=date.today() - timedelta(days=30)),
+        ])
+        db.commit()
+        assert get_by_plate(PLATE, db).customerName == "Eski Sahip"
+
+        # devir: FIAT'ın plakası kapanır, aynı plaka FORD'a geçer
+        db.query(Plate).filter(Plate.vehicle_id == fiat.id).one().valid_to = date.today()
+        db.add(Plate(vehicle_id=ford.id, plate_normalized=PLATE))
+        db.commit()
+        assert get_by_plate(PLATE, db).customerName == "Yeni Sahip"
+
+        # eski araca yazım (iş emri) sonrası da güncel sahip dönmeli
+        db.add(ServiceOrder(vehicle_id=fiat.id, customer_id=old_owner.id, odometer_km=120000))
+        db.commit()
+        assert snapshots.lookup(db, PLATE)["vehicle_id"] == ford.id
+        res = get_by_plate(PLATE, db)
+        assert (res.brand, res.customerName, res.customerPhone) == ("FORD", "Yeni Sahip", "05320000002")
+
+        # bellek önbelleği olmadan da (başka worker) aynı sonuç
+        snapshots.cache.invalidate(fiat.id)
+        snapshots.cache.invalidate(ford.id)
+        assert get_by_plate(PLATE, db).customerName == "Yeni Sahip"
+
+
+def test_cache_does_not_let_last_write_win():
+    cache = snapshots.SnapshotCache()
+    cache.put({"vehicle_id": "a", "plate_normalized": "06AB01"}, current=True)
+    cache.put({"vehicle_id": "b", "plate_normalized": "06AB01"})
+    assert cache.get("06AB01") is None  # hangisi güncel bilinmiyor: veritabanına düşer
+    cache.put({"vehicle_id": "b", "plate_normalized": "06AB01"}, current=True)
+    assert cache.get("06AB01")["vehicle_id"] == "b"